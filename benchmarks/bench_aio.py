@@ -0,0 +1,62 @@
+"""
+Measure converting pages from asyncio code directly in the event loop compared
+to :py:class:`~ocrd_page_to_alto.aio.AsyncConverter` with 1, 2 and 4 workers.
+
+    python -m benchmarks.bench_aio [FILE...]
+
+Each FILE is converted 20 times (starting the workers is not timed). "lag" is
+the longest a timer of 1ms on the event loop was delayed, i.e. how long other
+coroutines were blocked.
+"""
+import asyncio
+import logging
+import sys
+from time import perf_counter
+
+from ocrd_page_to_alto.aio import AsyncConverter
+from ocrd_page_to_alto.convert import ConversionProfile
+
+from .bench_page_engine import default_files
+
+PROFILE = ConversionProfile(check_words=False, page_engine='lxml')
+
+async def heartbeat(lags):
+    while True:
+        t0 = perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(perf_counter() - t0 - 0.001)
+
+async def in_loop(filenames):
+    t0 = perf_counter()
+    for filename in filenames:
+        str(PROFILE.convert(filename))
+        # let other coroutines run between pages
+        await asyncio.sleep(0)
+    return perf_counter() - t0
+
+async def with_pool(filenames, workers):
+    async with AsyncConverter(PROFILE, workers=workers) as converter:
+        t0 = perf_counter()
+        async for result in converter.convert_many(filenames):
+            assert result.error is None, result.error
+        return perf_counter() - t0
+
+async def measure(coro):
+    lags = [0]
+    beat = asyncio.ensure_future(heartbeat(lags))
+    seconds = await coro
+    beat.cancel()
+    return seconds, max(lags)
+
+def main(files):
+    logging.disable(logging.CRITICAL)
+    filenames = files * 20
+    print('%-16s %12s %12s' % ('mode', 'pages/s', 'lag'))
+    runs = [('event loop', lambda: in_loop(filenames))]
+    runs += [('%d workers' % workers, lambda workers=workers: with_pool(filenames, workers)) for workers in [1, 2, 4]]
+    for name, make_coro in runs:
+        seconds, lag = asyncio.run(measure(make_coro()))
+        print('%-16s %12.1f %10.1fms' % (name, len(filenames) / seconds, lag * 1000))
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or default_files())
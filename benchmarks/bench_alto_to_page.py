@@ -0,0 +1,74 @@
+"""
+Measure converting ALTO back to PAGE-XML, from a file (parsed incrementally)
+and from an already parsed tree.
+
+    python -m benchmarks.bench_alto_to_page [REGIONS...]
+
+The ALTO is converted from synthetic pages of REGIONS regions of 10 lines with
+10 words each. Times are the best of 3 runs, "RSS" is the growth of the peak
+resident set size of streaming the file to PAGE-XML (written to the null device)
+vs. parsing the whole ALTO first, each measured in a fresh interpreter (see :py:mod:`benchmarks.bench_memory`).
+"""
+import logging
+import sys
+from io import BytesIO
+from os import devnull
+from os.path import join
+from subprocess import run, PIPE
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from lxml import etree as ET
+
+from ocrd_page_to_alto.alto_to_page import AltoPageConverter
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+
+from .bench_memory import peak_rss_kib, rss_kib
+from .synthetic import synthetic_page
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    return min(times)
+
+def child(filename, mode):
+    logging.disable(logging.CRITICAL)
+    before = rss_kib()
+    if mode == 'stream':
+        with open(devnull, 'wb') as output:
+            AltoPageConverter(alto_filename=filename).stream(output)
+    else:
+        str(AltoPageConverter(alto_etree=ET.parse(filename)).convert())
+    print(peak_rss_kib() - before)
+
+def child_rss(filename, mode):
+    result = run([sys.executable, '-m', 'benchmarks.bench_alto_to_page', '--child', filename, mode],
+                 check=True, stdout=PIPE, universal_newlines=True)
+    return int(result.stdout) / 1024
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    columns = ['file', 'file stream', 'etree', 'RSS stream', 'RSS etree']
+    print('%-8s' % 'regions' + ''.join('%14s' % column for column in columns))
+    with TemporaryDirectory() as tmpdir:
+        for regions in sizes:
+            page_etree = synthetic_page(regions=regions, lines=10, words=10, styles=5)
+            alto = OcrdPageAltoConverter(page_etree=page_etree, check_words=False, page_engine='lxml').convert().to_etree()
+            filename = join(tmpdir, 'alto-%d.xml' % regions)
+            ET.ElementTree(alto).write(filename)
+            results = [
+                best_of(lambda: str(AltoPageConverter(alto_filename=filename).convert())), # pylint: disable=cell-var-from-loop
+                best_of(lambda: AltoPageConverter(alto_filename=filename).stream(BytesIO())), # pylint: disable=cell-var-from-loop
+                best_of(lambda: str(AltoPageConverter(alto_etree=alto).convert())), # pylint: disable=cell-var-from-loop
+            ]
+            print('%-8d' % regions + ''.join('%13.3fs' % seconds for seconds in results)
+                  + ''.join('%11.1fMiB' % child_rss(filename, mode) for mode in ['stream', 'etree']))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:4])
+    else:
+        main([int(n) for n in sys.argv[1:]] or [10, 100, 1000])
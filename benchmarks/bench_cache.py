@@ -0,0 +1,54 @@
+"""
+Measure re-converting a batch with the conversion cache: cold (empty cache),
+warm (all pages unchanged) and with a tenth of the pages changed.
+
+    python -m benchmarks.bench_cache [PAGES]
+
+Each page is a synthetic PAGE-XML file with 30 regions of 2 lines with 3 words,
+converted with the lxml engine in this process.
+"""
+import logging
+import sys
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from ocrd_page_to_alto.batch import convert_batch
+from ocrd_page_to_alto.cache import ConversionCache
+
+from .synthetic import synthetic_page
+
+OPTIONS = dict(check_words=False, page_engine='lxml')
+
+def write_pages(directory, pages, regions=30):
+    filenames = []
+    for page_idx in range(pages):
+        filename = join(directory, 'page_%04d.xml' % page_idx)
+        synthetic_page(regions=regions, lines=2, words=3).write(filename)
+        filenames.append(filename)
+    return filenames
+
+def run(filenames, output_dir, cache):
+    t0 = perf_counter()
+    jobs = [(filename, join(output_dir, '%04d.xml' % idx)) for idx, filename in enumerate(filenames)]
+    for result in convert_batch(jobs, OPTIONS, cache=cache):
+        assert result.error is None, result.error
+    return perf_counter() - t0
+
+def main(pages):
+    logging.disable(logging.CRITICAL)
+    with TemporaryDirectory() as tmpdir:
+        filenames = write_pages(tmpdir, pages)
+        cache = ConversionCache(join(tmpdir, 'cache'), OPTIONS)
+        print('%-16s %10s %8s %8s' % ('run', 'seconds', 'hits', 'misses'))
+        print('%-16s %9.2fs' % ('no cache', run(filenames, join(tmpdir, 'nocache'), None)))
+        for name, changed in (('cold', 0), ('warm', 0), ('10% changed', pages // 10)):
+            if changed:
+                for filename in filenames[:changed]:
+                    synthetic_page(regions=31, lines=2, words=3).write(filename)
+            hits, misses = cache.hits, cache.misses
+            seconds = run(filenames, join(tmpdir, name), cache)
+            print('%-16s %9.2fs %8d %8d' % (name, seconds, cache.hits - hits, cache.misses - misses))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
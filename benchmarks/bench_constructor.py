@@ -0,0 +1,50 @@
+"""
+Measure the cost of the OcrdPageAltoConverter constructor for each kind of input.
+
+    python -m benchmarks.bench_constructor [FILE...]
+
+The reference row "page_etree (round trip)" is the former way of handling
+``page_etree``: serializing it and re-parsing the string with generateDS.
+"""
+import logging
+import sys
+from timeit import repeat
+
+from lxml import etree as ET
+from ocrd_models.ocrd_page import parse, parseString
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+from ocrd_page_to_alto import page_lxml
+
+from .bench_page_engine import default_files
+
+def bench_file(filename, number=5):
+    tree = ET.parse(filename)
+    pcgts = parse(filename)
+    pcgts_lxml = page_lxml.parse(filename)
+    kwargs = dict(check_words=False, check_border=True)
+    cases = {
+        'page_filename (generateds)': lambda: OcrdPageAltoConverter(page_filename=filename, **kwargs),
+        'page_filename (lxml)': lambda: OcrdPageAltoConverter(page_filename=filename, page_engine='lxml', **kwargs),
+        'page_etree (round trip)': lambda: OcrdPageAltoConverter(pcgts=parseString(ET.tostring(tree)), **kwargs),
+        'page_etree (generateds)': lambda: OcrdPageAltoConverter(page_etree=tree, **kwargs),
+        'page_etree (lxml)': lambda: OcrdPageAltoConverter(page_etree=tree, page_engine='lxml', **kwargs),
+        'pcgts (generateds)': lambda: OcrdPageAltoConverter(pcgts=pcgts, **kwargs),
+        'pcgts (lxml)': lambda: OcrdPageAltoConverter(pcgts=pcgts_lxml, **kwargs),
+    }
+    return {name: min(repeat(case, number=number, repeat=3)) / number for name, case in cases.items()}
+
+def main(files):
+    logging.disable(logging.CRITICAL)
+    for filename in files:
+        try:
+            results = bench_file(filename)
+        except Exception as err: # pylint: disable=broad-except
+            print('%s: %s' % (filename, err))
+            continue
+        print(filename)
+        for name, seconds in results.items():
+            print('    %-30s %10.3fms' % (name, seconds * 1000))
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or default_files())
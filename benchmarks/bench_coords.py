@@ -0,0 +1,57 @@
+"""
+Measure bulk parsing of all Coords of a page against parsing them one by one.
+
+    python -m benchmarks.bench_coords [FILE...]
+
+Without arguments, synthetic pages with word-level ground truth are used.
+Both the parsing alone and the complete conversion are timed, the latter
+with :py:meth:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter.parse_coords`
+disabled as reference.
+"""
+import logging
+import sys
+from timeit import repeat
+
+from lxml import etree as ET
+from ocrd_utils import bbox_from_points
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+from ocrd_page_to_alto.utils import bboxes_from_points
+
+from .synthetic import synthetic_page
+
+def all_points(page_etree):
+    return page_etree.xpath('//*[local-name()="Coords"]/@points')
+
+def bench_page(name, page_etree, number=3):
+    points_list = [str(points) for points in all_points(page_etree)]
+    converter_kwargs = dict(page_etree=page_etree, page_engine='lxml', check_words=False)
+    def convert_bulk():
+        return str(OcrdPageAltoConverter(**converter_kwargs).convert())
+    def convert_single():
+        converter = OcrdPageAltoConverter(**converter_kwargs)
+        converter.parse_coords = lambda: None
+        return str(converter.convert())
+    assert convert_bulk() == convert_single()
+    results = {
+        'bulk': lambda: bboxes_from_points(points_list),
+        'single': lambda: [bbox_from_points(points) for points in points_list],
+        'convert bulk': convert_bulk,
+        'convert single': convert_single,
+    }
+    print('%s (%d Coords)' % (name, len(points_list)))
+    for case, fn in results.items():
+        print('    %-16s %10.2fms' % (case, min(repeat(fn, number=number, repeat=3)) / number * 1000))
+
+def main(files):
+    logging.disable(logging.CRITICAL)
+    if files:
+        for filename in files:
+            bench_page(filename, ET.parse(filename))
+    else:
+        for regions, lines, words in [(50, 20, 10), (200, 20, 10)]:
+            bench_page('synthetic %d regions x %d lines x %d words' % (regions, lines, words),
+                       synthetic_page(regions, lines=lines, words=words))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
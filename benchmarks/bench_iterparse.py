@@ -0,0 +1,66 @@
+"""
+Measure streaming one big page with the "lxml" page engine (reading the whole
+PAGE-XML first) vs. the "iterparse" one (reading it region by region).
+
+    python -m benchmarks.bench_iterparse [REGIONS...]
+
+The pages have REGIONS regions of 10 lines with 10 words each. Times are the
+best of 3 runs, "RSS" is the growth of the peak resident set size of streaming
+the ALTO to the null device, each measured in a fresh interpreter (see :py:mod:`benchmarks.bench_memory`).
+"""
+import logging
+import sys
+from os import devnull
+from os.path import join
+from subprocess import run, PIPE
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from .bench_memory import peak_rss_kib, rss_kib
+from .synthetic import synthetic_page
+
+ENGINES = ['lxml', 'iterparse']
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    return min(times)
+
+def stream(filename, page_engine):
+    from ocrd_page_to_alto.convert import OcrdPageAltoConverter # pylint: disable=import-outside-toplevel
+    with open(devnull, 'wb') as output:
+        OcrdPageAltoConverter(page_filename=filename, page_engine=page_engine, check_words=False).stream(output)
+
+def child(filename, page_engine):
+    from ocrd_page_to_alto.convert import page_model # pylint: disable=import-outside-toplevel
+    logging.disable(logging.CRITICAL)
+    page_model(page_engine)
+    before = rss_kib()
+    stream(filename, page_engine)
+    print(peak_rss_kib() - before)
+
+def child_rss(filename, page_engine):
+    result = run([sys.executable, '-m', 'benchmarks.bench_iterparse', '--child', filename, page_engine],
+                 check=True, stdout=PIPE, universal_newlines=True)
+    return int(result.stdout) / 1024
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    columns = ['time %s' % engine for engine in ENGINES] + ['RSS %s' % engine for engine in ENGINES]
+    print('%-8s' % 'regions' + ''.join('%16s' % column for column in columns))
+    with TemporaryDirectory() as tmpdir:
+        for regions in sizes:
+            filename = join(tmpdir, 'page-%d.xml' % regions)
+            synthetic_page(regions=regions, lines=10, words=10, styles=5).write(filename)
+            times = [best_of(lambda: stream(filename, engine)) for engine in ENGINES] # pylint: disable=cell-var-from-loop
+            print('%-8d' % regions + ''.join('%15.3fs' % seconds for seconds in times)
+                  + ''.join('%13.1fMiB' % child_rss(filename, engine) for engine in ENGINES))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:4])
+    else:
+        main([int(n) for n in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,80 @@
+"""
+Measure the peak resident set size of converting one big page, with both page engines.
+
+    python -m benchmarks.bench_memory [REGIONS]
+
+Each conversion runs in a fresh interpreter, which reports the growth of its
+peak RSS from before parsing the PAGE-XML file to after serializing the ALTO. The "words" page has REGIONS regions of 10 lines with
+10 words each, the "dummy" page 10 times as many lines without Words, so a
+dummy Word is created for every line.
+"""
+import resource
+import sys
+from os.path import join
+from subprocess import run, PIPE
+from tempfile import TemporaryDirectory
+
+from .synthetic import PAGE_NS, synthetic_page
+
+ENGINES = ['lxml', 'generateds']
+
+def _proc_status_kib(field):
+    with open('/proc/self/status', encoding='ascii') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+def peak_rss_kib():
+    """
+    Peak RSS of this process. On Linux from ``/proc``, since ``ru_maxrss``
+    survives exec, i.e. includes the peak of a big parent process
+    """
+    try:
+        return _proc_status_kib('VmHWM:')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def rss_kib():
+    """
+    Current RSS (Linux only), peak RSS elsewhere
+    """
+    try:
+        return _proc_status_kib('VmRSS:')
+    except OSError:
+        return peak_rss_kib()
+
+def child(filename, page_engine):
+    import logging # pylint: disable=import-outside-toplevel
+    from ocrd_page_to_alto.convert import OcrdPageAltoConverter, page_model # pylint: disable=import-outside-toplevel
+    logging.disable(logging.CRITICAL)
+    page_model(page_engine)
+    before = rss_kib()
+    str(OcrdPageAltoConverter(page_filename=filename, page_engine=page_engine, check_words=False).convert())
+    print(peak_rss_kib() - before)
+
+def write_pages(directory, regions):
+    ret = {}
+    page_etree = synthetic_page(regions=regions, lines=10, words=10, styles=5)
+    ret['words'] = join(directory, 'words.xml')
+    page_etree.write(ret['words'])
+    page_etree = synthetic_page(regions=regions * 10, lines=10, words=1)
+    for word in list(page_etree.iter('{%s}Word' % PAGE_NS)):
+        word.getparent().remove(word)
+    ret['dummy'] = join(directory, 'dummy.xml')
+    page_etree.write(ret['dummy'])
+    return ret
+
+def main(regions):
+    with TemporaryDirectory() as tmpdir:
+        print('%-8s' % 'page' + ''.join('%16s' % engine for engine in ENGINES))
+        for name, filename in write_pages(tmpdir, regions).items():
+            results = []
+            for engine in ENGINES:
+                result = run([sys.executable, '-m', 'benchmarks.bench_memory', '--child', filename, engine],
+                             check=True, stdout=PIPE, universal_newlines=True)
+                results.append('%13.1fMiB' % (int(result.stdout) / 1024))
+            print('%-8s' % name + ''.join(results))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:4])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,84 @@
+"""
+Compare writing one ALTO file per page with writing all pages into one
+multi-page ALTO document or ZIP archive, and re-reading the result.
+
+    python -m benchmarks.bench_multipage [PAGES]
+
+Each page is a synthetic PAGE-XML file with 30 regions of 2 lines with 3 words
+and a few distinct TextStyles, converted with the lxml engine.
+"""
+import logging
+import sys
+from glob import glob
+from os import makedirs
+from os.path import getsize, join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from zipfile import ZipFile
+
+from lxml import etree as ET
+
+from ocrd_page_to_alto.convert import ConversionProfile
+from ocrd_page_to_alto.multipage import MultiPageAltoConverter
+
+from .synthetic import synthetic_page
+
+OPTIONS = dict(check_words=False, page_engine='lxml')
+
+def write_pages(directory, pages):
+    filenames = []
+    for page_idx in range(pages):
+        filename = join(directory, 'page_%04d.xml' % page_idx)
+        synthetic_page(regions=30, lines=2, words=3, styles=5).write(filename)
+        filenames.append(filename)
+    return filenames
+
+def per_page(filenames, output_dir):
+    profile = ConversionProfile(**OPTIONS)
+    makedirs(output_dir)
+    for filename in filenames:
+        with open(join(output_dir, filename.rsplit('/', 1)[-1]), 'wb') as output:
+            output.write(str(profile.convert(filename)).encode('utf-8'))
+
+def read_per_page(output_dir):
+    return sum(len(ET.parse(filename).getroot().findall('.//{*}String')) for filename in sorted(glob(join(output_dir, '*.xml'))))
+
+def combined(filenames, output_filename, archive):
+    with MultiPageAltoConverter(**OPTIONS) as converter:
+        for filename in filenames:
+            converter.add_page(filename)
+        with open(output_filename, 'wb') as output:
+            if archive:
+                converter.write_archive(output)
+            else:
+                converter.write(output)
+
+def read_combined(output_filename):
+    if output_filename.endswith('.zip'):
+        with ZipFile(output_filename) as archive:
+            return len(ET.fromstring(archive.read('alto.xml')).findall('.//{*}String'))
+    return len(ET.parse(output_filename).getroot().findall('.//{*}String'))
+
+def timed(fn, *args):
+    t0 = perf_counter()
+    ret = fn(*args)
+    return perf_counter() - t0, ret
+
+def main(pages):
+    logging.disable(logging.CRITICAL)
+    with TemporaryDirectory() as tmpdir:
+        filenames = write_pages(tmpdir, pages)
+        output_dir = join(tmpdir, 'alto')
+        write_seconds, _ = timed(per_page, filenames, output_dir)
+        read_seconds, strings = timed(read_per_page, output_dir)
+        size = sum(getsize(filename) for filename in glob(join(output_dir, '*.xml')))
+        print('%-12s %10s %10s %12s %8s' % ('output', 'write', 'read', 'bytes', 'strings'))
+        print('%-12s %9.2fs %9.2fs %12d %8d' % ('per page', write_seconds, read_seconds, size, strings))
+        for name, archive in (('alto', False), ('zip', True)):
+            output_filename = join(tmpdir, 'combined.' + ('zip' if archive else 'xml'))
+            write_seconds, _ = timed(combined, filenames, output_filename, archive)
+            read_seconds, strings = timed(read_combined, output_filename)
+            print('%-12s %9.2fs %9.2fs %12d %8d' % (name, write_seconds, read_seconds, getsize(output_filename), strings))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
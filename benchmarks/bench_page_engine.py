@@ -0,0 +1,40 @@
+"""
+Compare the generateDS and lxml PAGE engines of OcrdPageAltoConverter.
+
+    python -m benchmarks.bench_page_engine [FILE...]
+
+Without arguments, all PAGE-XML files in tests/data and tests/assets are used.
+"""
+import logging
+import sys
+from glob import glob
+from timeit import repeat
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+
+def default_files():
+    return sorted(f for f in glob('tests/data/*.xml') + glob('tests/assets/**/*.xml', recursive=True)
+                  if 'mets' not in f.lower() and 'alto' not in f.lower())
+
+def time_engine(filename, page_engine, number=5):
+    def run():
+        return str(OcrdPageAltoConverter(page_filename=filename, page_engine=page_engine, check_words=False).convert())
+    run()
+    return min(repeat(run, number=number, repeat=3)) / number
+
+def main(files):
+    logging.disable(logging.CRITICAL)
+    print('%-60s %12s %12s %8s' % ('file', 'generateds', 'lxml', 'speedup'))
+    totals = [0, 0]
+    for filename in files:
+        try:
+            times = [time_engine(filename, engine) for engine in ('generateds', 'lxml')]
+        except Exception as err: # pylint: disable=broad-except
+            print('%-60s %s' % (filename[-60:], err))
+            continue
+        totals = [a + b for a, b in zip(totals, times)]
+        print('%-60s %10.2fms %10.2fms %7.2fx' % (filename[-60:], times[0] * 1000, times[1] * 1000, times[0] / times[1]))
+    print('%-60s %10.2fms %10.2fms %7.2fx' % ('TOTAL', totals[0] * 1000, totals[1] * 1000, totals[0] / totals[1]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or default_files())
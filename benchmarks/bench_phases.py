@@ -0,0 +1,134 @@
+"""
+Time each phase of OcrdPageAltoConverter on synthetic pages and record peak memory.
+
+    python -m benchmarks.bench_phases [--output results.json] [--regions 100,1000] ...
+
+Each combination of the size options is one case. Timings are the minimum of
+``--repeat`` runs; peak memory (via :py:mod:`tracemalloc`) is measured in a
+separate run, since tracing slows down allocation-heavy phases considerably.
+The results are written as JSON, so they can be compared between commits.
+"""
+import json
+import logging
+import platform
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import product
+from subprocess import run, PIPE
+from time import perf_counter
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+
+from .synthetic import synthetic_page
+
+SIZE_OPTIONS = ['regions', 'lines', 'words', 'styles', 'tables', 'table_depth', 'reading_order']
+
+PHASES = [
+    ('parse', None),
+    ('metadata', 'convert_metadata'),
+    ('text', 'convert_text'),
+    ('reading_order', 'convert_reading_order'),
+    ('styles', 'convert_styles'),
+    ('serialize', '__str__'),
+]
+
+def run_phases(page_etree, converter_kwargs, measure):
+    """
+    Run all :py:data:`PHASES` on ``page_etree``, calling ``measure(phase, fn)``
+    for each, and return the results of ``measure`` by phase.
+    """
+    results = {}
+    converter = None
+    for phase, method in PHASES:
+        if method is None:
+            def fn():
+                nonlocal converter
+                converter = OcrdPageAltoConverter(page_etree=page_etree, **converter_kwargs)
+        else:
+            fn = lambda method=method: getattr(converter, method)()
+        results[phase] = measure(phase, fn)
+    return results
+
+def time_phases(page_etree, converter_kwargs):
+    def measure(_, fn):
+        t0 = perf_counter()
+        fn()
+        return perf_counter() - t0
+    return run_phases(page_etree, converter_kwargs, measure)
+
+def peak_memory_phases(page_etree, converter_kwargs):
+    def measure(_, fn):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        results = run_phases(page_etree, converter_kwargs, measure)
+        results['total'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return results
+
+def bench_case(size, converter_kwargs, repeat=3):
+    page_etree = synthetic_page(**size)
+    seconds = {}
+    for _ in range(repeat):
+        for phase, took in time_phases(page_etree, converter_kwargs).items():
+            seconds[phase] = min(took, seconds.get(phase, took))
+    seconds['total'] = sum(seconds.values())
+    return {
+        'size': size,
+        'elements': sum(1 for _ in page_etree.iter()),
+        'seconds': seconds,
+        'peak_memory_bytes': peak_memory_phases(page_etree, converter_kwargs),
+    }
+
+def git_revision():
+    try:
+        return run(['git', 'describe', '--always', '--dirty'], stdout=PIPE, stderr=PIPE, check=True, text=True).stdout.strip()
+    except Exception: # pylint: disable=broad-except
+        return None
+
+def parse_ints(value):
+    return [None if x == 'all' else int(x) for x in value.split(',')]
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--output', '-o', help='Write JSON to this file instead of stdout')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per case')
+    parser.add_argument('--page-engine', default='lxml', choices=['generateds', 'lxml'])
+    parser.add_argument('--alto-version', default='4.2')
+    defaults = {'regions': '100,1000', 'lines': '5', 'words': '8', 'styles': '0,50',
+                'tables': '0', 'table_depth': '1', 'reading_order': 'all'}
+    for option in SIZE_OPTIONS:
+        parser.add_argument('--%s' % option.replace('_', '-'), type=parse_ints, default=parse_ints(defaults[option]),
+                            help='Comma-separated values (default: %s)' % defaults[option])
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+    converter_kwargs = dict(page_engine=args.page_engine, alto_version=args.alto_version, check_words=False)
+    cases = []
+    for values in product(*[getattr(args, option) for option in SIZE_OPTIONS]):
+        size = dict(zip(SIZE_OPTIONS, values))
+        cases.append(bench_case(size, converter_kwargs, repeat=args.repeat))
+        print('%s: %.3fs, %.1f MiB' % (
+            ' '.join('%s=%s' % kv for kv in size.items()),
+            cases[-1]['seconds']['total'], cases[-1]['peak_memory_bytes']['total'] / 2**20), file=sys.stderr)
+    report = {
+        'revision': git_revision(),
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'converter': converter_kwargs,
+        'cases': cases,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+if __name__ == '__main__':
+    main()
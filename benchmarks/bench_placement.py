@@ -0,0 +1,46 @@
+"""
+Measure placing regions into PrintSpace/Margins on pages with many regions.
+
+    python -m benchmarks.bench_placement [N...]
+
+Both columns start from already parsed region boxes. The reference column
+"contains" is the former way: re-reading the ALTO attributes of PrintSpace
+for each region with :py:func:`ocrd_page_to_alto.utils.contains`.
+"""
+import logging
+import sys
+from time import perf_counter
+
+from ocrd_utils import bbox_from_points
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+from ocrd_page_to_alto.utils import contains
+
+from .synthetic import synthetic_page
+
+def contains_placement(converter, regs_bbox):
+    spaces = [converter.alto_printspace] + [
+        converter.alto_page.find(margin) for margin in ['LeftMargin', 'RightMargin', 'TopMargin', 'BottomMargin']]
+    spaces = [space for space in spaces if space is not None]
+    return [next((space for space in spaces if contains(space, reg_bbox)), None) for reg_bbox in regs_bbox]
+
+def bench_regions(regions):
+    converter = OcrdPageAltoConverter(page_etree=synthetic_page(regions, lines=0, words=0), page_engine='lxml', check_words=False)
+    regs_bbox = [bbox_from_points(reg_page.get_Coords().points) for reg_page in converter.page_page.get_AllRegions(depth=1)]
+    results = {}
+    for name, fn in [('place_regions', converter.place_regions),
+                     ('contains', lambda regs_bbox: contains_placement(converter, regs_bbox))]:
+        t0 = perf_counter()
+        fn(regs_bbox)
+        results[name] = perf_counter() - t0
+    return results
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print('%8s %14s %12s' % ('regions', 'place_regions', 'contains'))
+    for regions in sizes:
+        results = bench_regions(regions)
+        print('%8d %12.2fms %10.2fms' % (regions, results['place_regions'] * 1000, results['contains'] * 1000))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 50000])
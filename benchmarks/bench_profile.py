@@ -0,0 +1,43 @@
+"""
+Measure the throughput of converting many small pages with one shared
+ConversionProfile.
+
+    python -m benchmarks.bench_profile [REGIONS...]
+
+Each row converts and serializes an already parsed synthetic page with
+REGIONS regions of 2 lines with 3 words each. "profile" uses one shared
+profile, "options" passes the conversion options to the OcrdPageAltoConverter
+constructor for each page (which looks up a cached profile). The last column
+is the one-off cost of building and validating a profile.
+"""
+import logging
+import sys
+from timeit import repeat
+
+from ocrd_page_to_alto.convert import ConversionProfile, OcrdPageAltoConverter
+from ocrd_page_to_alto import page_lxml
+
+from .synthetic import synthetic_page
+
+OPTIONS = dict(check_words=False, page_engine='lxml')
+
+def bench_regions(regions, number=500):
+    pcgts = page_lxml.parseEtree(synthetic_page(regions=regions, lines=2, words=3))
+    profile = ConversionProfile(**OPTIONS)
+    cases = {
+        'profile': lambda: str(profile.convert(pcgts)),
+        'options': lambda: str(OcrdPageAltoConverter(pcgts=pcgts, **OPTIONS).convert()),
+        'build profile': lambda: ConversionProfile(**OPTIONS),
+    }
+    return {name: min(repeat(case, number=number, repeat=5)) / number for name, case in cases.items()}
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print('%8s %12s %12s %14s' % ('regions', 'profile', 'options', 'build profile'))
+    for regions in sizes:
+        results = bench_regions(regions)
+        print('%8d %8.0f/s %8.0f/s %12.1fus' % (
+            regions, 1 / results['profile'], 1 / results['options'], results['build profile'] * 1e6))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1, 3, 10])
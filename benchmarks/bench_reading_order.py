@@ -0,0 +1,40 @@
+"""
+Measure how reading order conversion scales with the number of regions on a page.
+
+    python -m benchmarks.bench_reading_order [N...]
+
+The reference column "xpath" is the former way of resolving IDNEXT: one
+subtree search of the PrintSpace per reading order entry.
+"""
+import logging
+import sys
+from time import perf_counter
+
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+
+from .synthetic import synthetic_page
+
+def xpath_reading_order(converter):
+    for id_cur, id_next in converter.reading_order_idnext().items():
+        converter.alto_printspace.find('.//*[@ID="%s"]' % id_cur).set('IDNEXT', id_next)
+
+def bench_regions(regions):
+    converter = OcrdPageAltoConverter(page_etree=synthetic_page(regions), page_engine='lxml', check_words=False)
+    converter.convert_text()
+    results = {}
+    for name, fn in [('index', converter.convert_reading_order),
+                     ('xpath', lambda: xpath_reading_order(converter))]:
+        t0 = perf_counter()
+        fn()
+        results[name] = perf_counter() - t0
+    return results
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print('%8s %12s %12s' % ('regions', 'index', 'xpath'))
+    for regions in sizes:
+        results = bench_regions(regions)
+        print('%8d %10.2fms %10.2fms' % (regions, results['index'] * 1000, results['xpath'] * 1000))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [250, 500, 1000, 2000])
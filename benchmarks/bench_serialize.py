@@ -0,0 +1,64 @@
+"""
+Measure the size of the ALTO and the time to serialize it, pretty-printed or
+compact and with Shape at different levels, and writing it to a file as bytes
+compared to as a string.
+
+    python -m benchmarks.bench_serialize [REGIONS...]
+
+The pages have REGIONS regions of 10 lines with 10 words each, times are the
+best of 3 runs and do not include the conversion itself.
+"""
+import logging
+import sys
+from os import devnull
+from time import perf_counter
+
+from ocrd_page_to_alto.convert import ConversionProfile
+
+from .synthetic import synthetic_page
+
+PROFILE = ConversionProfile(check_words=False, page_engine='lxml')
+VARIANTS = [
+    ('pretty', dict()),
+    ('compact', dict(pretty_print=False)),
+    ('compact region,line', dict(pretty_print=False, shape_levels='region,line')),
+    ('compact region', dict(pretty_print=False, shape_levels='region')),
+    ('compact no shapes', dict(pretty_print=False, shape_levels='')),
+]
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    return min(times)
+
+def write_str(converter):
+    with open(devnull, 'w', encoding='utf-8') as output:
+        output.write(str(converter))
+
+def write_bytes(converter):
+    with open(devnull, 'wb') as output:
+        converter.write(output)
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print('%-8s %-22s %12s %12s' % ('regions', 'options', 'size', 'to_bytes'))
+    for regions in sizes:
+        page = synthetic_page(regions=regions, lines=10, words=10, styles=5)
+        for name, options in VARIANTS:
+            converter = PROFILE.replace(**options).convert(page)
+            size = len(converter.to_bytes())
+            seconds = best_of(converter.to_bytes)
+            print('%-8d %-22s %10.1fKiB %10.1fms' % (regions, name, size / 1024, seconds * 1000))
+    print()
+    print('%-8s %14s %14s' % ('regions', 'str + encode', 'write bytes'))
+    for regions in sizes:
+        converter = PROFILE.convert(synthetic_page(regions=regions, lines=10, words=10, styles=5))
+        results = [best_of(lambda: write_str(converter)), # pylint: disable=cell-var-from-loop
+                   best_of(lambda: write_bytes(converter))] # pylint: disable=cell-var-from-loop
+        print('%-8d' % regions + ''.join('%13.1fms' % (seconds * 1000) for seconds in results))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,53 @@
+"""
+Measure the latency of converting single pages with a ``page-to-alto``
+subprocess per page compared to requests to the conversion service.
+
+    python -m benchmarks.bench_server [FILE...]
+
+The service runs in this process with one warm worker, on localhost.
+"""
+import logging
+import sys
+from http.client import HTTPConnection
+from subprocess import run, DEVNULL
+from threading import Thread
+from time import perf_counter
+
+from ocrd_page_to_alto.convert import ConversionProfile
+from ocrd_page_to_alto.server import ConversionService, make_server
+
+from .bench_page_engine import default_files
+
+OPTIONS = dict(check_words=False, page_engine='lxml')
+
+def bench_subprocess(filename, number=3):
+    t0 = perf_counter()
+    for _ in range(number):
+        run([sys.executable, '-m', 'ocrd_page_to_alto.cli', '--no-check-words', '--page-engine', 'lxml', filename],
+            check=True, stdout=DEVNULL, stderr=DEVNULL)
+    return (perf_counter() - t0) / number
+
+def bench_service(connection, filename, number=50):
+    with open(filename, 'rb') as f:
+        page_xml = f.read()
+    t0 = perf_counter()
+    for _ in range(number):
+        connection.request('POST', '/convert', body=page_xml)
+        connection.getresponse().read()
+    return (perf_counter() - t0) / number
+
+def main(files):
+    logging.disable(logging.CRITICAL)
+    with ConversionService(ConversionProfile(**OPTIONS), workers=1) as service:
+        server = make_server(service, port=0)
+        Thread(target=server.serve_forever, daemon=True).start()
+        connection = HTTPConnection(*server.server_address)
+        print('%-60s %12s %12s' % ('file', 'subprocess', 'service'))
+        for filename in files:
+            print('%-60s %10.1fms %10.1fms' % (filename, bench_subprocess(filename) * 1000,
+                                               bench_service(connection, filename) * 1000))
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or default_files())
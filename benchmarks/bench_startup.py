@@ -0,0 +1,33 @@
+"""
+Measure the wall time of running the page-to-alto CLI in a fresh interpreter.
+
+    python -m benchmarks.bench_startup [FILE]
+
+The reference row "import ocrd" is the former cost of importing the CLI, which
+loaded the OCR-D framework for its log level option.
+"""
+import sys
+from subprocess import run, DEVNULL
+from time import perf_counter
+
+def best_of(args, number=5):
+    ret = float('inf')
+    for _ in range(number):
+        t0 = perf_counter()
+        run([sys.executable, *args], check=True, stdout=DEVNULL, stderr=DEVNULL)
+        ret = min(ret, perf_counter() - t0)
+    return ret
+
+def main(filename):
+    cases = {
+        'python': ['-c', 'pass'],
+        'import ocrd': ['-c', 'import ocrd.decorators'],
+        '--help': ['-m', 'ocrd_page_to_alto.cli', '--help'],
+        'convert (lxml)': ['-m', 'ocrd_page_to_alto.cli', '--page-engine', 'lxml', '--no-check-words', filename],
+        'convert (generateds)': ['-m', 'ocrd_page_to_alto.cli', '--no-check-words', filename],
+    }
+    for name, args in cases.items():
+        print('%-30s %10.1fms' % (name, best_of(args) * 1000))
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'tests/data/region_no_line.page.xml')
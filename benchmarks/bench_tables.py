@@ -0,0 +1,40 @@
+"""
+Measure converting tables with nested cells, with both page engines.
+
+    python -m benchmarks.bench_tables [DEPTH...]
+
+"deep" is a single table whose cells are nested DEPTH levels deep (see
+:py:func:`~benchmarks.synthetic.synthetic_nested_table`), "wide" are 4 tables
+of 2 ** 9 cells each with 2 lines of 3 words. A conversion that fails (e.g.
+with a RecursionError in the object model) is reported instead of a time.
+"""
+import logging
+import sys
+from time import perf_counter
+
+from ocrd_page_to_alto.convert import ConversionProfile
+
+from .synthetic import synthetic_nested_table, synthetic_page
+
+ENGINES = ['lxml', 'generateds']
+
+def timed_convert(profile, page_etree):
+    t0 = perf_counter()
+    try:
+        str(profile.convert(page_etree))
+    except RecursionError:
+        return 'RecursionError'
+    return '%.3fs' % (perf_counter() - t0)
+
+def main(depths):
+    logging.disable(logging.CRITICAL)
+    profiles = {engine: ConversionProfile(page_engine=engine, check_words=False) for engine in ENGINES}
+    print('%-12s' % 'table' + ''.join('%16s' % engine for engine in ENGINES))
+    for depth in depths:
+        page_etree = synthetic_nested_table(depth)
+        print('%-12s' % ('deep %d' % depth) + ''.join('%16s' % timed_convert(profiles[engine], page_etree) for engine in ENGINES))
+    page_etree = synthetic_page(regions=0, tables=4, table_depth=9, lines=2, words=3)
+    print('%-12s' % 'wide' + ''.join('%16s' % timed_convert(profiles[engine], page_etree) for engine in ENGINES))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10, 100, 2000])
@@ -0,0 +1,56 @@
+"""
+Measure validating the ALTO of a conversion on the in-memory tree compared to
+re-parsing the serialized document (as a separate validation tool would), and
+compiling the schema anew for every page.
+
+    python -m benchmarks.bench_validate [REGIONS...]
+
+The pages have REGIONS regions of 10 lines with 10 words each, times are the
+best of 3 runs and do not include the conversion itself.
+"""
+import logging
+import sys
+from threading import Thread
+from time import perf_counter
+
+from lxml import etree as ET
+
+from ocrd_page_to_alto.convert import ConversionProfile
+from ocrd_page_to_alto.schema import alto_schema, validate_alto
+
+from .synthetic import synthetic_page
+
+PROFILE = ConversionProfile(check_words=False, page_engine='lxml')
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    return min(times)
+
+def reparse(converter):
+    alto_schema('4.2').validate(ET.fromstring(str(converter).encode('utf-8')))
+
+def recompile(converter):
+    # schemas are compiled once per thread
+    thread = Thread(target=validate_alto, args=(converter.to_etree(), '4.2'))
+    thread.start()
+    thread.join()
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    columns = ['in memory', 're-parse', 'recompile']
+    print('%-8s' % 'regions' + ''.join('%14s' % column for column in columns))
+    for regions in sizes:
+        converter = PROFILE.convert(synthetic_page(regions=regions, lines=10, words=10, styles=5))
+        results = [
+            best_of(lambda: validate_alto(converter.to_etree(), '4.2')), # pylint: disable=cell-var-from-loop
+            best_of(lambda: reparse(converter)), # pylint: disable=cell-var-from-loop
+            best_of(lambda: recompile(converter)), # pylint: disable=cell-var-from-loop
+        ]
+        print('%-8d' % regions + ''.join('%12.1fms' % (seconds * 1000) for seconds in results))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1, 10, 100, 1000])
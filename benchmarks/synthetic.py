@@ -0,0 +1,145 @@
+"""
+Generate synthetic PAGE-XML documents of arbitrary size for benchmarking.
+"""
+from lxml import etree as ET
+
+PAGE_NS = 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
+
+LINE_HEIGHT = 20
+WORD_WIDTH = 50
+
+def _points(x0, y0, x1, y1):
+    return '%d,%d %d,%d %d,%d %d,%d' % (x0, y0, x1, y0, x1, y1, x0, y1)
+
+def _sub(parent, tag, **attrib):
+    return ET.SubElement(parent, '{%s}%s' % (PAGE_NS, tag), attrib)
+
+def _text_equiv(parent, text):
+    _sub(_sub(parent, 'TextEquiv'), 'Unicode').text = text
+
+def _text_style(parent, style_idx):
+    _sub(parent, 'TextStyle',
+         fontFamily='Font %d' % (style_idx // 4),
+         fontSize='%d' % (8 + style_idx % 4),
+         bold='true' if style_idx % 2 else 'false')
+
+class _Generator():
+
+    def __init__(self, lines, words, styles):
+        self.lines = lines
+        self.words = words
+        self.styles = styles
+        self.width = max(words, 1) * WORD_WIDTH + 200
+        self.n_words = 0
+
+    def text_region(self, parent, reg_id, y0):
+        """Add a text region with lines and words at ``y0``, return its height"""
+        height = max(self.lines, 1) * LINE_HEIGHT
+        region = _sub(parent, 'TextRegion', id=reg_id)
+        _sub(region, 'Coords', points=_points(100, y0, self.width - 100, y0 + height - 1))
+        for line_idx in range(self.lines):
+            ly0 = y0 + line_idx * LINE_HEIGHT
+            line = _sub(region, 'TextLine', id='%s_l%d' % (reg_id, line_idx))
+            _sub(line, 'Coords', points=_points(100, ly0, self.width - 100, ly0 + LINE_HEIGHT - 1))
+            for word_idx in range(self.words):
+                wx0 = 100 + word_idx * WORD_WIDTH
+                word = _sub(line, 'Word', id='%s_l%d_w%d' % (reg_id, line_idx, word_idx))
+                _sub(word, 'Coords', points=_points(wx0, ly0, wx0 + WORD_WIDTH - 1, ly0 + LINE_HEIGHT - 1))
+                _text_equiv(word, 'w%d' % word_idx)
+                if self.styles:
+                    _text_style(word, self.n_words % self.styles)
+                self.n_words += 1
+            _text_equiv(line, ' '.join('w%d' % word_idx for word_idx in range(self.words)))
+        return height
+
+    def table_cells(self, parent, reg_id, y0, depth):
+        """Add two cells to ``parent``, nested ``depth`` levels deep, return their height"""
+        height = 0
+        for cell_idx in range(2):
+            cell_id = '%s_c%d' % (reg_id, cell_idx)
+            if depth > 1:
+                cell = _sub(parent, 'TextRegion', id=cell_id)
+                coords = _sub(cell, 'Coords')
+                cell_height = self.table_cells(cell, cell_id, y0 + height, depth - 1)
+                coords.set('points', _points(100, y0 + height, self.width - 100, y0 + height + cell_height - 1))
+            else:
+                cell_height = self.text_region(parent, cell_id, y0 + height)
+            height += cell_height
+        return height
+
+def synthetic_page(regions=1000, lines=1, words=1, styles=0, tables=0, table_depth=1, reading_order=None):
+    """
+    Build a PAGE-XML tree with ``regions`` TextRegions stacked inside the
+    PrintSpace, each with ``lines`` TextLines of ``words`` Words.
+
+    Keyword Args:
+        styles (int): number of distinct TextStyles to cycle through on the Words (0 for none)
+        tables (int): number of TableRegions to add below the TextRegions
+        table_depth (int): nesting depth of TextRegions in each table, which
+            has ``2 ** table_depth`` cells of ``lines`` lines each
+        reading_order (int): number of regions in the ReadingOrder, ``None``
+            for all TextRegions and tables, ``0`` for no ReadingOrder
+
+    Returns an :py:class:`lxml.etree._ElementTree`.
+    """
+    generator = _Generator(lines, words, styles)
+    width = generator.width
+    region_height = max(lines, 1) * LINE_HEIGHT
+    height = (regions + tables * 2 ** table_depth) * region_height + 200
+    pcgts = ET.Element('{%s}PcGts' % PAGE_NS, nsmap={None: PAGE_NS}, pcGtsId='synthetic')
+    metadata = _sub(pcgts, 'Metadata')
+    _sub(metadata, 'Creator').text = 'synthetic'
+    _sub(metadata, 'Created').text = '2020-01-01T00:00:00'
+    _sub(metadata, 'LastChange').text = '2020-01-01T00:00:00'
+    page = _sub(pcgts, 'Page', imageFilename='synthetic.png', imageWidth=str(width), imageHeight=str(height))
+    region_ids = ['r%d' % reg_idx for reg_idx in range(regions)] + ['t%d' % table_idx for table_idx in range(tables)]
+    _sub(_sub(page, 'PrintSpace'), 'Coords', points=_points(50, 50, width - 50, height - 50))
+    if reading_order is None:
+        reading_order = len(region_ids)
+    if reading_order:
+        group = _sub(_sub(page, 'ReadingOrder'), 'OrderedGroup', id='ro0')
+        for ref_idx, region_id in enumerate(region_ids[:reading_order]):
+            _sub(group, 'RegionRefIndexed', index=str(ref_idx), regionRef=region_id)
+    y0 = 100
+    for reg_idx in range(regions):
+        y0 += generator.text_region(page, 'r%d' % reg_idx, y0)
+    for table_idx in range(tables):
+        table = _sub(page, 'TableRegion', id='t%d' % table_idx)
+        coords = _sub(table, 'Coords')
+        table_height = generator.table_cells(table, 't%d' % table_idx, y0, table_depth)
+        coords.set('points', _points(100, y0, width - 100, y0 + table_height - 1))
+        y0 += table_height
+    return ET.ElementTree(pcgts)
+
+def synthetic_nested_table(depth=100, cells=2, lines=1, words=1, styles=0):
+    """
+    Build a PAGE-XML tree with one TableRegion, whose TextRegions are nested
+    ``depth`` levels deep: each level has ``cells`` cells with ``lines`` TextLines
+    of ``words`` Words, plus (except for the last) one cell with the next level.
+
+    Built iteratively, so ``depth`` is not limited by the recursion limit.
+
+    Returns an :py:class:`lxml.etree._ElementTree`.
+    """
+    generator = _Generator(lines, words, styles)
+    width = generator.width
+    region_height = max(lines, 1) * LINE_HEIGHT
+    height = depth * cells * region_height + 200
+    pcgts = ET.Element('{%s}PcGts' % PAGE_NS, nsmap={None: PAGE_NS}, pcGtsId='synthetic')
+    metadata = _sub(pcgts, 'Metadata')
+    _sub(metadata, 'Creator').text = 'synthetic'
+    _sub(metadata, 'Created').text = '2020-01-01T00:00:00'
+    _sub(metadata, 'LastChange').text = '2020-01-01T00:00:00'
+    page = _sub(pcgts, 'Page', imageFilename='synthetic.png', imageWidth=str(width), imageHeight=str(height))
+    _sub(_sub(page, 'PrintSpace'), 'Coords', points=_points(50, 50, width - 50, height - 50))
+    y0 = 100
+    parent_id = 't0'
+    parent = _sub(page, 'TableRegion', id=parent_id)
+    for level in range(depth):
+        _sub(parent, 'Coords', points=_points(100, y0, width - 100, height - 101))
+        for cell_idx in range(cells):
+            y0 += generator.text_region(parent, '%s_c%d' % (parent_id, cell_idx), y0)
+        if level < depth - 1:
+            parent_id = 't0_n%d' % level
+            parent = _sub(parent, 'TextRegion', id=parent_id)
+    return ET.ElementTree(pcgts)
@@ -0,0 +1,178 @@
+"""
+Convert PAGE-XML to ALTO from asyncio code, e.g. in an async ingest service:
+conversions run in a pool of warm worker processes, files are read and written
+in threads, so the event loop is never blocked.
+
+    async with AsyncConverter(ConversionProfile(page_engine='lxml'), workers=4) as converter:
+        async for result in converter.convert_many(filenames):
+            ...
+"""
+import asyncio
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from os import cpu_count, fspath, makedirs
+from os.path import dirname
+from time import perf_counter
+
+from pebble import ProcessPool
+
+from .server import convert_page_xml, init_worker
+
+AsyncResult = namedtuple('AsyncResult', ['index', 'input_filename', 'output_filename', 'alto', 'error', 'seconds', 'stats'], defaults=[None])
+AsyncResult.__doc__ = """
+Outcome of converting one source of :py:meth:`AsyncConverter.convert_many`.
+``index`` is the position of the source in ``sources``, ``input_filename`` is
+``None`` for sources given as bytes. ``alto`` is the ALTO document (bytes), or
+``None`` if it was written to ``output_filename`` or on failure. ``error`` is
+``None`` on success, otherwise a string describing the failure. ``stats`` is
+the :py:class:`~ocrd_page_to_alto.stats.ConversionStats` of the converter, if enabled.
+"""
+
+def _ping():
+    return True
+
+def _read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def _write(filename, data):
+    if dirname(filename):
+        makedirs(dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+async def _iterate(sources):
+    if hasattr(sources, '__aiter__'):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+class AsyncConverter():
+    """
+    Converts PAGE-XML documents to ALTO with a :py:class:`~ocrd_page_to_alto.convert.ConversionProfile`
+    in a pool of worker processes, awaitable from asyncio code. Use as an async context
+    manager, or :py:meth:`start` and :py:meth:`stop` it.
+
+    Keyword Args:
+        profile (ConversionProfile): Conversion options for all pages (the defaults if ``None``)
+        workers (int): Number of worker processes (0 for one per CPU)
+        max_in_flight (int): Number of sources read, converted or written at the same time by
+            :py:meth:`convert_many`, further sources are only taken once one of them is
+            done (0 for twice the number of workers)
+        timeout (float): Seconds after which a conversion is aborted and its worker
+            restarted (0 for no limit)
+    """
+
+    def __init__(self, profile=None, workers=1, max_in_flight=0, timeout=0):
+        if profile is None:
+            from .convert import ConversionProfile # pylint: disable=import-outside-toplevel
+            profile = ConversionProfile()
+        self.profile = profile
+        self.workers = workers or cpu_count()
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.timeout = timeout or None
+        self._pool = None
+
+    async def start(self):
+        """
+        Start the worker processes and wait until they are ready
+        """
+        self._pool = ProcessPool(max_workers=self.workers, initializer=init_worker, initargs=(self.profile,))
+        await asyncio.gather(*[asyncio.wrap_future(self._pool.schedule(_ping)) for _ in range(self.workers)])
+        return self
+
+    async def stop(self):
+        """
+        Stop the worker processes, aborting conversions still running
+        """
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.stop()
+            await asyncio.get_running_loop().run_in_executor(None, pool.join)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def convert(self, source, index=0):
+        """
+        Convert a single ``source`` (see :py:meth:`convert_many`).
+
+        Never raises (except when cancelled), failures are returned as
+        :py:class:`AsyncResult` with ``error`` set.
+        """
+        if self._pool is None:
+            raise RuntimeError("AsyncConverter has not been started")
+        input_, output_filename = source if isinstance(source, tuple) else (source, None)
+        input_filename = None if isinstance(input_, (bytes, bytearray)) else fspath(input_)
+        loop = asyncio.get_running_loop()
+        t0 = perf_counter()
+        try:
+            page_xml = input_ if input_filename is None else await loop.run_in_executor(None, _read, input_filename)
+            # cancelling the awaiting task cancels the pool's future, which aborts a running conversion
+            alto_xml, stats = await asyncio.wrap_future(
+                self._pool.schedule(convert_page_xml, args=(page_xml,), timeout=self.timeout))
+            if output_filename is not None:
+                await loop.run_in_executor(None, _write, output_filename, alto_xml)
+                alto_xml = None
+        except asyncio.CancelledError: # pylint: disable=try-except-raise
+            # an Exception before Python 3.8
+            raise
+        except FutureTimeoutError:
+            return AsyncResult(index, input_filename, output_filename, None,
+                               'Conversion exceeded %ss' % self.timeout, perf_counter() - t0)
+        except Exception as err: # pylint: disable=broad-except
+            return AsyncResult(index, input_filename, output_filename, None,
+                               '%s: %s' % (err.__class__.__name__, err), perf_counter() - t0)
+        return AsyncResult(index, input_filename, output_filename, alto_xml, None, perf_counter() - t0, stats)
+
+    async def convert_many(self, sources):
+        """
+        Convert all ``sources`` (an iterable or async iterable) and yield an
+        :py:class:`AsyncResult` for each, in completion order.
+
+        A source is a PAGE-XML filename or document (bytes), or a pair of that and the
+        filename to write the ALTO to. At most ``max_in_flight`` sources are taken from
+        ``sources`` and not yet yielded at any time, so a slow consumer or a slow pool
+        holds back a fast producer. A failing source does not abort the others.
+
+        Closing the generator (e.g. with :py:func:`contextlib.aclosing`) or cancelling the
+        task iterating it cancels all conversions in flight.
+        """
+        sources = _iterate(sources)
+        pending = set()
+        index = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        source = await sources.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self.convert(source, index)))
+                    index += 1
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for result in sorted((task.result() for task in done), key=lambda result: result.index):
+                    yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await sources.aclose()
+
+async def convert_many(sources, profile=None, **kwargs):
+    """
+    Convert all ``sources`` with a new :py:class:`AsyncConverter` (with ``profile``
+    and ``kwargs``), see :py:meth:`AsyncConverter.convert_many`.
+    """
+    async with AsyncConverter(profile, **kwargs) as converter:
+        async for result in converter.convert_many(sources):
+            yield result
@@ -0,0 +1,488 @@
+"""
+Conversion of ALTO to PAGE-XML, the reverse of :py:class:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter`.
+
+The ALTO is read with :py:func:`lxml.etree.iterparse`: each block in PrintSpace
+or a Margin is converted to a PAGE region as soon as it has been parsed and then
+discarded, so memory does not grow with the size of the page.
+"""
+# pylint: disable=c-extension-no-member
+from datetime import datetime, timezone
+from json import loads
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+
+from lxml import etree as ET
+from ocrd_utils import getLogger
+
+from .convert import (
+    NAMESPACES,
+    REGION_ALTO_TO_PAGE,
+    STREAM_SLOT_PI,
+    STREAM_SLOT_RE,
+    STREAM_SPOOL_SIZE,
+    XSI_SCHEMA_LOCATION,
+    _no_phase)
+from .stats import ConversionStats
+from .styles import TextStylesManager, ParagraphStyleManager, LayoutTagManager
+from .utils import alto_lang_to_page
+
+PAGE_SCHEMA_LOCATION = '%s %s/pagecontent.xsd' % (NAMESPACES['page'], NAMESPACES['page'])
+
+ALTO_SPACES = ['TopMargin', 'LeftMargin', 'RightMargin', 'BottomMargin', 'PrintSpace']
+
+# factor to multiply by the resolution in DPI to convert to pixels, by ALTO MeasurementUnit
+MEASUREMENT_UNITS = {'mm10': 1 / 254, 'inch1200': 1 / 1200}
+
+class AltoPageConverter():
+    """
+    Conversion of a single ALTO document to PAGE-XML (2019-07-15).
+
+    Blocks become regions (see :py:data:`~ocrd_page_to_alto.convert.REGION_ALTO_TO_PAGE`),
+    TextLines and Strings become TextLines and Words with TextEquivs, the text of
+    regions and lines is concatenated from their Words. TextStyles, ParagraphStyles and
+    LayoutTags become TextStyles, ``@align`` and ``@type``, ``@IDNEXT`` the ReadingOrder,
+    the Margins and PrintSpace become Border and PrintSpace, processing steps become
+    MetadataItems.
+
+    What :py:class:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter` added is undone:
+    dummy TextLines and Words, placeholder Strings of empty lines, HYP of trailing dashes
+    and the ComposedBlocks of regions with nested regions.
+    """
+
+    def __init__(self, *, alto_filename=None, alto_etree=None, dpi=None, stats=False, logger=None):
+        """
+        Exactly one of ``alto_filename`` and ``alto_etree`` is required as input.
+
+        Keyword Args:
+            alto_filename (string): ALTO file (or binary file handle) to convert, parsed incrementally
+            alto_etree (lxml.etree._Element|lxml.etree._ElementTree): Already parsed ALTO to convert (not modified)
+            dpi (float): Resolution of the image, required for ALTO with a MeasurementUnit other than pixel
+            stats (boolean): Whether to record timings per phase and element counts in ``stats``
+            logger (logging.Logger): Logger to use instead of ``page-to-alto``
+        """
+        if not alto_filename and alto_etree is None:
+            raise ValueError("Must pass either alto_etree or alto_filename to constructor")
+        if dpi is not None and dpi <= 0:
+            raise ValueError("Invalid value for dpi: %r (must be positive)" % (dpi,))
+        self.alto_filename = alto_filename
+        self.alto_etree = alto_etree
+        self.dpi = dpi
+        self.logger = logger if logger else getLogger('page-to-alto')
+        self.stats = ConversionStats() if stats else None
+        self._phase = self.stats.phase if stats else _no_phase
+        self.textstyle_mgr = TextStylesManager('4.2')
+        self.parastyle_mgr = ParagraphStyleManager('4.2')
+        self.layouttag_mgr = LayoutTagManager('4.2')
+        self.page_pcgts, self.page_metadata, self.page_page = self.create_page()
+        # ALTO namespace in Clark notation ('{...}' or '' for ALTO without namespace)
+        self._ns = None
+        # factor from ALTO MeasurementUnit to pixels
+        self._scale = 1
+        # PAGE attributes by ALTO style/tag ID
+        self._styles = {}
+        # (ID, IDNEXT) of the blocks, in document order
+        self._idnext = []
+        self._spaces = {}
+        # HPOS, VPOS, WIDTH and HEIGHT of a PrintSpace without Shape
+        self._implicit_pspace = None
+        self._image_filename = None
+        self._alto_page = None
+        self._converted = False
+
+    def create_page(self):
+        page_pcgts = ET.Element('PcGts')
+        page_pcgts.set('xmlns', NAMESPACES['page'])
+        page_pcgts.set(XSI_SCHEMA_LOCATION, PAGE_SCHEMA_LOCATION)
+        page_metadata = ET.SubElement(page_pcgts, 'Metadata')
+        page_page = ET.SubElement(page_pcgts, 'Page')
+        return page_pcgts, page_metadata, page_page
+
+    def __str__(self):
+        return self.to_bytes().decode('utf-8')
+
+    def to_bytes(self):
+        """
+        Serialize the PAGE-XML document to UTF-8 bytes
+        """
+        with self._phase('serialize'):
+            ret = ET.tostring(self.page_pcgts, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+        if self.stats is not None:
+            self.logger.debug("Conversion stats: %s", self.stats)
+        return ret
+
+    def write(self, output):
+        """
+        Serialize the PAGE-XML document to the binary file handle ``output``
+        """
+        with self._phase('serialize'):
+            ET.ElementTree(self.page_pcgts).write(output, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+        if self.stats is not None:
+            self.logger.debug("Conversion stats: %s", self.stats)
+
+    def to_etree(self):
+        return self.page_pcgts
+
+    def convert(self):
+        """
+        Convert the ALTO into the PAGE-XML tree, see :py:meth:`to_etree`
+        """
+        for reg_page in self.convert_regions():
+            self.page_page.append(reg_page)
+        self.finish_page()
+        return self
+
+    def stream(self, output):
+        """
+        Convert and write the PAGE-XML incrementally to the binary file handle ``output``.
+
+        Each region is serialized into a (spooled) buffer right after conversion and
+        discarded. Since Border, PrintSpace and ReadingOrder must precede the regions,
+        but are only known at the end of the ALTO Page, the skeleton of the document is
+        serialized last and the buffer spliced into it.
+
+        The result is byte-identical to ``self.convert().to_bytes()``.
+        """
+        with SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE) as buffer:
+            staging = ET.Element('Staging')
+            for reg_page in self.convert_regions():
+                with self._phase('serialize'):
+                    staging.append(reg_page)
+                    ET.indent(reg_page, level=2)
+                    buffer.write(b'    ')
+                    buffer.write(ET.tostring(reg_page, encoding='UTF-8', with_tail=False))
+                    buffer.write(b'\n')
+                    staging.remove(reg_page)
+            self.finish_page()
+            with self._phase('serialize'):
+                self.page_page.append(ET.ProcessingInstruction(STREAM_SLOT_PI, '0'))
+                skeleton = ET.tostring(self.page_pcgts, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+                self.page_page.remove(self.page_page[-1])
+                head, _, tail = STREAM_SLOT_RE.split(skeleton)
+                output.write(head)
+                buffer.seek(0)
+                copyfileobj(buffer, output)
+                output.write(tail)
+        if self.stats is not None:
+            self.logger.debug("Conversion stats: %s", self.stats)
+        return self
+
+    def _events(self):
+        tags = ['{*}%s' % tag for tag in ['Description', 'Styles', 'Tags', 'Page'] + ALTO_SPACES + list(REGION_ALTO_TO_PAGE)]
+        if self.alto_etree is not None:
+            return ET.iterwalk(self.alto_etree, events=('end',), tag=tags)
+        return ET.iterparse(self.alto_filename, events=('end',), tag=tags, remove_blank_text=True)
+
+    def convert_regions(self):
+        """
+        Parse the ALTO and yield a PAGE region (detached from the PAGE tree) for each
+        block in PrintSpace or a Margin, in document order. Metadata, styles, Border
+        and PrintSpace are collected on the way, see :py:meth:`finish_page`.
+        """
+        if self._converted:
+            raise RuntimeError("AltoPageConverter can only convert once")
+        self._converted = True
+        # blocks of a parsed file are discarded once converted, those of a tree passed in are kept
+        discard = self.alto_etree is None
+        t0 = perf_counter()
+        for _, el in self._events():
+            if self._ns is None:
+                self._ns = el.tag[:el.tag.index('}') + 1] if el.tag.startswith('{') else ''
+            name = el.tag[len(self._ns):]
+            if name in REGION_ALTO_TO_PAGE:
+                parent = el.getparent()
+                if parent is None or parent.tag[len(self._ns):] not in ALTO_SPACES:
+                    # nested blocks are converted with their top-level block
+                    continue
+                if self.stats is not None:
+                    self.stats.seconds['parse'] += perf_counter() - t0
+                with self._phase('text'):
+                    reg_page = self.convert_block(el)
+                yield reg_page
+                if discard:
+                    el.clear()
+                    parent.remove(el)
+                t0 = perf_counter()
+            elif name in ALTO_SPACES:
+                self._spaces[name] = self._points(el, None)
+                if name == 'PrintSpace' and el.find('%sShape' % self._ns) is None:
+                    self._implicit_pspace = (el.get('HPOS'), el.get('VPOS'), el.get('WIDTH'), el.get('HEIGHT'))
+            elif name == 'Page':
+                if self._alto_page is not None:
+                    raise ValueError("ALTO has more than one Page, cannot convert multi-page ALTO to PAGE-XML")
+                self._alto_page = dict(el.attrib)
+            elif name == 'Description':
+                with self._phase('metadata'):
+                    self.convert_metadata(el)
+            else:
+                with self._phase('styles'):
+                    self.convert_styles(el)
+        if self.stats is not None:
+            self.stats.seconds['parse'] += perf_counter() - t0
+        if self._alto_page is None:
+            raise ValueError("ALTO has no Page")
+
+    def finish_page(self):
+        """
+        Set the attributes of the PAGE Page and add Border, PrintSpace and ReadingOrder,
+        once all regions have been converted.
+        """
+        alto_page = self._alto_page
+        self.page_pcgts.set('pcGtsId', alto_page.get('ID') or 'page0')
+        self.page_page.set('imageFilename', self._image_filename or '')
+        self.page_page.set('imageWidth', str(self._scaled(alto_page.get('WIDTH'))))
+        self.page_page.set('imageHeight', str(self._scaled(alto_page.get('HEIGHT'))))
+        if alto_page.get('PAGECLASS'):
+            self.page_page.set('type', alto_page['PAGECLASS'])
+        position = 0
+        margins = [points for name, points in self._spaces.items() if name != 'PrintSpace' and points]
+        pspace = self._spaces.get('PrintSpace')
+        if not margins and self._implicit_pspace == ('0', '0', alto_page.get('WIDTH'), alto_page.get('HEIGHT')):
+            # made up for PAGE-XML without Border and PrintSpace
+            pspace = None
+        if margins:
+            xs, ys = zip(*(map(int, xy.split(',')) for points in margins + [pspace or ''] for xy in points.split()))
+            border = ET.Element('Border')
+            ET.SubElement(border, 'Coords', points=_rect_points(min(xs), min(ys), max(xs), max(ys)))
+            self.page_page.insert(position, border)
+            position += 1
+        if pspace:
+            page_pspace = ET.Element('PrintSpace')
+            ET.SubElement(page_pspace, 'Coords', points=pspace)
+            self.page_page.insert(position, page_pspace)
+            position += 1
+        with self._phase('reading_order'):
+            page_ro = self.convert_reading_order()
+        if page_ro is not None:
+            self.page_page.insert(position, page_ro)
+        if self.stats is not None:
+            self.stats.counts['pages'] += 1
+
+    def convert_metadata(self, alto_description):
+        ns = self._ns
+        unit = alto_description.findtext(ns + 'MeasurementUnit')
+        if unit and unit.strip() != 'pixel':
+            unit = unit.strip()
+            if unit not in MEASUREMENT_UNITS:
+                raise ValueError("Unknown ALTO MeasurementUnit '%s'" % unit)
+            if not self.dpi:
+                raise ValueError("ALTO MeasurementUnit is %s, the resolution (dpi) is required to convert to pixels" % unit)
+            self._scale = self.dpi * MEASUREMENT_UNITS[unit]
+        self._image_filename = alto_description.findtext('%ssourceImageInformation/%sfileName' % (ns, ns))
+        steps = alto_description.findall(ns + 'Processing') + alto_description.findall(
+            '%sOCRProcessing/%socrProcessingStep' % (ns, ns))
+        timestamps = []
+        items = []
+        for step_alto in steps:
+            item = ET.Element('MetadataItem', type='processingStep',
+                              name=step_alto.findtext(ns + 'processingStepDescription') or '',
+                              value=step_alto.findtext('%sprocessingSoftware/%ssoftwareName' % (ns, ns)) or '')
+            settings = step_alto.findtext(ns + 'processingStepSettings')
+            if settings:
+                try:
+                    labels = loads(settings)
+                except ValueError:
+                    labels = None
+                if isinstance(labels, dict):
+                    page_labels = ET.SubElement(item, 'Labels')
+                    for label_type, label_value in labels.items():
+                        ET.SubElement(page_labels, 'Label', value=str(label_value), type=str(label_type))
+            timestamp = step_alto.findtext(ns + 'processingDateTime')
+            if timestamp:
+                timestamps.append(timestamp.strip())
+            items.append(item)
+        ET.SubElement(self.page_metadata, 'Creator').text = 'alto-to-page'
+        timestamp = max(timestamps) if timestamps else datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        ET.SubElement(self.page_metadata, 'Created').text = min(timestamps) if timestamps else timestamp
+        ET.SubElement(self.page_metadata, 'LastChange').text = timestamp
+        self.page_metadata.extend(items)
+
+    def convert_styles(self, alto_styles):
+        managers = {'TextStyle': self.textstyle_mgr, 'ParagraphStyle': self.parastyle_mgr, 'LayoutTag': self.layouttag_mgr}
+        for alto_style in alto_styles:
+            if not isinstance(alto_style.tag, str):
+                continue
+            manager = managers.get(alto_style.tag[len(self._ns):])
+            if manager is not None and alto_style.get('ID'):
+                self._styles[alto_style.get('ID')] = (manager, manager.to_page(alto_style))
+
+    def convert_reading_order(self):
+        """
+        The PAGE ReadingOrder of the chains of ``@IDNEXT`` of the blocks, or ``None`` if there are none
+        """
+        idnext = dict(self._idnext)
+        if not any(idnext.values()):
+            return None
+        targets = set(idnext.values())
+        order = []
+        seen = set()
+        for block_id, block_idnext in self._idnext:
+            if not block_idnext or block_id in targets or block_id in seen:
+                continue
+            while block_id and block_id not in seen:
+                if block_id not in idnext:
+                    self.logger.warning("IDNEXT '%s' is not a converted block, not in ReadingOrder", block_id)
+                    break
+                seen.add(block_id)
+                order.append(block_id)
+                block_id = idnext[block_id]
+        page_ro = ET.Element('ReadingOrder')
+        group = ET.SubElement(page_ro, 'OrderedGroup', id='ro_0', caption='Regions reading order')
+        for index, region_id in enumerate(order):
+            ET.SubElement(group, 'RegionRefIndexed', index=str(index), regionRef=region_id)
+        return page_ro
+
+    def convert_block(self, block_alto):
+        """
+        Convert ALTO block ``block_alto`` and all blocks nested in it, to any depth.
+
+        Blocks are walked with an explicit stack instead of recursion. A ComposedBlock
+        that starts with a block of its own content (``<ID>-<element>``, as written for
+        regions with nested regions) becomes a region of that block's type, other
+        ComposedBlocks become TableRegions.
+
+        Returns the PAGE region of ``block_alto``.
+        """
+        ns = self._ns
+        ret = None
+        # PAGE parent, position in it (nested regions come right after Coords), ALTO block, points of the parent
+        stack = [(None, 0, block_alto, None)]
+        while stack:
+            parent_page, position, block_alto, parent_points = stack.pop()
+            block_id = block_alto.get('ID')
+            points = self._points(block_alto, parent_points)
+            children = [child for child in block_alto if isinstance(child.tag, str) and child.tag[len(ns):] in REGION_ALTO_TO_PAGE]
+            content_alto = block_alto
+            if children and children[0].get('ID') == '%s-%s' % (block_id, children[0].tag[len(ns):]):
+                content_alto = children.pop(0)
+                self._idnext.append((content_alto.get('ID'), None))
+            reg_type = REGION_ALTO_TO_PAGE[content_alto.tag[len(ns):]]
+            reg_page = ET.Element('%sRegion' % reg_type, id=block_id)
+            self._idnext.append((block_id, block_alto.get('IDNEXT')))
+            for style_ref in (block_alto.get('STYLEREFS') or '').split() + (block_alto.get('TAGREFS') or '').split():
+                attributes = self._styles.get(style_ref, (None, None))[1]
+                if attributes and self._styles[style_ref][0] is not self.textstyle_mgr:
+                    for att, val in attributes.items():
+                        reg_page.set(att, val)
+            if block_alto.get('TYPE') and reg_page.get('type') is None:
+                reg_page.set('type', block_alto.get('TYPE'))
+            self._set_language(reg_page, block_alto, 'primaryLanguage')
+            ET.SubElement(reg_page, 'Coords', points=points)
+            if parent_page is not None:
+                parent_page.insert(position, reg_page)
+            if ret is None:
+                ret = reg_page
+            if reg_type == 'Text':
+                self.convert_textlines(reg_page, content_alto, points)
+            if self.stats is not None:
+                self.stats.counts['regions'] += 1
+            # reversed, so the nested blocks are converted (and appended) in order
+            stack.extend((reg_page, 1 + child_idx, child, points) for child_idx, child in reversed(list(enumerate(children))))
+        return ret
+
+    def convert_textlines(self, reg_page, block_alto, points):
+        ns = self._ns
+        block_id = reg_page.get('id')
+        lines_text = []
+        for line_alto in block_alto.iterchildren(ns + 'TextLine'):
+            line_id = line_alto.get('ID')
+            words = []
+            hyphen = ''
+            for child in line_alto:
+                if not isinstance(child.tag, str):
+                    continue
+                child_name = child.tag[len(ns):]
+                if child_name == 'String':
+                    words.append(child)
+                elif child_name == 'HYP':
+                    hyphen = child.get('CONTENT') or ''
+            if len(words) == 1 and words[0].get('ID') == '%s-word0' % line_id and not words[0].get('CONTENT'):
+                # placeholder of an empty line
+                words = []
+            texts = [word_alto.get('CONTENT') or '' for word_alto in words]
+            if texts and hyphen:
+                texts[-1] += hyphen
+            line_text = ' '.join(texts)
+            lines_text.append(line_text)
+            if line_id == '%s-dummy-TextLine' % block_id:
+                # text of a region without TextLines
+                continue
+            if self.stats is not None:
+                self.stats.counts['lines'] += 1
+            line_points = self._points(line_alto, points)
+            line_page = ET.SubElement(reg_page, 'TextLine', id=line_id)
+            self._set_language(line_page, line_alto, 'primaryLanguage')
+            ET.SubElement(line_page, 'Coords', points=line_points)
+            if len(words) == 1 and words[0].get('ID') == '%s-dummy-Word' % line_id:
+                # text of a TextLine without Words
+                words = []
+            for word_alto, word_text in zip(words, texts):
+                word_page = ET.SubElement(line_page, 'Word', id=word_alto.get('ID'))
+                self._set_language(word_page, word_alto, 'language')
+                ET.SubElement(word_page, 'Coords', points=self._points(word_alto, line_points))
+                _text_equiv(word_page, word_text)
+                self._set_textstyle(word_page, word_alto)
+            if self.stats is not None:
+                self.stats.counts['words'] += len(words)
+            if texts:
+                _text_equiv(line_page, line_text)
+            self._set_textstyle(line_page, line_alto)
+        if lines_text:
+            _text_equiv(reg_page, '\n'.join(lines_text))
+        self._set_textstyle(reg_page, block_alto)
+
+    def _set_textstyle(self, el_page, el_alto):
+        for style_ref in (el_alto.get('STYLEREFS') or '').split():
+            manager, attributes = self._styles.get(style_ref, (None, None))
+            if manager is self.textstyle_mgr:
+                ET.SubElement(el_page, 'TextStyle', attributes)
+                return
+
+    def _set_language(self, el_page, el_alto, attribute_name):
+        lang_alto = el_alto.get('LANG') or el_alto.get('language')
+        if lang_alto:
+            lang_page = alto_lang_to_page(lang_alto)
+            if lang_page:
+                el_page.set(attribute_name, lang_page)
+
+    def _scaled(self, val):
+        if val is None:
+            return 0
+        try:
+            val = int(val)
+        except ValueError:
+            val = float(val)
+        return val if self._scale == 1 and isinstance(val, int) else round(val * self._scale)
+
+    def _points(self, el, fallback):
+        """
+        PAGE points of the Shape/Polygon of ALTO element ``el``, or else its HPOS/VPOS/WIDTH/HEIGHT,
+        or else ``fallback``
+        """
+        polygon = el.find('%sShape/%sPolygon' % (self._ns, self._ns))
+        if polygon is not None and polygon.get('POINTS'):
+            points = polygon.get('POINTS')
+            if self._scale == 1 and ',' in points and '.' not in points:
+                return points
+            # ALTO also allows "x y x y ..."
+            values = [self._scaled(val) for val in points.replace(',', ' ').split()]
+            return ' '.join('%d,%d' % xy for xy in zip(values[0::2], values[1::2]))
+        if el.get('HPOS') is None or el.get('VPOS') is None:
+            return fallback or '0,0 0,0 0,0 0,0'
+        x0 = self._scaled(el.get('HPOS'))
+        y0 = self._scaled(el.get('VPOS'))
+        x1 = self._scaled(_add(el.get('HPOS'), el.get('WIDTH')))
+        y1 = self._scaled(_add(el.get('VPOS'), el.get('HEIGHT')))
+        return _rect_points(x0, y0, x1, y1)
+
+def _add(pos, size):
+    try:
+        return str(int(pos) + int(size or 0))
+    except ValueError:
+        return str(float(pos) + float(size or 0))
+
+def _rect_points(x0, y0, x1, y1):
+    return '%d,%d %d,%d %d,%d %d,%d' % (x0, y0, x1, y0, x1, y1, x0, y1)
+
+def _text_equiv(el_page, text):
+    ET.SubElement(ET.SubElement(el_page, 'TextEquiv'), 'Unicode').text = text
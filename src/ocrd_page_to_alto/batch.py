@@ -0,0 +1,232 @@
+"""
+Convert many PAGE-XML (or ALTO) files in one long-lived process, optionally
+fanned out across a pool of worker processes.
+"""
+from collections import namedtuple
+from functools import partial
+from glob import glob, has_magic
+from multiprocessing import Pool
+from os import makedirs, replace, unlink
+from os.path import abspath, dirname, isdir, join, basename, splitext
+from time import perf_counter
+
+from .stats import ConversionStats
+
+DEFAULT_OUTPUT_TEMPLATE = '{stem}.alto.xml'
+DEFAULT_PAGE_OUTPUT_TEMPLATE = '{stem}.page.xml'
+
+BatchResult = namedtuple('BatchResult', ['input_filename', 'output_filename', 'error', 'seconds', 'stats', 'validation'],
+                         defaults=[None, None])
+BatchResult.__doc__ = """
+Outcome of converting a single file in a batch. ``error`` is ``None`` on
+success, otherwise a string describing the failure. ``stats`` is the
+:py:class:`~ocrd_page_to_alto.stats.ConversionStats` of the converter, if enabled.
+``validation`` is the list of :py:class:`~ocrd_page_to_alto.schema.SchemaViolation`
+of the output (empty if valid), if validated.
+"""
+
+def expand_inputs(inputs):
+    """
+    Expand a list of filenames, directories and glob patterns into a list of
+    XML filenames, keeping the order of ``inputs`` and dropping duplicates.
+
+    Directories are searched (non-recursively) for ``*.xml`` files, matches
+    of directories and glob patterns are sorted.
+    """
+    filenames = {}
+    for input_ in inputs:
+        if isdir(input_):
+            filenames.update(dict.fromkeys(sorted(glob(join(input_, '*.xml')))))
+        elif has_magic(input_):
+            filenames.update(dict.fromkeys(sorted(glob(input_, recursive=True))))
+        else:
+            filenames[input_] = None
+    return list(filenames)
+
+def output_filename_for(input_filename, output_dir=None, output_template=DEFAULT_OUTPUT_TEMPLATE):
+    """
+    Determine the output filename for ``input_filename``.
+
+    ``output_template`` is a :py:meth:`str.format` template with the fields
+    ``stem`` (basename without the last extension), ``name`` (basename) and
+    ``dir`` (directory of the input file). If ``output_dir`` is given, the
+    result is relative to it.
+    """
+    name = basename(input_filename)
+    output_filename = output_template.format(
+        stem=splitext(name)[0],
+        name=name,
+        dir=dirname(input_filename) or '.')
+    if output_dir:
+        output_filename = join(output_dir, output_filename)
+    return output_filename
+
+def check_output_filenames(jobs):
+    """
+    Raise a ValueError if several ``(input_filename, output_filename)`` pairs of ``jobs``
+    have the same output file (e.g. inputs of the same name from different directories).
+    """
+    inputs = {}
+    for input_filename, output_filename in jobs:
+        other = inputs.setdefault(abspath(output_filename), input_filename)
+        if other != input_filename:
+            raise ValueError("%s and %s would both be written to %s" % (other, input_filename, output_filename))
+
+def convert_file(converter_kwargs, job, streaming=False):
+    """
+    Convert the PAGE-XML file ``job[0]`` and write the ALTO to ``job[1]``,
+    with :py:meth:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter.stream` if ``streaming``.
+
+    Never raises, failures are returned as :py:class:`BatchResult` with ``error`` set.
+    """
+    # not imported at module level, so the CLI starts fast
+    from .convert import OcrdPageAltoConverter # pylint: disable=import-outside-toplevel
+    return _convert_to_file(lambda filename: OcrdPageAltoConverter(page_filename=filename, **converter_kwargs), job, streaming)
+
+def convert_alto_file(converter_kwargs, job, streaming=False):
+    """
+    Convert the ALTO file ``job[0]`` and write the PAGE-XML to ``job[1]``, like
+    :py:func:`convert_file` but with :py:class:`~ocrd_page_to_alto.alto_to_page.AltoPageConverter`.
+    """
+    from .alto_to_page import AltoPageConverter # pylint: disable=import-outside-toplevel
+    return _convert_to_file(lambda filename: AltoPageConverter(alto_filename=filename, **converter_kwargs), job, streaming)
+
+def _convert_to_file(make_converter, job, streaming):
+    input_filename, output_filename = job
+    t0 = perf_counter()
+    try:
+        converter = make_converter(input_filename)
+        if dirname(output_filename):
+            makedirs(dirname(output_filename), exist_ok=True)
+        if not streaming:
+            converter.convert()
+        # the previous output is only replaced once the new one is complete
+        partial_filename = output_filename + '.part'
+        try:
+            with open(partial_filename, 'wb') as output:
+                if streaming:
+                    converter.stream(output)
+                else:
+                    converter.write(output)
+            replace(partial_filename, output_filename)
+        except BaseException:
+            _discard_file(partial_filename)
+            raise
+    except Exception as err: # pylint: disable=broad-except
+        return BatchResult(input_filename, output_filename, '%s: %s' % (err.__class__.__name__, err), perf_counter() - t0)
+    return BatchResult(input_filename, output_filename, None, perf_counter() - t0, converter.stats,
+                       getattr(converter, 'validation', None))
+
+def _discard_file(filename):
+    try:
+        unlink(filename)
+    except FileNotFoundError:
+        pass
+
+def _init_worker():
+    from ocrd_utils import initLogging # pylint: disable=import-outside-toplevel
+    initLogging()
+
+def convert_batch(jobs, converter_kwargs=None, processes=1, chunksize=1, streaming=False, cache=None, convert_fn=convert_file):
+    """
+    Convert all ``(input_filename, output_filename)`` pairs in ``jobs``.
+
+    With ``processes > 1``, conversion is distributed across a
+    :py:class:`multiprocessing.Pool` of that many workers, ``processes=0``
+    uses one worker per CPU. Results are yielded as :py:class:`BatchResult`
+    in completion order; a failing file does not abort the batch. Raises a ValueError
+    before converting anything if two jobs have the same output file.
+
+    ``convert_fn`` converts a single job, :py:func:`convert_file` (PAGE-XML to ALTO)
+    or :py:func:`convert_alto_file` (ALTO to PAGE-XML).
+
+    With a :py:class:`~ocrd_page_to_alto.cache.ConversionCache` as ``cache``, files
+    already converted before are copied from the cache first (in this process)
+    and only the others are converted and then added to the cache (unless found invalid).
+    With ``validate``, the copies are validated as well. Files that cannot be copied
+    or validated are converted instead, failing to add a file to the cache fails it.
+    """
+    converter_kwargs = converter_kwargs or {}
+    check_output_filenames(jobs)
+    if converter_kwargs.get('validate') and processes != 1:
+        # compiled once here instead of in each worker, which inherit it when forked
+        from .schema import alto_schema # pylint: disable=import-outside-toplevel
+        alto_schema(converter_kwargs.get('alto_version', '4.2'), qualified=False)
+    convert_job = partial(convert_fn, converter_kwargs, streaming=streaming)
+    keys = {}
+    if cache is not None:
+        misses = []
+        for job in jobs:
+            t0 = perf_counter()
+            keys[job] = cache.key_for_file(job[0])
+            try:
+                cached = cache.copy_to(keys[job], job[1])
+                validation = _validate_file(job[1], converter_kwargs) if cached else None
+            except Exception: # pylint: disable=broad-except
+                # e.g. unwritable output or corrupt cached file: converted instead
+                cached = False
+            if cached:
+                yield BatchResult(job[0], job[1], None, perf_counter() - t0, validation=validation)
+            else:
+                misses.append(job)
+        jobs = misses
+    for result in _convert_jobs(convert_job, jobs, processes, chunksize):
+        if cache is not None and result.error is None and not result.validation:
+            try:
+                cache.put(keys[(result.input_filename, result.output_filename)], result.output_filename)
+            except Exception as err: # pylint: disable=broad-except
+                result = result._replace(error='Cannot add to the cache: %s: %s' % (err.__class__.__name__, err))
+        yield result
+
+def _validate_file(output_filename, converter_kwargs):
+    if not converter_kwargs.get('validate'):
+        return None
+    from lxml import etree as ET # pylint: disable=import-outside-toplevel
+    from .schema import validate_alto # pylint: disable=import-outside-toplevel
+    return validate_alto(ET.parse(output_filename), converter_kwargs.get('alto_version', '4.2'))
+
+def _convert_jobs(convert_job, jobs, processes, chunksize):
+    if processes == 1:
+        for job in jobs:
+            yield convert_job(job)
+        return
+    with Pool(processes or None, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(convert_job, jobs, chunksize=chunksize)
+
+class BatchSummary():
+    """
+    Aggregates :py:class:`BatchResult` for the final throughput report.
+    """
+
+    def __init__(self):
+        self.t0 = perf_counter()
+        self.succeeded = 0
+        self.failures = []
+        self.validated = 0
+        # converted, but not valid
+        self.invalid = []
+        self.stats = None
+
+    def add(self, result):
+        if result.error:
+            self.failures.append(result)
+        else:
+            self.succeeded += 1
+        if result.validation is not None:
+            self.validated += 1
+            if result.validation:
+                self.invalid.append(result)
+        if result.stats is not None:
+            self.stats = (self.stats or ConversionStats()).add(result.stats)
+
+    @property
+    def total(self):
+        return self.succeeded + len(self.failures)
+
+    def __str__(self):
+        seconds = perf_counter() - self.t0
+        ret = 'Converted %d of %d pages in %.2fs (%.2f pages/s), %d failures' % (
+            self.succeeded, self.total, seconds, self.total / seconds if seconds else 0, len(self.failures))
+        if self.validated:
+            ret += ', %d of %d validated pages invalid' % (len(self.invalid), self.validated)
+        return ret
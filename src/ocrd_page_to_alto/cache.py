@@ -0,0 +1,161 @@
+"""
+Persistent cache of converted ALTO files, to skip pages that did not change
+since the last run.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
+from json import dumps, load
+from os import makedirs, replace, scandir, unlink, utime
+from os.path import dirname, join
+from shutil import copyfile
+from tempfile import NamedTemporaryFile
+
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+# options that do not change the ALTO, so toggling them must not invalidate the cache
+# (with ``validate``, copies from the cache are validated instead, as they may come from runs without)
+CACHE_IGNORED_OPTIONS = ['stats', 'validate', 'page_engine']
+
+@lru_cache(maxsize=1)
+def package_version():
+    """
+    Version of this package (from its ``ocrd-tool.json``), part of each cache key
+    """
+    with open(join(dirname(__file__), 'ocrd-tool.json'), encoding='utf-8') as f:
+        return load(f)['version']
+
+class ConversionCache():
+    """
+    Converted ALTO files in ``directory``, keyed by a SHA-256 hash of the PAGE-XML
+    bytes, the conversion options and the version of this package.
+
+    The cache is bounded to ``max_size`` bytes (but keeps at least the last file
+    added), the least recently used files are evicted first. Recency survives
+    between runs as the modification time of the files.
+
+    Only one process should add files to a cache directory at a time, to keep
+    the size bound accurate. Files are written atomically, though.
+    """
+
+    def __init__(self, directory, options, max_size=DEFAULT_CACHE_SIZE):
+        """
+        Keyword Args:
+            directory (string): Directory to store the ALTO files in, created if necessary
+            options (dict): Conversion options the files are converted with, see
+                :py:class:`~ocrd_page_to_alto.convert.ConversionProfile`
+            max_size (int): Upper bound of the total size of the cached files in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        options = {k: v for k, v in options.items() if k not in CACHE_IGNORED_OPTIONS}
+        self._salt = dumps([package_version(), options], sort_keys=True).encode('utf-8')
+        # key -> size, least recently used first
+        self._entries = None
+        self._size = 0
+
+    def key(self, page_bytes):
+        """
+        Cache key of PAGE-XML ``page_bytes``
+        """
+        ret = sha256(self._salt)
+        ret.update(page_bytes)
+        return ret.hexdigest()
+
+    def key_for_file(self, page_filename):
+        """
+        Cache key of PAGE-XML file ``page_filename``, ``None`` if it cannot be read
+        """
+        try:
+            with open(page_filename, 'rb') as f:
+                return self.key(f.read())
+        except OSError:
+            return None
+
+    def path(self, key):
+        return join(self.directory, key[:2], key + '.xml')
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        files = []
+        makedirs(self.directory, exist_ok=True)
+        for subdir in scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for entry in scandir(subdir.path):
+                if entry.name.endswith('.xml'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._size = sum(self._entries.values())
+
+    def copy_to(self, key, output_filename):
+        """
+        Copy the cached ALTO for ``key`` to ``output_filename``.
+
+        Returns whether it was cached (and counts a hit or miss).
+        """
+        self._load()
+        if key is None or key not in self._entries:
+            self.misses += 1
+            return False
+        path = self.path(key)
+        try:
+            if dirname(output_filename):
+                makedirs(dirname(output_filename), exist_ok=True)
+            copyfile(path, output_filename)
+            utime(path)
+        except FileNotFoundError:
+            # removed behind our back
+            self._size -= self._entries.pop(key)
+            self.misses += 1
+            return False
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def put(self, key, alto_filename):
+        """
+        Add the ALTO file ``alto_filename`` to the cache as ``key`` and evict the
+        least recently used files beyond ``max_size``.
+        """
+        if key is None:
+            return
+        self._load()
+        path = self.path(key)
+        makedirs(dirname(path), exist_ok=True)
+        with NamedTemporaryFile(dir=dirname(path), suffix='.tmp', delete=False) as tmp:
+            with open(alto_filename, 'rb') as f:
+                size = tmp.write(f.read())
+        replace(tmp.name, path)
+        self._size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        while self._size > self.max_size and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            self.evictions += 1
+            try:
+                unlink(self.path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        self._load()
+        return len(self._entries)
+
+    @property
+    def size(self):
+        self._load()
+        return self._size
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'files': len(self), 'bytes': self.size}
+
+    def __str__(self):
+        return 'Cache: %d hits, %d misses, %d evictions, %d files (%d bytes) in %s' % (
+            self.hits, self.misses, self.evictions, len(self), self.size, self.directory)
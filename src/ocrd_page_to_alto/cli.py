@@ -1,39 +1,122 @@
+import sys
+from glob import has_magic
+from os import unlink
+from os.path import exists, isdir, isfile
+from signal import signal, SIGTERM
+from time import perf_counter
 import click
-from .convert import OcrdPageAltoConverter
-from ocrd_utils import initLogging
-from ocrd.decorators import ocrd_loglevel
+from .batch import (
+    DEFAULT_OUTPUT_TEMPLATE,
+    DEFAULT_PAGE_OUTPUT_TEMPLATE,
+    BatchResult,
+    BatchSummary,
+    check_output_filenames,
+    convert_alto_file,
+    convert_batch,
+    convert_file,
+    expand_inputs,
+    output_filename_for)
+from .cache import ConversionCache
+
+# Only click and the lightweight batch module are imported at module level, so that
+# --help, usage errors and small pages do not pay for importing the OCR-D stack.
+# The converter, ocrd_utils and the server are imported by the commands that need them.
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+LOG_LEVELS = ['OFF', 'ERROR', 'WARN', 'INFO', 'DEBUG', 'TRACE']
+
+log_level_option = click.option('-l', '--log-level', help='Log level', type=click.Choice(LOG_LEVELS), default=None)
+
+def check_shape_levels(ctx, param, value): # pylint: disable=unused-argument
+    """
+    Fail with a usage error unless ``value`` is a comma-separated list of the levels of ``--shape-levels``
+    """
+    levels = [level.strip() for level in value.split(',') if level.strip()]
+    invalid = [level for level in levels if level not in ('region', 'line', 'word')]
+    if invalid:
+        raise click.BadParameter("invalid level(s) %s, must be some of region, line, word" % ', '.join(invalid))
+    return ','.join(levels)
+
+CONVERSION_OPTIONS = [
+    click.option('--alto-version', default='4.2', help='Choose version of ALTO-XML schema to produce (older versions may not preserve all features)',
+                 type=click.Choice(['4.2', '4.1', '4.0', '3.1', '3.0', '2.1', '2.0'])),
+    click.option('--check-words/--no-check-words', default=True, help='Check whether PAGE-XML contains any Words and fail if not'),
+    click.option('--check-border/--no-check-border', default=False, help='Check whether PAGE-XML contains Border or PrintSpace'),
+    click.option('--skip-empty-lines/--no-skip-empty-lines', default=False, help='Whether to omit or keep empty lines in PAGE-XML'),
+    click.option('--trailing-dash-to-hyp/--no-trailing-dash-to-hyp', default=False, help='Whether to add a <HYP/> element if the last word in a line ends in "-"'),
+    click.option('--dummy-textline/--no-dummy-textline', default=True, help='Whether to create a TextLine for regions that have TextEquiv/Unicode but no TextLine'),
+    click.option('--dummy-word/--no-dummy-word', default=True, help='Whether to create a Word for TextLine that have TextEquiv/Unicode but no Word'),
+    click.option('--textequiv-index', default=0, help='If multiple textequiv, use the n-th TextEquiv by @index'),
+    click.option('--textequiv-fallback-strategy', default='first', type=click.Choice(['raise', 'first', 'last']), 
+                 help="What to do if selected TextEquiv @index is not available: 'raise' will lead to a runtime error, "
+                 "'first' will use the first TextEquiv, 'last' will use the last TextEquiv on the element"),
+    click.option('--region-order', default='document', help="Order in which to iterate over the regions", type=click.Choice(['document', 'reading-order', 'reading-order-only'])),
+    click.option('--textline-order', default='document', help="Order in which to iterate over the textlines", type=click.Choice(['document', 'index', 'textline-order'])),
+    click.option('--timestamp-src', default='LastChange', help="Which element to use for the timestamp", type=click.Choice(['Created', 'LastChange', 'none'])),
+    click.option('--page-engine', default='generateds', type=click.Choice(['generateds', 'lxml', 'iterparse']),
+                 help="How to read PAGE-XML: 'generateds' builds the full OCR-D object model, 'lxml' a slim and faster one, "
+                 "'iterparse' the slim one region by region (for huge pages, best with --streaming)"),
+    click.option('--pretty-print/--no-pretty-print', default=True, help='Whether to indent the ALTO or write it without any whitespace between elements'),
+    click.option('--shape-levels', default='region,line,word', show_default=True, callback=check_shape_levels,
+                 help="Comma-separated levels ('region', 'line', 'word') at which to write the polygon as Shape (empty for none)"),
+]
+
+def init_logging(log_level):
+    """
+    Set up OCR-D logging, at ``log_level`` if given
+    """
+    from ocrd_utils import getLogger, initLogging, setOverrideLogLevel # pylint: disable=import-outside-toplevel
+    initLogging()
+    if log_level:
+        # only affects loggers that already exist, children inherit the level though
+        getLogger('page-to-alto')
+        setOverrideLogLevel(log_level)
+
+def conversion_options(fn):
+    """
+    Add the options of :py:class:`~ocrd_page_to_alto.convert.ConversionProfile` as CLI options
+    """
+    for option in reversed(CONVERSION_OPTIONS):
+        fn = option(fn)
+    return fn
+
 @click.command(context_settings=CONTEXT_SETTINGS)
-@ocrd_loglevel
-@click.option('--alto-version', default='4.2', help='Choose version of ALTO-XML schema to produce (older versions may not preserve all features)',
-              type=click.Choice(['4.2', '4.1', '4.0', '3.1', '3.0', '2.1', '2.0']))
-@click.option('--check-words/--no-check-words', default=True, help='Check whether PAGE-XML contains any Words and fail if not')
-@click.option('--check-border/--no-check-border', default=False, help='Check whether PAGE-XML contains Border or PrintSpace')
-@click.option('--skip-empty-lines/--no-skip-empty-lines', default=False, help='Whether to omit or keep empty lines in PAGE-XML')
-@click.option('--trailing-dash-to-hyp/--no-trailing-dash-to-hyp', default=False, help='Whether to add a <HYP/> element if the last word in a line ends in "-"')
-@click.option('--dummy-textline/--no-dummy-textline', default=True, help='Whether to create a TextLine for regions that have TextEquiv/Unicode but no TextLine')
-@click.option('--dummy-word/--no-dummy-word', default=True, help='Whether to create a Word for TextLine that have TextEquiv/Unicode but no Word')
-@click.option('--textequiv-index', default=0, help='If multiple textequiv, use the n-th TextEquiv by @index')
-@click.option('--textequiv-fallback-strategy', default='first', type=click.Choice(['raise', 'first', 'last']), 
-              help="What to do if selected TextEquiv @index is not available: 'raise' will lead to a runtime error, "
-              "'first' will use the first TextEquiv, 'last' will use the last TextEquiv on the element")
-@click.option('--region-order', default='document', help="Order in which to iterate over the regions", type=click.Choice(['document', 'reading-order', 'reading-order-only']))
-@click.option('--textline-order', default='document', help="Order in which to iterate over the textlines", type=click.Choice(['document', 'index', 'textline-order']))
-@click.option('--timestamp-src', default='LastChange', help="Which element to use for the timestamp", type=click.Choice(['Created', 'LastChange', 'none']))
+@log_level_option
+@conversion_options
+@click.option('--streaming/--no-streaming', default=False,
+              help='Whether to write the ALTO incrementally instead of building the whole document in memory first')
 @click.option('-O', '--output-file', default='-', help='Output filename (or "-" for standard output, the default)',
               type=click.Path(dir_okay=False, writable=True, exists=False, allow_dash=True))
-@click.argument('filename',  type=click.Path(dir_okay=False, exists=True))
+@click.option('-D', '--output-dir', help='Batch mode: Directory to write the ALTO files to',
+              type=click.Path(file_okay=False, writable=True, exists=False))
+@click.option('--output-template', default=None, show_default=DEFAULT_OUTPUT_TEMPLATE,
+              help='Batch mode: Output filename template, with the fields {stem}, {name} and {dir} of the input file')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(min=0), help='Batch mode: Number of worker processes (0 for one per CPU)')
+@click.option('-C', '--combine', type=click.Choice(['alto', 'zip']), default=None,
+              help='Batch mode: Write all pages to --output-file, as one multi-page ALTO document (alto) '
+              'or a ZIP archive of it with an index of page offsets (zip)')
+@click.option('--cache-dir', type=click.Path(file_okay=False, writable=True, exists=False),
+              help='Batch mode: Directory of a persistent cache of converted files, unchanged inputs are copied from there instead of converted')
+@click.option('--cache-size', default=1024, show_default=True, type=click.IntRange(min=1),
+              help='Batch mode: Maximum size of the cache in MiB, least recently used files are evicted first')
+@click.option('--stats/--no-stats', default=False, help='Print timings per phase and element counts (summed in batch mode) as JSON to standard error')
+@click.option('--validate/--no-validate', default=False,
+              help='Validate the ALTO against the bundled schema of --alto-version (4.2, 4.0 or 3.1) before writing it, '
+              'report schema violations to standard error and exit with status 1 if any')
+@click.argument('filenames', nargs=-1, required=True)
 def main(log_level, alto_version, check_words, check_border, skip_empty_lines, trailing_dash_to_hyp, dummy_textline, dummy_word, 
-         textequiv_index, textequiv_fallback_strategy, region_order, textline_order, timestamp_src, output_file, filename):
+         textequiv_index, textequiv_fallback_strategy, region_order, textline_order, timestamp_src, page_engine, pretty_print, shape_levels, streaming, output_file,
+         output_dir, output_template, jobs, combine, cache_dir, cache_size, stats, validate, filenames):
     """
     Convert PAGE to ALTO
+
+    FILENAMES can be a single PAGE-XML file, or for batch mode, multiple
+    files, directories or (quoted) glob patterns.
     """
-    initLogging()
-    converter = OcrdPageAltoConverter(
+    init_logging(log_level)
+    converter_kwargs = dict(
         alto_version=alto_version,
-        page_filename=filename,
         check_words=check_words,
         timestamp_src=timestamp_src,
         check_border=check_border,
@@ -44,11 +127,199 @@ def main(log_level, alto_version, check_words, check_border, skip_empty_lines, t
         textequiv_index=textequiv_index,
         textequiv_fallback_strategy=textequiv_fallback_strategy,
         region_order=region_order,
-        textline_order=textline_order
+        textline_order=textline_order,
+        page_engine=page_engine,
+        pretty_print=pretty_print,
+        shape_levels=shape_levels,
+        stats=stats,
+        validate=validate,
     )
-    converter.convert()
-    with open(1 if output_file == '-' else output_file, 'w') as output:
-        output.write(str(converter))
+    if validate and (streaming or combine):
+        raise click.UsageError("--validate needs the whole ALTO in memory, it cannot be used with --streaming/--combine")
+    if validate:
+        from .schema import VALIDATED_ALTO_VERSIONS # pylint: disable=import-outside-toplevel
+        if alto_version not in VALIDATED_ALTO_VERSIONS:
+            raise click.UsageError("--validate is only supported for --alto-version %s, whose schemas are bundled" % (
+                '/'.join(VALIDATED_ALTO_VERSIONS)))
+    if combine:
+        if output_dir or output_template or jobs != 1 or cache_dir:
+            raise click.UsageError("--combine writes all pages to --output-file in one process, "
+                                   "it cannot be used with --output-dir/--output-template/--jobs/--cache-dir")
+        convert_combined(filenames, output_file, combine, converter_kwargs)
+        return
+    if len(filenames) == 1 and not (output_dir or output_template or cache_dir or isdir(filenames[0]) or has_magic(filenames[0])):
+        def make_converter(filename):
+            from .convert import OcrdPageAltoConverter # pylint: disable=import-outside-toplevel
+            return OcrdPageAltoConverter(page_filename=filename, **converter_kwargs)
+        convert_single(make_converter, filenames[0], output_file, streaming, stats)
+        return
+    cache = ConversionCache(cache_dir, converter_kwargs, max_size=cache_size * 1024 * 1024) if cache_dir else None
+    run_batch(filenames, output_file, output_dir, output_template or DEFAULT_OUTPUT_TEMPLATE, jobs, streaming,
+              converter_kwargs, convert_file, cache=cache)
+
+def convert_single(make_converter, input_filename, output_file, streaming, stats):
+    """
+    Convert ``input_filename`` with the converter returned by ``make_converter(input_filename)``
+    and write the result to ``output_file``
+    """
+    if not isfile(input_filename):
+        raise click.BadParameter("File '%s' does not exist." % input_filename, param_hint='FILENAMES')
+    converter = make_converter(input_filename)
+    if streaming:
+        with open(1 if output_file == '-' else output_file, 'wb') as output:
+            converter.stream(output)
+    else:
+        converter.convert()
+        with open(1 if output_file == '-' else output_file, 'wb') as output:
+            converter.write(output)
+    if stats:
+        click.echo(converter.stats.to_json(), err=True)
+    if getattr(converter, 'validation', None):
+        echo_invalid(input_filename, converter.validation)
+        sys.exit(1)
+
+def echo_invalid(input_filename, validation):
+    """
+    Report the schema violations ``validation`` of the output of ``input_filename`` to standard error
+    """
+    click.echo('INVALID %s: %d schema violations' % (input_filename, len(validation)), err=True)
+    for violation in validation:
+        click.echo('  %s: %s' % violation, err=True)
+
+def run_batch(filenames, output_file, output_dir, output_template, jobs, streaming, converter_kwargs, convert_fn, cache=None):
+    """
+    Convert all files of ``filenames`` with :py:func:`~ocrd_page_to_alto.batch.convert_batch`
+    and report the throughput, exit with status 1 if any conversion failed (or its output is invalid)
+    """
+    if output_file != '-':
+        raise click.UsageError("--output-file cannot be used with multiple inputs, use --output-dir/--output-template")
+    inputs = expand_inputs(filenames)
+    if not inputs:
+        raise click.UsageError("No XML files found in %s" % ' '.join(filenames))
+    batch_jobs = [(input_filename, output_filename_for(input_filename, output_dir, output_template))
+                  for input_filename in inputs]
+    try:
+        check_output_filenames(batch_jobs)
+    except ValueError as err:
+        raise click.UsageError("%s, use '{dir}' in --output-template to keep the directories apart" % err)
+    summary = BatchSummary()
+    for result in convert_batch(batch_jobs, converter_kwargs, processes=jobs, streaming=streaming, cache=cache, convert_fn=convert_fn):
+        summary.add(result)
+        if result.error:
+            click.echo('FAILED %s: %s' % (result.input_filename, result.error), err=True)
+        elif result.validation:
+            echo_invalid(result.input_filename, result.validation)
+    click.echo(str(summary), err=True)
+    if cache is not None:
+        click.echo(str(cache), err=True)
+    if summary.stats is not None:
+        click.echo(summary.stats.to_json(), err=True)
+    if summary.failures or summary.invalid:
+        sys.exit(1)
+
+def convert_combined(filenames, output_file, combine, converter_kwargs):
+    """
+    Convert all PAGE-XML files of ``filenames`` into one multi-page ALTO document
+    (or ZIP archive for ``combine='zip'``) written to ``output_file``
+    """
+    from .multipage import MultiPageAltoConverter # pylint: disable=import-outside-toplevel
+    inputs = expand_inputs(filenames)
+    if not inputs:
+        raise click.UsageError("No PAGE-XML files found in %s" % ' '.join(filenames))
+    summary = BatchSummary()
+    with MultiPageAltoConverter(**converter_kwargs) as converter:
+        for input_filename in inputs:
+            t0 = perf_counter()
+            try:
+                converter.add_page(input_filename)
+                error = None
+            except Exception as err: # pylint: disable=broad-except
+                error = '%s: %s' % (err.__class__.__name__, err)
+                click.echo('FAILED %s: %s' % (input_filename, error), err=True)
+            summary.add(BatchResult(input_filename, output_file, error, perf_counter() - t0))
+        with open(1 if output_file == '-' else output_file, 'wb') as output:
+            if combine == 'zip':
+                converter.write_archive(output)
+            else:
+                converter.write(output)
+        click.echo(str(summary), err=True)
+        if converter.stats is not None:
+            click.echo(converter.stats.to_json(), err=True)
+    if summary.failures:
+        sys.exit(1)
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@log_level_option
+@click.option('--dpi', type=click.FloatRange(min=0, min_open=True),
+              help='Resolution of the images, required for ALTO with a MeasurementUnit other than pixel')
+@click.option('--streaming/--no-streaming', default=False,
+              help='Whether to write the PAGE-XML incrementally instead of building the whole document in memory first')
+@click.option('-O', '--output-file', default='-', help='Output filename (or "-" for standard output, the default)',
+              type=click.Path(dir_okay=False, writable=True, exists=False, allow_dash=True))
+@click.option('-D', '--output-dir', help='Batch mode: Directory to write the PAGE-XML files to',
+              type=click.Path(file_okay=False, writable=True, exists=False))
+@click.option('--output-template', default=None, show_default=DEFAULT_PAGE_OUTPUT_TEMPLATE,
+              help='Batch mode: Output filename template, with the fields {stem}, {name} and {dir} of the input file')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(min=0), help='Batch mode: Number of worker processes (0 for one per CPU)')
+@click.option('--stats/--no-stats', default=False, help='Print timings per phase and element counts (summed in batch mode) as JSON to standard error')
+@click.argument('filenames', nargs=-1, required=True)
+def alto_to_page(log_level, dpi, streaming, output_file, output_dir, output_template, jobs, stats, filenames):
+    """
+    Convert ALTO to PAGE
+
+    FILENAMES can be a single ALTO file, or for batch mode, multiple
+    files, directories or (quoted) glob patterns.
+    """
+    init_logging(log_level)
+    converter_kwargs = dict(dpi=dpi, stats=stats)
+    if len(filenames) == 1 and not (output_dir or output_template or isdir(filenames[0]) or has_magic(filenames[0])):
+        def make_converter(filename):
+            from .alto_to_page import AltoPageConverter # pylint: disable=import-outside-toplevel
+            return AltoPageConverter(alto_filename=filename, **converter_kwargs)
+        convert_single(make_converter, filenames[0], output_file, streaming, stats)
+        return
+    run_batch(filenames, output_file, output_dir, output_template or DEFAULT_PAGE_OUTPUT_TEMPLATE, jobs, streaming,
+              converter_kwargs, convert_alto_file)
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@log_level_option
+@conversion_options
+@click.option('--host', default='127.0.0.1', show_default=True, help='Host name or IP address to listen on')
+@click.option('-p', '--port', default=8000, show_default=True, type=click.IntRange(min=0), help='TCP port to listen on')
+@click.option('-s', '--socket', 'socket_path', type=click.Path(dir_okay=False, writable=True, exists=False),
+              help='Listen on this Unix socket instead of host/port')
+@click.option('-j', '--workers', default=1, type=click.IntRange(min=0), help='Number of worker processes (0 for one per CPU)')
+@click.option('--max-requests', default=0, type=click.IntRange(min=0),
+              help='Requests converted or queued at the same time, more are rejected with 503 (0 for twice the number of workers)')
+@click.option('--timeout', default=0, type=click.FloatRange(min=0), help='Seconds after which a conversion is aborted with 504 (0 for no limit)')
+@click.option('--stats/--no-stats', default=False, help='Sum timings per phase and element counts in /metrics')
+def serve(log_level, host, port, socket_path, workers, max_requests, timeout, **options):
+    """
+    Serve PAGE to ALTO conversion over HTTP
+
+    POST PAGE-XML to /convert to get ALTO. GET /health for the status and
+    /metrics for request counts and latencies as JSON.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ocrd_utils import getLogger
+    from .convert import ConversionProfile
+    from .server import ConversionService, make_server
+    init_logging(log_level)
+    logger = getLogger('page-to-alto.server')
+    service = ConversionService(ConversionProfile(**options), workers=workers, max_requests=max_requests, timeout=timeout, logger=logger)
+    # stop the workers on SIGTERM as well
+    signal(SIGTERM, lambda *_: sys.exit(0))
+    with service:
+        server = make_server(service, host=host, port=port, socket_path=socket_path)
+        logger.info("Listening on %s", socket_path or 'http://%s:%d' % server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if socket_path and exists(socket_path):
+                unlink(socket_path)
 
 if __name__ == '__main__':
     main() # pylint: disable=no-value-for-parameter
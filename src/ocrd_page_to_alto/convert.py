@@ -1,30 +1,52 @@
 # pylint: disable=no-member, c-extension-no-member
+from collections import Counter
+from contextlib import nullcontext
+from copy import deepcopy
+from functools import lru_cache
+from importlib import import_module
 from json import dumps
-from packaging import version
+from os import PathLike
+from re import compile as regex_compile
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+from types import MappingProxyType
 
 from lxml import etree as ET
-from ocrd_models.ocrd_page import (
-    TextLineType,
-    WordType,
-    parse,
-    parseString,
-    to_xml)
-from ocrd_models.constants import NAMESPACES as NAMESPACES_
+import numpy as np
 from ocrd_utils import getLogger, bbox_from_points
 
+from .ir import TextLineIR, WordIR
 from .utils import (
-    set_alto_id_from_page_id,
+    alto_lang_from_page_lang,
     set_alto_lang_from_page_lang,
     set_alto_shape_from_coords,
-    set_alto_xywh_from_coords,
+    set_alto_shape_from_points,
+    set_alto_xywh_from_bbox,
     setxml,
-    contains,
-    get_nth_textequiv)
+    bbox_from_alto_xywh,
+    bboxes_from_points,
+    get_nth_textequiv,
+    nth_textequiv)
 from .styles import TextStylesManager, ParagraphStyleManager, LayoutTagManager
+from .stats import ConversionStats
+from .schema import VALIDATED_ALTO_VERSIONS, validate_alto
+from .versions import XSD_ALTO_URLS, alto_features
+from . import page_lxml
+from .page_lxml import PAGE_REGION_TYPES
 
-NAMESPACES = {**NAMESPACES_}
-NAMESPACES['xsi'] = 'http://www.w3.org/2001/XMLSchema-instance'
-NAMESPACES['alto'] = 'http://www.loc.gov/standards/alto/ns-v%s#'
+# those of ocrd_models.constants.NAMESPACES (not imported, as that loads the OCR-D stack) plus xsi and alto
+NAMESPACES = {
+    'mets': 'http://www.loc.gov/METS/',
+    'mods': 'http://www.loc.gov/mods/v3',
+    'xlink': 'http://www.w3.org/1999/xlink',
+    'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15',
+    'xsl': 'http://www.w3.org/1999/XSL/Transform#',
+    'ocrd': 'https://ocr-d.de',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'alto': 'http://www.loc.gov/standards/alto/ns-v%s#',
+}
+XSI_SCHEMA_LOCATION = '{%s}schemaLocation' % NAMESPACES['xsi']
 
 REGION_PAGE_TO_ALTO = {
     'Text': 'TextBlock',
@@ -44,19 +66,118 @@ REGION_PAGE_TO_ALTO = {
     "Custom": None,
 }
 
-HYPHEN_CHARS = ['-', '⸗', '=', '¬', '­']
+# ALTO block -> PAGE region type, the reverse of REGION_PAGE_TO_ALTO (Illustrations become the most common Image)
+REGION_ALTO_TO_PAGE = {
+    'TextBlock': 'Text',
+    'GraphicalElement': 'Separator',
+    'Illustration': 'Image',
+    'ComposedBlock': 'Table',
+}
 
-XSD_ALTO_URLS = {
-    '4.2': 'http://www.loc.gov/standards/alto/v4/alto-4-2.xsd',
-    '4.1': 'http://www.loc.gov/standards/alto/v4/alto-4-1.xsd',
-    '4.0': 'http://www.loc.gov/standards/alto/v4/alto-4-0.xsd',
-    '3.1': 'http://www.loc.gov/standards/alto/v3/alto-3-1.xsd',
-    '3.0': 'http://www.loc.gov/standards/alto/v3/alto-3-0.xsd',
-    '2.1': 'http://www.loc.gov/standards/alto/alto.xsd',
-    '2.0': 'http://www.loc.gov/standards/alto/v2/alto-2-0.xsd'
+# modules of the PAGE object models, see page_model
+PAGE_ENGINES = {
+    'generateds': 'ocrd_models.ocrd_page',
+    'lxml': 'ocrd_page_to_alto.page_lxml',
+    # same object model, but files are read region by region, see OcrdPageAltoConverter.convert_text
+    'iterparse': 'ocrd_page_to_alto.page_lxml',
 }
 
-class OcrdPageAltoConverter():
+# getters of the regions nested in a region ('Map' is not recursive in the 2019 schema)
+CHILD_REGION_GETTERS = ['get_%sRegion' % class_ for class_ in PAGE_REGION_TYPES if class_ != 'Map']
+
+HYPHEN_CHARS = ['-', '⸗', '=', '¬', '­']
+
+# processing instruction marking where streamed regions are spliced into the serialized skeleton
+STREAM_SLOT_PI = 'page-to-alto-slot'
+STREAM_SLOT_RE = regex_compile(rb' *<\?%s (\d+)\?>\n?' % STREAM_SLOT_PI.encode('utf-8'))
+# size up to which streamed regions are buffered in memory before spilling to disk
+STREAM_SPOOL_SIZE = 1024 * 1024
+
+# levels that can have a Shape/Polygon (ALTO >= 3.1): blocks, TextLines and Strings
+SHAPE_LEVELS = ('region', 'line', 'word')
+
+# number of distinct ConversionProfiles kept by conversion_profile
+PROFILE_CACHE_SIZE = 32
+
+_NO_PHASE = nullcontext()
+
+def _no_phase(_name):
+    return _NO_PHASE
+
+def page_model(page_engine):
+    """
+    The PAGE object model module of ``page_engine``, imported on first use
+    (the generateDS one is large and slow to import).
+    """
+    return import_module(PAGE_ENGINES[page_engine])
+
+def pcgts_from_etree(page_etree):
+    """
+    Build the :py:mod:`ocrd_models.ocrd_page` object model from an already parsed
+    lxml tree, without serializing and re-parsing it.
+    """
+    if hasattr(page_etree, 'getroot'):
+        page_etree = page_etree.getroot()
+    if next(page_etree.iter(ET.Comment, ET.ProcessingInstruction), None) is not None:
+        # generateDS cannot build from comments or PIs, strip them from a copy (cheaper than a round trip)
+        page_etree = deepcopy(page_etree)
+        ET.strip_elements(page_etree, ET.Comment, ET.ProcessingInstruction, with_tail=False)
+    pcgts = page_model('generateds').PcGtsType.factory()
+    pcgts.build(page_etree)
+    return pcgts
+
+class ConversionProfile():
+    """
+    Immutable, validated set of conversion options, to be built once and reused
+    for any number of pages (e.g. by a long-running service), with everything
+    that does not depend on the page precomputed.
+
+    Keyword Args:
+        alto_version (string): Version of ALTO-XML schema to produce (older versions may not preserve all features)
+        check_words (boolean): Whether to check if PAGE-XML contains any words before conversion and fail if not
+        check_border (boolean): Whether to abort if neither Border nor PrintSpace is defined
+        skip_empty_lines (boolean): Whether to omit empty lines completely (True) or create a placeholder empty String in ALTO (False)
+        trailing_dash_to_hyp (boolean): Whether to add a <HYP/> element if the last word in a line ends in ``-`` etc
+        textequiv_index (int): @index of the TextEquiv to choose
+        textequiv_fallback_strategy ("raise"|"first"|"last"): Strategy to handle case of no matchin TextEquiv by textequiv_index
+        region_order ("document"|"reading-order"|"reading-order-only"): The order in which to iterate over regions.
+        textline_order ("document"|"index"|"textline-order"): The order in which to iterate over textlines.
+        timestamp_src ("Created"|"LastChange"|"none"): The element to use for the processingDateTime
+        dummy_textline (boolean): Whether to create a TextLine for regions that have TextEquiv/Unicode but no TextLine
+        dummy_word (boolean): Whether to create a Word for TextLine that have TextEquiv/Unicode but no Word
+        page_engine ("generateds"|"lxml"|"iterparse"): How to read PAGE-XML files and trees: Into the full
+            :py:mod:`ocrd_models.ocrd_page` object model or the slim :py:mod:`ocrd_page_to_alto.page_lxml` one,
+            or (files only, trees are read like ``lxml``) incrementally one top-level region at a time
+        stats (boolean): Whether to record timings per phase and element counts in ``stats`` of each conversion
+            (a :py:class:`~ocrd_page_to_alto.stats.ConversionStats`, otherwise ``None``)
+        validate (boolean): Whether to validate the ALTO of each conversion against the (bundled) schema
+            of ``alto_version``, see :py:meth:`OcrdPageAltoConverter.validate` (not when streaming)
+        pretty_print (boolean): Whether to indent the serialized ALTO (otherwise it has no whitespace between elements)
+        shape_levels (list|string): At which of the levels ``region``, ``line`` and ``word`` (as a list
+            or comma-separated) to add a Shape/Polygon besides the bounding box (ALTO >= 3.1 only)
+
+    Precomputed attributes:
+        features (AltoFeatures): What ``alto_version`` supports
+        alto_namespace (string): Namespace of ``alto_version``
+        schema_location (string): Value of ``xsi:schemaLocation``
+        region_types (Mapping): Class name of a PAGE region (in either engine) to its region type
+            (e.g. ``Text``) and the ALTO element to convert it to (``None`` if unsupported)
+    """
+
+    OPTIONS = ('alto_version', 'check_words', 'check_border', 'skip_empty_lines', 'trailing_dash_to_hyp',
+               'textequiv_index', 'textequiv_fallback_strategy', 'region_order', 'textline_order',
+               'timestamp_src', 'dummy_textline', 'dummy_word', 'page_engine', 'stats', 'validate',
+               'pretty_print', 'shape_levels')
+    CHOICES = {
+        'alto_version': tuple(XSD_ALTO_URLS),
+        'textequiv_fallback_strategy': ('raise', 'first', 'last'),
+        'region_order': ('document', 'reading-order', 'reading-order-only'),
+        'textline_order': ('document', 'index', 'textline-order'),
+        'timestamp_src': ('Created', 'LastChange', 'none'),
+        'page_engine': tuple(PAGE_ENGINES),
+    }
+
+    __slots__ = OPTIONS + ('features', 'alto_namespace', 'schema_location', 'region_types', '_skeleton')
 
     def __init__(
         self,
@@ -71,122 +192,479 @@ class OcrdPageAltoConverter():
         region_order='document',
         textline_order='document',
         timestamp_src='LastChange',
-        page_filename=None,
         dummy_textline=True,
         dummy_word=True,
+        page_engine='generateds',
+        stats=False,
+        validate=False,
+        pretty_print=True,
+        shape_levels=SHAPE_LEVELS,
+    ):
+        if isinstance(textequiv_index, float) and textequiv_index.is_integer():
+            # JSON numbers, e.g. of OCR-D parameters
+            textequiv_index = int(textequiv_index)
+        options = dict(
+            alto_version=alto_version,
+            check_words=bool(check_words),
+            check_border=bool(check_border),
+            skip_empty_lines=bool(skip_empty_lines),
+            trailing_dash_to_hyp=bool(trailing_dash_to_hyp),
+            textequiv_index=textequiv_index,
+            textequiv_fallback_strategy=textequiv_fallback_strategy,
+            region_order=region_order,
+            textline_order=textline_order,
+            timestamp_src=timestamp_src,
+            dummy_textline=bool(dummy_textline),
+            dummy_word=bool(dummy_word),
+            page_engine=page_engine,
+            stats=bool(stats),
+            validate=bool(validate),
+            pretty_print=bool(pretty_print),
+            shape_levels=_shape_levels(shape_levels),
+        )
+        if alto_version not in XSD_ALTO_URLS:
+            raise ValueError("Converting to ALTO-XML v%s is not supported" % alto_version)
+        if validate and alto_version not in VALIDATED_ALTO_VERSIONS:
+            raise ValueError("Validating ALTO-XML v%s is not supported, its schema is not bundled (only those of %s)" % (
+                alto_version, ', '.join(VALIDATED_ALTO_VERSIONS)))
+        if page_engine not in PAGE_ENGINES:
+            raise ValueError("Unknown page_engine '%s'" % page_engine)
+        for name, choices in self.CHOICES.items():
+            if options[name] not in choices:
+                raise ValueError("Invalid value for %s: '%s' (must be one of %s)" % (name, options[name], ', '.join(choices)))
+        if not isinstance(textequiv_index, int) or isinstance(textequiv_index, bool):
+            raise ValueError("Invalid value for textequiv_index: %r (must be an integer)" % (textequiv_index,))
+        alto_namespace = NAMESPACES['alto'] % alto_version[:1]
+        options.update(
+            features=alto_features(alto_version),
+            alto_namespace=alto_namespace,
+            schema_location='%s %s' % (alto_namespace, XSD_ALTO_URLS[alto_version]),
+            region_types=_region_types(),
+        )
+        for name, val in options.items():
+            object.__setattr__(self, name, val)
+        object.__setattr__(self, '_skeleton', self._build_skeleton())
+
+    def _build_skeleton(self):
+        alto_alto = ET.Element('alto')
+        alto_alto.set('xmlns', self.alto_namespace)
+        alto_alto.set(XSI_SCHEMA_LOCATION, self.schema_location)
+        ET.SubElement(alto_alto, 'Description')
+        ET.SubElement(alto_alto, 'Styles')
+        if self.features.tags:
+            ET.SubElement(alto_alto, 'Tags')
+        alto_layout = ET.SubElement(alto_alto, 'Layout')
+        if self.features.schemaversion:
+            alto_alto.set('SCHEMAVERSION', self.alto_version)
+        # ID is set per page, but must come first
+        ET.SubElement(alto_layout, 'Page', ID='', PHYSICAL_IMG_NR='0')
+        return alto_alto
+
+    def alto_skeleton(self):
+        """
+        A new ALTO document with the root attributes, (empty) Description, Styles,
+        Tags (if supported) and Layout/Page of this profile, to be filled per page
+        """
+        return deepcopy(self._skeleton)
+
+    def __setattr__(self, name, val):
+        raise AttributeError("ConversionProfile is immutable, use replace() to derive a modified one")
+
+    def __delattr__(self, name):
+        raise AttributeError("ConversionProfile is immutable, use replace() to derive a modified one")
+
+    def options(self):
+        """
+        The conversion options as a dict, as passed to the constructor
+        """
+        return {name: getattr(self, name) for name in self.OPTIONS}
+
+    def replace(self, **options):
+        """
+        Derive a new profile with some ``options`` changed
+        """
+        return ConversionProfile(**{**self.options(), **options})
+
+    def __eq__(self, other):
+        return isinstance(other, ConversionProfile) and self.options() == other.options()
+
+    def __hash__(self):
+        return hash(tuple(self.options().items()))
+
+    def __repr__(self):
+        return 'ConversionProfile(%s)' % ', '.join('%s=%r' % kv for kv in self.options().items())
+
+    def __reduce__(self):
+        # pickle (e.g. for worker processes) by options, the precomputed attributes are rebuilt
+        return (_profile_from_options, (self.options(),))
+
+    def converter(self, page, logger=None):
+        """
+        Prepare the conversion of ``page``, which can be a PAGE-XML filename, an already
+        parsed lxml tree or element, or an already parsed PAGE object model (of either engine).
+
+        Returns an :py:class:`OcrdPageAltoConverter` that has not converted anything yet.
+        """
+        if isinstance(page, (str, PathLike)):
+            return OcrdPageAltoConverter(page_filename=page, profile=self, logger=logger)
+        if isinstance(page, (ET._Element, ET._ElementTree)):
+            return OcrdPageAltoConverter(page_etree=page, profile=self, logger=logger)
+        return OcrdPageAltoConverter(pcgts=page, profile=self, logger=logger)
+
+    def convert(self, page, logger=None):
+        """
+        Convert ``page`` (see :py:meth:`converter`) to ALTO.
+
+        Returns the converted :py:class:`OcrdPageAltoConverter`, i.e. use ``str()`` to
+        serialize the result or :py:meth:`~OcrdPageAltoConverter.to_etree`.
+        """
+        return self.converter(page, logger=logger).convert()
+
+def _profile_from_options(options):
+    return ConversionProfile(**options)
+
+def _shape_levels(shape_levels):
+    """
+    Normalize ``shape_levels`` (an iterable or comma-separated string) to a tuple in the order of ``SHAPE_LEVELS``
+    """
+    if isinstance(shape_levels, str):
+        shape_levels = [level.strip() for level in shape_levels.split(',') if level.strip()]
+    shape_levels = set(shape_levels)
+    if not shape_levels <= set(SHAPE_LEVELS):
+        raise ValueError("Invalid value for shape_levels: %s (must be some of %s)" % (
+            ', '.join(sorted(shape_levels - set(SHAPE_LEVELS))), ', '.join(SHAPE_LEVELS)))
+    return tuple(level for level in SHAPE_LEVELS if level in shape_levels)
+
+@lru_cache(maxsize=1)
+def _region_types():
+    region_types = {}
+    for page_type in PAGE_REGION_TYPES:
+        region_types['%sRegionType' % page_type] = (page_type, REGION_PAGE_TO_ALTO.get(page_type))
+    return MappingProxyType(region_types)
+
+def conversion_profile(**options):
+    """
+    The :py:class:`ConversionProfile` for ``options``, built only once per combination
+    of options (as long as it is among the last ``PROFILE_CACHE_SIZE`` used).
+    """
+    if 'shape_levels' in options:
+        # hashable, and the same for equivalent values
+        options['shape_levels'] = _shape_levels(options['shape_levels'])
+    return _conversion_profile(**options)
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def _conversion_profile(**options):
+    return ConversionProfile(**options)
+
+class OcrdPageAltoConverter():
+    """
+    Conversion of a single PAGE-XML document to ALTO with the options of a
+    :py:class:`ConversionProfile`.
+    """
+
+    def __init__(
+        self,
+        *,
+        page_filename=None,
         page_etree=None,
         pcgts=None,
-        logger=None
+        profile=None,
+        logger=None,
+        **options
     ):
         """
+        Exactly one of ``page_filename``, ``page_etree`` and ``pcgts`` is required as input.
+
         Keyword Args:
-            alto_version (string): Version of ALTO-XML schema to produce (older versions may not preserve all features)
-            check_words (boolean): Whether to check if PAGE-XML contains any words before conversion and fail if not
-            check_border (boolean): Whether to abort if neither Border nor PrintSpace is defined
-            skip_empty_lines (boolean): Whether to omit empty lines completely (True) or create a placeholder empty String in ALTO (False)
-            trailing_dash_to_hyp (boolean): Whether to add a <HYP/> element if the last word in a line ends in ``-`` etc
-            textequiv_index (int): @index of the TextEquiv to choose
-            textequiv_fallback_strategy ("raise"|"first"|"last"): Strategy to handle case of no matchin TextEquiv by textequiv_index
-            region_order ("document"|"reading-order"|"reading-order-only"): The order in which to iterate over regions.
-            textline_order ("document"|"index"|"textline-order"): The order in which to iterate over textlines.
-            timestamp_src ("Created"|"LastChange"|"none"): The element to use for the processingDateTime
-            dummy_textline (boolean): Whether to create a TextLine for regions that have TextEquiv/Unicode but no TextLine
-            dummy_word (boolean): Whether to create a Word for TextLine that have TextEquiv/Unicode but no Word
-        """
-        if not (page_filename or page_etree or pcgts):
+            page_filename (string): PAGE-XML file to convert
+            page_etree (lxml.etree._Element|lxml.etree._ElementTree): Already parsed PAGE-XML to convert
+            pcgts (PcGtsType): Already parsed PAGE-XML object model to convert, used as-is
+            profile (ConversionProfile): Conversion options to use
+            **options: Alternatively to ``profile``, the conversion options themselves, see
+                :py:class:`ConversionProfile` (profiles are cached by options, see :py:func:`conversion_profile`)
+        """
+        if not page_filename and page_etree is None and pcgts is None:
             raise ValueError("Must pass either pcgts, page_etree or page_filename to constructor")
-        if alto_version not in XSD_ALTO_URLS:
-            raise ValueError("Converting to ALTO-XML v%s is not supported" % alto_version)
-        self.alto_version = alto_version
-        self.skip_empty_lines = skip_empty_lines
-        self.trailing_dash_to_hyp = trailing_dash_to_hyp
-        self.dummy_textline = dummy_textline
-        self.region_order = region_order
-        self.textline_order = textline_order
-        self.dummy_word = dummy_word
+        if profile is None:
+            profile = conversion_profile(**options)
+        elif options:
+            raise ValueError("Must pass either profile or conversion options to constructor, not both")
+        self.profile = profile
+        self.alto_version = profile.alto_version
+        self.features = profile.features
+        self.skip_empty_lines = profile.skip_empty_lines
+        self.trailing_dash_to_hyp = profile.trailing_dash_to_hyp
+        self.dummy_textline = profile.dummy_textline
+        self.region_order = profile.region_order
+        self.textline_order = profile.textline_order
+        self.dummy_word = profile.dummy_word
+        self.shape_levels = frozenset(profile.shape_levels if profile.features.shape else ())
         self.logger = logger if logger else getLogger('page-to-alto')
+        self.stats = ConversionStats() if profile.stats else None
+        self._phase = self.stats.phase if profile.stats else _no_phase
+        # schema violations of the converted ALTO, see validate
+        self.validation = None
+        # pre-scan of page_filename for page_engine iterparse, see convert_text
+        self._scan = None
+        t0 = perf_counter()
         if pcgts:
+            self.page_model = page_lxml if isinstance(pcgts, page_lxml.PcGtsType) else page_model('generateds')
             self.page_pcgts = pcgts
-        elif page_etree:
-            self.page_pcgts = parseString(ET.tostring(page_etree))
         else:
-            self.page_pcgts = parse(page_filename)
+            self.page_model = page_model(profile.page_engine)
+            if page_etree is not None and self.page_model is page_lxml:
+                self.page_pcgts = page_lxml.parseEtree(page_etree)
+            elif page_etree is not None:
+                self.page_pcgts = pcgts_from_etree(page_etree)
+            elif profile.page_engine == 'iterparse':
+                self._scan = page_lxml.scan(page_filename, check_words=profile.check_words)
+                self.page_pcgts = self._scan.pcgts
+            else:
+                self.page_pcgts = self.page_model.parse(page_filename)
         self.page_page = self.page_pcgts.get_Page()
-        if check_words:
+        if profile.check_words:
             self.check_words()
-        if check_border:
-            tree = ET.fromstring(to_xml(self.page_pcgts).encode('utf-8'))
-            self.check_border(tree)
-        self.timestamp_src = None if timestamp_src == 'none' else timestamp_src
-        self.textequiv_index = textequiv_index
-        self.textequiv_fallback_strategy = textequiv_fallback_strategy
+        if profile.check_border:
+            self.check_border()
+        if self.stats is not None:
+            self.stats.seconds['parse'] += perf_counter() - t0
+            self.stats.counts['pages'] += 1
+        self.timestamp_src = None if profile.timestamp_src == 'none' else profile.timestamp_src
+        self.textequiv_index = profile.textequiv_index
+        self.textequiv_fallback_strategy = profile.textequiv_fallback_strategy
+        # bounding boxes by PAGE points, see parse_coords
+        self._bboxes = {}
         self.alto_alto, self.alto_description, self.alto_styles, self.alto_tags, self.alto_page = self.create_alto()
         self.alto_printspace = self.convert_border()
-        self.textstyle_mgr = TextStylesManager(self.alto_version)
+        self.textstyle_mgr = TextStylesManager(self.alto_version, strict=profile.validate, logger=self.logger)
         self.parastyle_mgr = ParagraphStyleManager(self.alto_version)
         self.layouttag_mgr = LayoutTagManager(self.alto_version)
+        # ALTO blocks by ID, to resolve the reading order without searching the tree
+        self.alto_blocks_by_id = {}
+        # IDs of the ALTO blocks so far, see unique_id
+        self._block_ids = set()
+        self._stream_buffers = None
+        # offsets and lengths of the serialized regions in the buffer of each container, in region_order
+        self._stream_chunks = None
+        self._stream_idnext = None
+        self._stream_staging = None
 
     def __str__(self):
-        return ET.tostring(self.alto_alto,
-                           pretty_print=True,
-                           xml_declaration=True,
-                           standalone=True,
-                           encoding="UTF-8").decode('utf-8')
+        return self.to_bytes().decode('utf-8')
+
+    def to_bytes(self):
+        """
+        Serialize the ALTO document to UTF-8 bytes (indented with the profile's ``pretty_print``)
+        """
+        with self._phase('serialize'):
+            ret = ET.tostring(self.alto_alto,
+                              pretty_print=self.profile.pretty_print,
+                              xml_declaration=True,
+                              standalone=True,
+                              encoding="UTF-8")
+        if self.stats is not None:
+            self.logger.debug("Conversion stats: %s", self.stats)
+        return ret
+
+    def write(self, output):
+        """
+        Serialize the ALTO document to the binary file handle ``output``, like :py:meth:`to_bytes`
+        but without holding the whole serialization in memory.
+        """
+        with self._phase('serialize'):
+            ET.ElementTree(self.alto_alto).write(output,
+                                                 pretty_print=self.profile.pretty_print,
+                                                 xml_declaration=True,
+                                                 standalone=True,
+                                                 encoding="UTF-8")
+        if self.stats is not None:
+            self.logger.debug("Conversion stats: %s", self.stats)
 
     def to_etree(self):
         return self.alto_alto
 
     def check_words(self):
-        for reg_page in self.page_page.get_AllRegions(classes=['Text']):
-            for line_page in reg_page.get_TextLine():
-                textequiv = line_page.get_TextEquiv()
-                if any(x.Unicode for x in textequiv) and not line_page.get_Word():
-                    raise ValueError("Line %s has TextEquiv but not words, so cannot be converted to ALTO without losing information. Use --no-check-words to override" % line_page.id)
-
-    def check_border(self, tree):
-        if tree.find('.//page:Border', NAMESPACES) is None and tree.find('.//page:PrintSpace', NAMESPACES) is None:
+        if self._scan is not None:
+            line_id = self._scan.line_without_words
+        else:
+            line_id = next((line_page.id for reg_page in self.page_page.get_AllRegions(classes=['Text'])
+                            for line_page in reg_page.get_TextLine()
+                            if any(x.Unicode for x in line_page.get_TextEquiv()) and not line_page.get_Word()), None)
+        if line_id is not None:
+            raise ValueError("Line %s has TextEquiv but not words, so cannot be converted to ALTO without losing information. Use --no-check-words to override" % line_id)
+
+    def check_border(self):
+        if self.page_page.get_Border() is None and self.page_page.get_PrintSpace() is None:
             raise ValueError("The PAGE-XML to transform contains neither Border nor PrintSpace")
 
     def create_alto(self):
-        alto_alto = ET.Element('alto')
-        setxml(alto_alto, 'xmlns', NAMESPACES['alto'] % self.alto_version[:1])
-        setxml(alto_alto, '{%s}schemaLocation' % NAMESPACES['xsi'],
-               "%s %s" % (NAMESPACES['alto'] % self.alto_version[:1],
-                          XSD_ALTO_URLS[self.alto_version]))
-        alto_description = ET.SubElement(alto_alto, 'Description')
-        alto_styles = ET.SubElement(alto_alto, 'Styles')
-        if version.parse(self.alto_version) >= version.parse('2.1'):
-            alto_tags = ET.SubElement(alto_alto, 'Tags')
-        else:
-            alto_tags = None
-        alto_layout = ET.SubElement(alto_alto, 'Layout')
-        if version.parse(self.alto_version) >= version.parse('3.0'):
-            setxml(alto_alto, 'SCHEMAVERSION', self.alto_version)
-        alto_page = ET.SubElement(alto_layout, 'Page')
+        alto_alto = self.profile.alto_skeleton()
+        alto_description = alto_alto[0]
+        alto_styles = alto_alto[1]
+        alto_tags = alto_alto[2] if self.features.tags else None
+        alto_page = alto_alto[-1][0]
         setxml(alto_page, 'ID', getattr(self.page_pcgts, 'pcGtsId', 'page0'))
-        setxml(alto_page, 'PHYSICAL_IMG_NR', 0)
         page_type = self.page_page.get_type()
         if page_type:
             setxml(alto_page, 'PAGECLASS', page_type)
         return alto_alto, alto_description, alto_styles, alto_tags, alto_page
 
     def convert(self):
-        self.convert_metadata()
-        self.convert_text()
-        self.convert_reading_order()
-        self.convert_styles()
+        with self._phase('metadata'):
+            self.convert_metadata()
+        with self._phase('text'):
+            self.convert_text()
+        with self._phase('reading_order'):
+            self.convert_reading_order()
+        with self._phase('styles'):
+            self.convert_styles()
+        if self.profile.validate:
+            self.validate()
         return self
 
+    def validate(self):
+        """
+        Validate the converted ALTO tree (without serializing it) against the schema
+        of ``alto_version``, see :py:func:`~ocrd_page_to_alto.schema.validate_alto`.
+
+        Sets and returns ``validation``, the list of
+        :py:class:`~ocrd_page_to_alto.schema.SchemaViolation` (empty if valid).
+        """
+        with self._phase('validate'):
+            self.validation = validate_alto(self.alto_alto, self.alto_version)
+        if self.stats is not None:
+            counts = self.stats.counts
+            counts['invalid_pages'] = counts.get('invalid_pages', 0) + (1 if self.validation else 0)
+            counts['schema_violations'] = counts.get('schema_violations', 0) + len(self.validation)
+        if self.validation:
+            self.logger.warning("ALTO of page '%s' is not valid, %d schema violations, first at %s: %s",
+                                self.alto_page.get('ID'), len(self.validation), *self.validation[0])
+        return self.validation
+
+    def stream(self, output):
+        """
+        Convert and write the ALTO document incrementally to the binary file handle ``output``.
+
+        Instead of building the complete ALTO tree, each region is serialized into a
+        (spooled) buffer per PrintSpace/Margin right after conversion and discarded.
+        Since Styles and Tags are only known after all regions have been converted,
+        the skeleton of the document (Description, Styles, Tags, Page and its
+        PrintSpace/Margins) is serialized last and the buffers spliced into it.
+
+        The result is byte-identical to ``self.convert().to_bytes()``, but :py:meth:`to_etree`
+        will not contain any regions afterwards. So it cannot be validated, a profile
+        with ``validate`` raises a ValueError.
+        """
+        if self.profile.validate:
+            raise ValueError("Streamed ALTO is never complete in memory and cannot be validated")
+        with self._phase('metadata'):
+            self.convert_metadata()
+        with self._phase('reading_order'):
+            self._stream_idnext = self.reading_order_idnext()
+        self._stream_buffers = {}
+        # regions are built detached from the ALTO tree, so they do not inherit its namespace declarations
+        self._stream_staging = ET.Element('Staging')
+        try:
+            with self._phase('text'):
+                self.convert_text()
+            with self._phase('styles'):
+                self.convert_styles()
+            with self._phase('serialize'):
+                slots = []
+                for container, buffer in self._stream_buffers.items():
+                    container.append(ET.ProcessingInstruction(STREAM_SLOT_PI, str(len(slots))))
+                    slots.append((container, buffer))
+                skeleton = ET.tostring(self.alto_alto, pretty_print=self.profile.pretty_print,
+                                       xml_declaration=True, standalone=True, encoding="UTF-8")
+                for container in self._stream_buffers:
+                    container.remove(container[-1])
+                parts = STREAM_SLOT_RE.split(skeleton)
+                output.write(parts[0])
+                for slot_idx, part in zip(parts[1::2], parts[2::2]):
+                    container, buffer = slots[int(slot_idx)]
+                    if self._stream_chunks is None:
+                        buffer.seek(0)
+                        copyfileobj(buffer, output)
+                    else:
+                        # regions were converted in document order, see _convert_text_incrementally
+                        for offset, length in self._stream_chunks[container]:
+                            buffer.seek(offset)
+                            output.write(buffer.read(length))
+                    output.write(part)
+            if self.stats is not None:
+                self.logger.debug("Conversion stats: %s", self.stats)
+        finally:
+            for buffer in self._stream_buffers.values():
+                buffer.close()
+            self._stream_buffers = None
+            self._stream_chunks = None
+            self._stream_idnext = None
+            self._stream_staging = None
+        return self
+
+    def _flush_region(self, parent, reg_alto):
+        """
+        When streaming, serialize the completely converted region ``reg_alto`` into
+        the buffer of ``parent`` and discard it.
+
+        Returns the offset and length of the serialization in the buffer.
+        """
+        if self._stream_buffers is None:
+            return
+        if self._stream_idnext:
+            for el in reg_alto.iter():
+                id_next = self._stream_idnext.pop(el.get('ID'), None)
+                if id_next:
+                    el.set('IDNEXT', id_next)
+        if parent not in self._stream_buffers:
+            self._stream_buffers[parent] = SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+        buffer = self._stream_buffers[parent]
+        offset = buffer.tell()
+        if self.profile.pretty_print:
+            level = sum(1 for _ in parent.iterancestors()) + 1
+            ET.indent(reg_alto, level=level)
+            buffer.write(b'  ' * level)
+        buffer.write(ET.tostring(reg_alto, encoding='UTF-8', with_tail=False))
+        if self.profile.pretty_print:
+            buffer.write(b'\n')
+        self._stream_staging.remove(reg_alto)
+        return offset, buffer.tell() - offset
+
     def convert_styles(self):
         self.textstyle_mgr.to_xml(self.alto_styles)
         self.parastyle_mgr.to_xml(self.alto_styles)
-        if version.parse(self.alto_version) >= version.parse('2.1'):
+        if self.features.tags:
             self.layouttag_mgr.to_xml(self.alto_tags)
+        if self.stats is not None:
+            self.stats.counts['text_styles'] += len(self.textstyle_mgr)
+            self.stats.counts['paragraph_styles'] += len(self.parastyle_mgr)
+            self.stats.counts['layout_tags'] += len(self.layouttag_mgr) if self.features.tags else 0
+
+    def reading_order_idnext(self):
+        """
+        Map the ID of each region in the reading order to the ID of its successor
+        """
+        if self._scan is not None:
+            index_order = self._scan.reading_order_ids()
+        else:
+            index_order = [x.id for x in self.page_page.get_AllRegions(order='reading-order-only', depth=0)]
+        return dict(zip(index_order[:-1], index_order[1:]))
 
     def convert_reading_order(self):
-        index_order = [x.id for x in self.page_page.get_AllRegions(order='reading-order-only', depth=0)]
-        for id_cur, id_next in zip(index_order[:-1], index_order[1:]):
-            self.alto_printspace.find('.//*[@ID="%s"]' % id_cur).set('IDNEXT', id_next)
+        for id_cur, id_next in self.reading_order_idnext().items():
+            block_alto = self.alto_blocks_by_id.get(id_cur)
+            if block_alto is None:
+                self.logger.warning("region '%s' in reading order was not converted, cannot set IDNEXT", id_cur)
+                continue
+            block_alto.set('IDNEXT', id_next)
+
+    def _index_block(self, block_alto):
+        """
+        Remember ``block_alto`` by its ID for :py:meth:`convert_reading_order` (first occurrence wins).
+        Not needed when streaming, where IDNEXT is set before a region is flushed.
+        """
+        if self._stream_buffers is None:
+            self.alto_blocks_by_id.setdefault(block_alto.get('ID'), block_alto)
 
     def convert_border(self):
         page_width = self.page_page.imageWidth
@@ -211,12 +689,14 @@ class OcrdPageAltoConverter():
             return alto_pspace
 
         alto_pspace = ET.SubElement(self.alto_page, 'PrintSpace')
-        set_alto_xywh_from_coords(alto_pspace, page_pspace)
+        pspace_bbox = self.bbox_for(page_pspace)
+        set_alto_xywh_from_bbox(alto_pspace, pspace_bbox)
+        # removed again if the PrintSpace stays empty, see drop_empty_printspace_shape
         set_alto_shape_from_coords(alto_pspace, page_pspace)
 
         if page_border is not page_pspace:
-            bmin_x, bmin_y, bmax_x, bmax_y = bbox_from_points(page_border.get_Coords().points)
-            pmin_x, pmin_y, pmax_x, pmax_y = bbox_from_points(page_pspace.get_Coords().points)
+            bmin_x, bmin_y, bmax_x, bmax_y = self.bbox_for(page_border)
+            pmin_x, pmin_y, pmax_x, pmax_y = pspace_bbox
             # 
             #  ╔═══════╗   ╔═══════╗   ╔╗   ╔══╗
             #  ║┌───┐  ║   ╚═══════╝   ║║   ║  ║              ┌───┐
@@ -245,6 +725,8 @@ class OcrdPageAltoConverter():
             setxml(alto_bottommargin, 'HPOS', bmin_x)
             setxml(alto_bottommargin, 'HEIGHT', bmax_y - pmax_y)
             setxml(alto_bottommargin, 'WIDTH', bmax_x - bmin_x)
+            # ALTO requires the Margins before PrintSpace
+            self.alto_page.append(alto_pspace)
 
         return alto_pspace
 
@@ -262,12 +744,18 @@ class OcrdPageAltoConverter():
         # convert dates
         # convert processingStep
         for step_idx, step_page in enumerate([x for x in page_metadata.get_MetadataItem() if x.get_type() == 'processingStep']):
-            if version.parse(self.alto_version) >= version.parse('4.0'):
+            if self.features.processing:
                 step_alto = ET.SubElement(self.alto_description, 'Processing')
+                setxml(step_alto, 'ID', f'{step_page.value}-{step_idx}')
             else:
+                # the ID is required on OCRProcessing, not allowed on ocrProcessingStep
                 step_alto = ET.SubElement(self.alto_description, 'OCRProcessing')
+                setxml(step_alto, 'ID', f'{step_page.value}-{step_idx}')
                 step_alto = ET.SubElement(step_alto, 'ocrProcessingStep')
-            setxml(step_alto, 'ID', f'{step_page.value}-{step_idx}')
+            # in the order of the schema's processingStepType
+            if self.timestamp_src:
+                step_alto_processing_date_time = ET.SubElement(step_alto, 'processingDateTime')
+                step_alto_processing_date_time.text = page_timestamp.isoformat()
             step_alto_description = ET.SubElement(step_alto, 'processingStepDescription')
             step_alto_description.text = step_page.name
             if step_page.get_Labels():
@@ -276,18 +764,26 @@ class OcrdPageAltoConverter():
                 for label in step_page.get_Labels()[0].get_Label():
                     json[label.get_type()] = label.value
                 step_alto_settings.text = dumps(json)
-            if self.timestamp_src:
-                step_alto_processing_date_time = ET.SubElement(step_alto, 'processingDateTime')
-                step_alto_processing_date_time.text = page_timestamp.isoformat()
             step_alto_software = ET.SubElement(step_alto, 'processingSoftware')
             step_alto_software_name = ET.SubElement(step_alto_software, 'softwareName')
             step_alto_software_name.text = step_page.value
 
 
-    def _convert_textlines(self, reg_alto, reg_page):
-        if self.dummy_textline:
-            self.set_dummy_line_for_region(reg_page)
+    def textlines_ir(self, reg_page):
+        """
+        The TextLines of Text region ``reg_page`` to convert, as :py:class:`~ocrd_page_to_alto.ir.TextLineIR`
+        with their :py:class:`~ocrd_page_to_alto.ir.WordIR`, including dummy TextLines and Words.
+        """
         lines = reg_page.get_TextLine()
+        if not lines and self.dummy_textline:
+            self.logger.debug("TextRegion '%s' has no TextLine", reg_page.id)
+            if any(x.Unicode for x in reg_page.get_TextEquiv()):
+                line_id = '%s-dummy-TextLine' % reg_page.id
+                self.logger.info("TextRegion '%s' does have TextEquiv/Unicode though, creating dummy TextLine '%s'", reg_page.id, line_id)
+                if self.stats is not None:
+                    self.stats.counts['dummy_lines'] += 1
+                line_ir = self._textline_ir(line_id, reg_page, [], dummy=True)
+                return [line_ir] if line_ir is not None else []
         if self.textline_order == 'document':
             pass
         elif self.textline_order == 'index':
@@ -299,119 +795,318 @@ class OcrdPageAltoConverter():
         elif self.textline_order == 'textline-order':
             # something with reg_page.textLineOrder or reg_page.get_parent_.textLineOrder
             raise Exception("@textLineOrder semantics not implemented; cf. PRImA-Research-Lab/PAGE-XML#26")
+        ret = []
         for line_page in lines:
-            is_empty_line = not(line_page.get_TextEquiv() and line_page.get_TextEquiv()[0].get_Unicode()) and not(line_page.get_Word())
-            if is_empty_line and self.skip_empty_lines:
-                self.logger.debug("Skipping empty line '%s'", line_page.id)
-                continue
-            line_alto = ET.SubElement(reg_alto, 'TextLine')
-            set_alto_id_from_page_id(line_alto, line_page)
-            set_alto_xywh_from_coords(line_alto, line_page)
-            if version.parse(self.alto_version) >= version.parse('3.1'):
-                set_alto_shape_from_coords(line_alto, line_page)
-            if version.parse(self.alto_version) >= version.parse('2.1'):
-                set_alto_lang_from_page_lang(line_alto, line_page)
-            self.textstyle_mgr.set_alto_styleref_from_textstyle(line_alto, line_page)
-            if is_empty_line:
-                word_alto_empty = ET.SubElement(line_alto, 'String')
-                word_alto_empty.set('ID', '%s-word0' % line_page.id)
-                word_alto_empty.set('CONTENT', '')
-            if self.dummy_word:
-                self.set_dummy_word_for_textline(line_page)
-            words_page = line_page.get_Word()
-            for word_idx, word_page in enumerate(words_page):
-                is_last_word = word_idx == len(words_page) - 1
-                word_alto = ET.SubElement(line_alto, 'String')
-                set_alto_id_from_page_id(word_alto, word_page)
-                set_alto_xywh_from_coords(word_alto, word_page)
-                if version.parse(self.alto_version) >= version.parse('3.1'):
-                    set_alto_shape_from_coords(word_alto, word_page)
-                if version.parse(self.alto_version) >= version.parse('2.1'):
-                    set_alto_lang_from_page_lang(word_alto, word_page)
-                self.textstyle_mgr.set_alto_styleref_from_textstyle(word_alto, word_page)
-                word_content = get_nth_textequiv(word_page, self.textequiv_index, self.textequiv_fallback_strategy)
-                if not is_last_word:
-                    ET.SubElement(line_alto, 'SP')
-                else:
-                    if self.trailing_dash_to_hyp and word_content and word_content[-1] in HYPHEN_CHARS:
-                        hyphen_content = word_content[-1]
-                        hyp_alto = ET.SubElement(line_alto, 'HYP')
-                        hyp_alto.set('CONTENT', hyphen_content)
-                        word_content = word_content[:-1]
+            line_ir = self._textline_ir(line_page.id, line_page, line_page.get_Word())
+            if line_ir is not None:
+                ret.append(line_ir)
+        return ret
+
+    def _textline_ir(self, line_id, line_page, words_page, dummy=False):
+        """
+        :py:class:`~ocrd_page_to_alto.ir.TextLineIR` of ``line_page`` (a TextLine, or the region
+        of a ``dummy`` TextLine) with ``words_page``, or ``None`` if it is an empty line to skip.
+        """
+        textequivs = line_page.get_TextEquiv()
+        is_empty_line = not(textequivs and textequivs[0].get_Unicode()) and not(words_page)
+        if is_empty_line and self.skip_empty_lines:
+            self.logger.debug("Skipping empty line '%s'", line_id)
+            return None
+        line_ir = TextLineIR(line_id, self.bbox_for(line_page), line_page.get_Coords().points, empty=is_empty_line)
+        if not dummy:
+            line_ir.styleref = self._styleref_for(line_page)
+            if self.features.lang:
+                line_ir.lang = alto_lang_from_page_lang(line_page)
+        if not words_page and self.dummy_word:
+            self.logger.debug("TextLine '%s' has no Word", line_id)
+            if any(x.Unicode for x in textequivs):
+                word_id = '%s-dummy-Word' % line_id
+                self.logger.info("TextLine '%s' does have TextEquiv/Unicode though, creating dummy Word '%s'", line_id, word_id)
+                if self.stats is not None:
+                    self.stats.counts['dummy_words'] += 1
+                line_ir.words.append(WordIR(word_id, line_ir.bbox, line_ir.points, nth_textequiv(
+                    textequivs, word_id, self.textequiv_index, self.textequiv_fallback_strategy)))
+        bboxes = self._bboxes
+        with_lang = self.features.lang
+        words_ir = line_ir.words
+        for word_page in words_page:
+            points = word_page.get_Coords().points
+            bbox = bboxes.get(points)
+            textstyle = word_page.get_TextStyle()
+            words_ir.append(WordIR(
+                word_page.id, bbox if bbox is not None else bbox_from_points(points), points,
+                get_nth_textequiv(word_page, self.textequiv_index, self.textequiv_fallback_strategy),
+                styleref=self.textstyle_mgr.from_textstyle(textstyle) if textstyle else None,
+                lang=alto_lang_from_page_lang(word_page) if with_lang else None))
+        return line_ir
+
+    def _styleref_for(self, el):
+        textstyle = el.get_TextStyle()
+        return self.textstyle_mgr.from_textstyle(textstyle) if textstyle else None
+
+    def _convert_textlines(self, reg_alto, reg_page):
+        line_shape = 'line' in self.shape_levels
+        word_shape = 'word' in self.shape_levels
+        SubElement = ET.SubElement
+        for line_ir in self.textlines_ir(reg_page):
+            line_alto = SubElement(reg_alto, 'TextLine', ID=line_ir.id)
+            set_alto_xywh_from_bbox(line_alto, line_ir.bbox)
+            if line_shape:
+                set_alto_shape_from_points(line_alto, line_ir.points)
+            if line_ir.lang:
+                line_alto.set('LANG', line_ir.lang)
+            if line_ir.styleref:
+                line_alto.set('STYLEREFS', line_ir.styleref)
+            if line_ir.empty:
+                SubElement(line_alto, 'String', ID='%s-word0' % line_ir.id, CONTENT='')
+            words = line_ir.words
+            if self.stats is not None:
+                self.stats.counts['lines'] += 1
+                self.stats.counts['words'] += len(words)
+            last_word_idx = len(words) - 1
+            for word_idx, word_ir in enumerate(words):
+                word_alto = SubElement(line_alto, 'String', ID=word_ir.id)
+                set_alto_xywh_from_bbox(word_alto, word_ir.bbox)
+                if word_shape:
+                    set_alto_shape_from_points(word_alto, word_ir.points)
+                if word_ir.lang:
+                    word_alto.set('LANG', word_ir.lang)
+                if word_ir.styleref:
+                    word_alto.set('STYLEREFS', word_ir.styleref)
+                word_content = word_ir.content
+                if word_idx != last_word_idx:
+                    SubElement(line_alto, 'SP')
+                elif self.trailing_dash_to_hyp and word_content and word_content[-1] in HYPHEN_CHARS:
+                    SubElement(line_alto, 'HYP', CONTENT=word_content[-1])
+                    word_content = word_content[:-1]
                 word_alto.set('CONTENT', word_content)
 
-    def _convert_table(self, parent_alto, parent_page, level=0):
-        if not level:
-            for reg_page in parent_page.get_TextRegion():
-                self._convert_table(parent_alto, reg_page, level=level + 1)
+    def place_regions(self, bboxes):
+        """
+        Determine the PrintSpace or Margin each of the region ``bboxes`` (minx, miny, maxx, maxy)
+        belongs to, i.e. the first of PrintSpace, LeftMargin, RightMargin, TopMargin and
+        BottomMargin to fully contain it, or ``None`` if there is none.
+        """
+        spaces = [space for space in [self.alto_printspace] + [
+            self.alto_page.find(margin) for margin in ['LeftMargin', 'RightMargin', 'TopMargin', 'BottomMargin']]
+            if space is not None]
+        spaces_bbox = np.array([bbox_from_alto_xywh(space) for space in spaces]).reshape(1, -1, 4)
+        bboxes = np.array(bboxes).reshape(-1, 1, 4)
+        # regions x spaces
+        contained = (bboxes[..., :2] >= spaces_bbox[..., :2]).all(axis=2) & (bboxes[..., 2:] <= spaces_bbox[..., 2:]).all(axis=2)
+        return [spaces[space_idx] if is_contained else None
+                for space_idx, is_contained in zip(contained.argmax(axis=1).tolist(), contained.any(axis=1).tolist())]
+
+    def parse_coords(self, regs_page=None):
+        """
+        Parse the Coords of all regions, lines and words of the page (or only those of the
+        top-level regions ``regs_page`` of the slim model) in bulk, for :py:meth:`bbox_for`
+        """
+        if regs_page is None:
+            regs_page = self.page_page.get_AllRegions(depth=0)
         else:
-            if parent_page.get_TextRegion():
-                reg_alto = ET.SubElement(parent_alto, 'ComposedBlock')
-                set_alto_id_from_page_id(reg_alto, parent_page) # TODO not unique!
-                if version.parse(self.alto_version) >= version.parse('2.1'):
-                    set_alto_lang_from_page_lang(reg_alto, parent_page)
-                for reg_page in parent_page.get_TextRegion():
-                    self._convert_table(reg_alto, reg_page, level=level + 1)
-            else:
-                textblock_alto = ET.SubElement(parent_alto, 'TextBlock')
-                set_alto_id_from_page_id(textblock_alto, parent_page)
-                if version.parse(self.alto_version) >= version.parse('2.1'):
-                    set_alto_lang_from_page_lang(textblock_alto, parent_page)
-                else:
-                    set_alto_lang_from_page_lang(textblock_alto, parent_page, attribute_name="language")
-                self._convert_textlines(textblock_alto, parent_page)
+            regs_page = [reg for reg_page in regs_page for reg in [reg_page] + page_lxml.nested_regions(reg_page)]
+        points_list = []
+        for reg_page in regs_page:
+            points_list.append(reg_page.get_Coords().points)
+            for line_page in reg_page.get_TextLine() if hasattr(reg_page, 'get_TextLine') else []:
+                points_list.append(line_page.get_Coords().points)
+                for word_page in line_page.get_Word():
+                    points_list.append(word_page.get_Coords().points)
+        try:
+            self._bboxes = dict(zip(points_list, bboxes_from_points(points_list)))
+        except (ValueError, IndexError):
+            # malformed points, raise only if the element is actually converted
+            self._bboxes = {}
+
+    def bbox_for(self, el):
+        """
+        Bounding box (minx, miny, maxx, maxy) of the Coords of PAGE element ``el``
+        """
+        points = el.get_Coords().points
+        bbox = self._bboxes.get(points)
+        if bbox is None:
+            bbox = bbox_from_points(points)
+        return bbox
+
+    def drop_empty_printspace_shape(self):
+        """
+        Remove the Shape of a PrintSpace without blocks, unless the ALTO version allows
+        that (see :py:attr:`~ocrd_page_to_alto.versions.AltoFeatures.printspace_shape`).
+        """
+        alto_pspace = self.alto_printspace
+        shape = alto_pspace.find('Shape')
+        if shape is None or self.features.printspace_shape or len(alto_pspace) > 1:
+            return
+        if self._stream_buffers and alto_pspace in self._stream_buffers:
+            # its blocks are already serialized
+            return
+        alto_pspace.remove(shape)
 
     def convert_text(self):
-        for reg_page in self.page_page.get_AllRegions(depth=1, order=self.region_order):
-            reg_page_type = reg_page.__class__.__name__[0:-10] # len('RegionType') == 10
-            reg_alto_type = REGION_PAGE_TO_ALTO[reg_page_type]
+        if self._scan is not None:
+            self._convert_text_incrementally()
+            self.drop_empty_printspace_shape()
+            return
+        self.parse_coords()
+        regs_page = self.page_page.get_AllRegions(depth=1, order=self.region_order)
+        regs_bbox = [self.bbox_for(reg_page) for reg_page in regs_page]
+        for reg_page, reg_bbox, parent in zip(regs_page, regs_bbox, self.place_regions(regs_bbox)):
+            reg_page_type, reg_alto_type = self.region_type(reg_page)
+            if not reg_alto_type:
+                raise ValueError("Cannot handle PAGE-XML %sRegion" % reg_page_type)
+            if parent is None:
+                parent = self.alto_printspace
+                self.logger.warning("region '%s' not properly contained in PrintSpace or Margins", reg_page.id)
+            reg_alto = self.convert_region(parent if self._stream_buffers is None else self._stream_staging, reg_page)
+            self._flush_region(parent, reg_alto)
+        self.drop_empty_printspace_shape()
+
+    def _convert_text_incrementally(self):
+        """
+        :py:meth:`convert_text` for ``page_engine='iterparse'``: read the top-level regions
+        of the file one by one, convert each as soon as it has been parsed and discard it.
+
+        Regions are converted in document order. Their ``region_order`` (known from the
+        pre-scan) is restored afterwards, when streaming by splicing their serializations
+        in that order, so the ALTO is the same as with the other engines.
+        """
+        order = self._scan.region_order(self.region_order)
+        occurrences = Counter(order)
+        # converted copies of each region (as often as it occurs in order) by document order index
+        converted = {}
+        regions = page_lxml.iter_regions(self._scan.filename, occurrences)
+        parse_seconds = 0
+        while True:
+            t0 = perf_counter()
+            doc_idx, reg_page = next(regions, (None, None))
+            parse_seconds += perf_counter() - t0
+            if reg_page is None:
+                break
+            reg_page_type, reg_alto_type = self.region_type(reg_page)
             if not reg_alto_type:
                 raise ValueError("Cannot handle PAGE-XML %sRegion" % reg_page_type)
-            # determine if the region belongs to PrintSpace or to any of the Margins
-            reg_bbox = bbox_from_points(reg_page.get_Coords().points)
-            if contains(self.alto_printspace, reg_bbox):
+            self.parse_coords([reg_page])
+            reg_bbox = self.bbox_for(reg_page)
+            parent, = self.place_regions([reg_bbox])
+            if parent is None:
                 parent = self.alto_printspace
+                self.logger.warning("region '%s' not properly contained in PrintSpace or Margins", reg_page.id)
+            copies = converted[doc_idx] = []
+            for _ in range(occurrences[doc_idx]):
+                if self._stream_buffers is None:
+                    copies.append((parent, self.convert_region(parent, reg_page)))
+                else:
+                    copies.append((parent, self._flush_region(parent, self.convert_region(self._stream_staging, reg_page))))
+            # the PAGE TextStyles would keep the region alive
+            self.textstyle_mgr.forget_textstyles()
+        if self._stream_buffers is not None:
+            self._stream_chunks = {}
+        for doc_idx in order:
+            parent, reg_alto = converted[doc_idx].pop(0)
+            if self._stream_buffers is None:
+                # moved to the end
+                parent.append(reg_alto)
+            else:
+                self._stream_chunks.setdefault(parent, []).append(reg_alto)
+        if self.stats is not None:
+            # reading happened within the text phase
+            self.stats.seconds['parse'] += parse_seconds
+            self.stats.seconds['text'] -= parse_seconds
+
+    def convert_region(self, parent_alto, reg_page):
+        """
+        Convert ``reg_page`` and all regions nested in it, to any depth, below ``parent_alto``.
+
+        Regions are walked with an explicit stack instead of recursion. A region with nested
+        regions becomes a ComposedBlock (like Tables always do), which holds a block for the
+        content of the region itself (e.g. a TextBlock for the TextLines of a table cell), if any,
+        followed by the nested regions. Nested regions of unsupported types are skipped.
+
+        Returns the ALTO element of ``reg_page``.
+        """
+        ret = None
+        stack = [(parent_alto, reg_page)]
+        while stack:
+            parent_alto, reg_page = stack.pop()
+            reg_page_type, reg_alto_type = self.region_type(reg_page)
+            children = []
+            for child_page in self.child_regions(reg_page):
+                if self.region_type(child_page)[1]:
+                    children.append(child_page)
+                else:
+                    self.logger.warning("Cannot handle PAGE-XML %sRegion '%s' nested in '%s', skipping",
+                                        self.region_type(child_page)[0], child_page.id, reg_page.id)
+            reg_bbox = self.bbox_for(reg_page)
+            if children and reg_alto_type != 'ComposedBlock':
+                reg_alto = self._add_block(parent_alto, 'ComposedBlock', reg_page, reg_page.id, reg_bbox)
+                if reg_page_type != 'Text' or self._has_textlines(reg_page):
+                    self._convert_region_content(
+                        self._add_block(reg_alto, reg_alto_type, reg_page, '%s-%s' % (reg_page.id, reg_alto_type), reg_bbox),
+                        reg_page, reg_page_type)
             else:
-                parent = None
-                for margin in ['LeftMargin', 'RightMargin', 'TopMargin', 'BottomMargin']:
-                    if not hasattr(self.alto_page, margin):
-                        continue
-                    margin = getattr(self.alto_page, margin)
-                    if contains(margin, reg_bbox):
-                        parent = margin
-                        break # pick first match only
-                if not parent:
-                    parent = self.alto_printspace
-                    self.logger.warning("region '%s' not properly contained in PrintSpace or Margins", reg_page.id)
-            reg_alto = ET.SubElement(parent, reg_alto_type)
-            set_alto_id_from_page_id(reg_alto, reg_page)
-            set_alto_xywh_from_coords(reg_alto, reg_page)
-            if version.parse(self.alto_version) >= version.parse('3.1'):
-                set_alto_shape_from_coords(reg_alto, reg_page)
-            if version.parse(self.alto_version) >= version.parse('2.1'):
-                set_alto_lang_from_page_lang(reg_alto, reg_page)
-            self.textstyle_mgr.set_alto_styleref_from_textstyle(reg_alto, reg_page)
-            self.parastyle_mgr.set_alto_styleref_from_textstyle(reg_alto, reg_page)
-            if version.parse(self.alto_version) >= version.parse('2.1'):
-                self.layouttag_mgr.set_alto_tag_from_type(reg_alto, reg_page)
-            if reg_page_type == 'Text':
-                self._convert_textlines(reg_alto, reg_page)
-            elif reg_page_type == 'Table':
-                self._convert_table(reg_alto, reg_page)
-
-    def _set_dummy_x_for_y(self, el, parent_level):
-        child_level = 'Word' if parent_level == 'TextLine' else 'TextLine'
-        child_type = WordType if parent_level == 'TextLine' else TextLineType
-        children = getattr(el, 'get_%s' % child_level)()
-        if not children:
-            self.logger.debug("%s '%s' has no %s", parent_level, el.id, child_level)
-            if len(el.get_TextEquiv()) and any(x.Unicode for x in el.get_TextEquiv()):
-                child_id = '%s-dummy-%s' % (el.id, child_level)
-                self.logger.info("%s '%s' does have TextEquiv/Unicode though, creating dummy %s '%s'", parent_level, el.id, child_level, child_id)
-                getattr(el, 'add_%s' % child_level)(child_type(id=child_id, Coords=el.get_Coords(), TextEquiv=el.get_TextEquiv()))
-
-    def set_dummy_word_for_textline(self, line_page):
-        self._set_dummy_x_for_y(line_page, 'TextLine')
-
-    def set_dummy_line_for_region(self, reg_page):
-        self._set_dummy_x_for_y(reg_page, 'TextRgion')
+                reg_alto = self._add_block(parent_alto, reg_alto_type, reg_page, reg_page.id, reg_bbox)
+                self._convert_region_content(reg_alto, reg_page, reg_page_type)
+            self._index_block(reg_alto)
+            if ret is None:
+                ret = reg_alto
+            # reversed, so the nested regions are converted (and appended) in order
+            stack.extend((reg_alto, child_page) for child_page in reversed(children))
+            if self.stats is not None:
+                self.stats.counts['regions'] += 1
+        return ret
+
+    def _add_block(self, parent_alto, block_type, reg_page, block_id, bbox):
+        block_alto = ET.SubElement(parent_alto, block_type)
+        block_alto.set('ID', self.unique_id(block_id))
+        set_alto_xywh_from_bbox(block_alto, bbox)
+        if 'region' in self.shape_levels:
+            set_alto_shape_from_coords(block_alto, reg_page)
+        if self.features.lang:
+            set_alto_lang_from_page_lang(block_alto, reg_page)
+        elif block_type == 'TextBlock':
+            set_alto_lang_from_page_lang(block_alto, reg_page, attribute_name='language')
+        self.textstyle_mgr.set_alto_styleref_from_textstyle(block_alto, reg_page)
+        self.parastyle_mgr.set_alto_styleref_from_textstyle(block_alto, reg_page)
+        if self.features.tags:
+            self.layouttag_mgr.set_alto_tag_from_type(block_alto, reg_page)
+        return block_alto
+
+    def _convert_region_content(self, reg_alto, reg_page, reg_page_type):
+        if reg_page_type == 'Text':
+            self._convert_textlines(reg_alto, reg_page)
+
+    def _has_textlines(self, reg_page):
+        """
+        Whether Text region ``reg_page`` has TextLines, or will get a dummy TextLine
+        """
+        return bool(reg_page.get_TextLine()) or (self.dummy_textline and any(x.Unicode for x in reg_page.get_TextEquiv()))
+
+    def unique_id(self, block_id):
+        """
+        ``block_id``, or if that was used for a block before, with the lowest free suffix ``_2``, ``_3``...
+        """
+        ret = block_id
+        suffix = 1
+        while ret in self._block_ids:
+            suffix += 1
+            ret = '%s_%d' % (block_id, suffix)
+        self._block_ids.add(ret)
+        return ret
+
+    def child_regions(self, reg_page):
+        """
+        Regions nested directly in ``reg_page``, grouped by type like ``get_AllRegions`` does
+        """
+        if self.page_model is page_lxml:
+            return page_lxml.child_regions(reg_page)
+        return [child for getter in CHILD_REGION_GETTERS for child in getattr(reg_page, getter)()]
+
+    def region_type(self, reg_page):
+        """
+        PAGE region type (e.g. ``Text``) of ``reg_page`` and the ALTO element to convert it to
+        """
+        region_type = self.profile.region_types.get(reg_page.__class__.__name__)
+        if region_type is None:
+            region_type = (reg_page.__class__.__name__[0:-10], None) # len('RegionType') == 10
+        return region_type
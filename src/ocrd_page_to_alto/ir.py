@@ -0,0 +1,34 @@
+"""
+Compact intermediate representation of the TextLines and Words of a region,
+built from either PAGE object model and consumed by the ALTO emitter.
+
+Only the values the emitter needs are kept: IDs, bounding boxes, points,
+the selected text, the ID of the ALTO TextStyle and the ALTO language.
+Dummy TextLines and Words are synthesized here, so the PAGE object model
+is never modified.
+"""
+# pylint: disable=too-few-public-methods
+
+class WordIR():
+    __slots__ = ('id', 'bbox', 'points', 'content', 'styleref', 'lang')
+
+    def __init__(self, id, bbox, points, content, styleref=None, lang=None): # pylint: disable=redefined-builtin
+        self.id = id
+        self.bbox = bbox
+        self.points = points
+        self.content = content
+        self.styleref = styleref
+        self.lang = lang
+
+class TextLineIR():
+    __slots__ = ('id', 'bbox', 'points', 'empty', 'styleref', 'lang', 'words')
+
+    def __init__(self, id, bbox, points, empty=False, styleref=None, lang=None, words=None): # pylint: disable=redefined-builtin
+        self.id = id
+        self.bbox = bbox
+        self.points = points
+        # neither text nor Words, see OcrdPageAltoConverter.skip_empty_lines
+        self.empty = empty
+        self.styleref = styleref
+        self.lang = lang
+        self.words = words if words is not None else []
@@ -0,0 +1,227 @@
+"""
+Convert many PAGE-XML documents (e.g. a METS file group) into a single ALTO
+document with one Page each, or a ZIP archive of it with an index of the pages.
+"""
+from json import dumps
+from os import PathLike, fspath
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from lxml import etree as ET
+from ocrd_utils import getLogger
+
+from .convert import STREAM_SLOT_PI, STREAM_SLOT_RE, conversion_profile, _no_phase
+from .styles import TextStylesManager, ParagraphStyleManager, LayoutTagManager
+from .stats import ConversionStats
+
+MULTIPAGE_FORMATS = ['alto', 'zip']
+
+MULTIPAGE_SPOOL_SIZE = 16 * 1024 * 1024
+
+# chunk size for copying the spooled pages to the output
+COPY_BUFSIZE = 1024 * 1024
+
+ARCHIVE_ALTO_NAME = 'alto.xml'
+ARCHIVE_INDEX_NAME = 'index.json'
+
+class MultiPageAltoConverter():
+    """
+    Conversion of many PAGE-XML documents to one ALTO document with a Page per
+    document, in the order they are added with :py:meth:`add_page`.
+
+    TextStyles, ParagraphStyles and LayoutTags are shared by all pages, so each
+    style is only written once. Since ALTO IDs must be unique in the document,
+    the IDs of all elements of a page are prefixed with the ID of the page. The
+    Description is that of the first page, with the processing steps of all
+    pages (once per ID).
+
+    Each page is serialized right after conversion into a (spooled) buffer, so
+    only the skeleton of the document is kept in memory.
+    """
+
+    def __init__(self, profile=None, logger=None, **options):
+        """
+        Keyword Args:
+            profile (ConversionProfile): Conversion options to use for all pages
+            logger (logging.Logger): Logger to use instead of ``page-to-alto``
+            **options: Alternatively to ``profile``, the conversion options themselves,
+                see :py:class:`~ocrd_page_to_alto.convert.ConversionProfile`
+        """
+        if profile is None:
+            profile = conversion_profile(**options)
+        elif options:
+            raise ValueError("Must pass either profile or conversion options to constructor, not both")
+        if profile.validate:
+            raise ValueError("Pages are serialized as soon as they are added, so the combined ALTO cannot be validated")
+        self.profile = profile
+        self.logger = logger if logger else getLogger('page-to-alto')
+        self.stats = ConversionStats() if profile.stats else None
+        self.alto_alto = profile.alto_skeleton()
+        self.alto_description = self.alto_alto[0]
+        self.alto_styles = self.alto_alto[1]
+        self.alto_tags = self.alto_alto[2] if profile.features.tags else None
+        self.alto_layout = self.alto_alto[-1]
+        # pages come from the converters
+        self.alto_layout.remove(self.alto_layout[0])
+        self.textstyle_mgr = TextStylesManager(profile.alto_version)
+        self.parastyle_mgr = ParagraphStyleManager(profile.alto_version)
+        self.layouttag_mgr = LayoutTagManager(profile.alto_version)
+        # index entry per page, offset and length relative to the buffer
+        self.pages = []
+        self._page_ids = set()
+        self._description_ids = set()
+        self._buffer = SpooledTemporaryFile(max_size=MULTIPAGE_SPOOL_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._buffer.close()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def add_page(self, page, page_id=None, source=None):
+        """
+        Convert ``page`` (a PAGE-XML filename, lxml tree or PAGE object model, see
+        :py:meth:`~ocrd_page_to_alto.convert.ConversionProfile.converter`) and
+        append it to the document.
+
+        If conversion fails, the exception is raised and the document is unchanged.
+
+        Keyword Args:
+            page_id (string): ID of the ALTO Page (e.g. the physical page of a METS),
+                default is the ``pcGtsId`` of the PAGE-XML. Made unique with a suffix if necessary.
+            source (string): Name of the input to record in the index, default is ``page`` if it is a filename
+
+        Returns the ID of the page
+        """
+        converter = self.profile.converter(page, logger=self.logger)
+        converter.textstyle_mgr = self.textstyle_mgr
+        converter.parastyle_mgr = self.parastyle_mgr
+        converter.layouttag_mgr = self.layouttag_mgr
+        managers = (self.textstyle_mgr, self.parastyle_mgr, self.layouttag_mgr)
+        lengths = [len(manager) for manager in managers]
+        try:
+            with converter._phase('metadata'):
+                converter.convert_metadata()
+            with converter._phase('text'):
+                converter.convert_text()
+            with converter._phase('reading_order'):
+                converter.convert_reading_order()
+        except BaseException:
+            # no styles or tags only used by the failed page
+            for manager, length in zip(managers, lengths):
+                manager.rollback(length)
+            raise
+        finally:
+            self.textstyle_mgr.forget_textstyles()
+        with converter._phase('serialize'):
+            self._merge_description(converter.alto_description)
+            page_id = self._unique_page_id(page_id or converter.alto_page.get('ID'))
+            alto_page = converter.alto_page
+            # detach from the converter's document, so the Page does not repeat its namespace declarations
+            ET.Element('Staging').append(alto_page)
+            prefix = page_id + '_'
+            for el in alto_page.iter():
+                for attr in ('ID', 'IDNEXT'):
+                    val = el.get(attr)
+                    if val:
+                        el.set(attr, prefix + val)
+            alto_page.set('ID', page_id)
+            alto_page.set('PHYSICAL_IMG_NR', str(len(self.pages) + 1))
+            if self.profile.pretty_print:
+                ET.indent(alto_page, level=2)
+                self._buffer.write(b'    ')
+            data = ET.tostring(alto_page, encoding='UTF-8', with_tail=False)
+            self.pages.append({
+                'id': page_id,
+                'source': source if source is not None else (fspath(page) if isinstance(page, (str, PathLike)) else None),
+                'image': converter.page_page.imageFilename,
+                'offset': self._buffer.tell(),
+                'length': len(data),
+            })
+            self._buffer.write(data)
+            if self.profile.pretty_print:
+                self._buffer.write(b'\n')
+        if self.stats is not None:
+            self.stats.add(converter.stats)
+        return page_id
+
+    def _unique_page_id(self, page_id):
+        ret = page_id
+        suffix = 1
+        while ret in self._page_ids:
+            suffix += 1
+            ret = '%s_%d' % (page_id, suffix)
+        self._page_ids.add(ret)
+        return ret
+
+    def _merge_description(self, alto_description):
+        """
+        Take over the Description of the first page, and of later pages only
+        the processing steps with an ID not seen yet.
+        """
+        first = not self.pages
+        for el in list(alto_description):
+            if not first and el.tag in ('MeasurementUnit', 'sourceImageInformation'):
+                continue
+            step_id = next((x.get('ID') for x in el.iter() if x.get('ID')), None)
+            if step_id in self._description_ids:
+                continue
+            if step_id:
+                self._description_ids.add(step_id)
+            self.alto_description.append(el)
+
+    def convert_styles(self):
+        for parent in (self.alto_styles, self.alto_tags):
+            if parent is not None:
+                parent.clear()
+        self.textstyle_mgr.to_xml(self.alto_styles)
+        self.parastyle_mgr.to_xml(self.alto_styles)
+        if self.profile.features.tags:
+            self.layouttag_mgr.to_xml(self.alto_tags)
+
+    def write(self, output):
+        """
+        Write the ALTO document with all pages added so far to the binary file handle ``output``.
+
+        Returns the index of the pages, a list of dicts with the ``id`` of each page, its ``source``
+        and ``image`` filenames, and the ``offset`` and ``length`` in bytes of its Page element.
+        """
+        phase = self.stats.phase if self.stats is not None else _no_phase
+        with phase('styles'):
+            self.convert_styles()
+        with phase('serialize'):
+            self.alto_layout.append(ET.ProcessingInstruction(STREAM_SLOT_PI, '0'))
+            skeleton = ET.tostring(self.alto_alto, pretty_print=self.profile.pretty_print,
+                                   xml_declaration=True, standalone=True, encoding="UTF-8")
+            self.alto_layout.remove(self.alto_layout[-1])
+            head, _, tail = STREAM_SLOT_RE.split(skeleton)
+            output.write(head)
+            self._buffer.seek(0)
+            copyfileobj(self._buffer, output, COPY_BUFSIZE)
+            output.write(tail)
+        if self.stats is not None:
+            self.stats.counts['text_styles'] = len(self.textstyle_mgr)
+            self.stats.counts['paragraph_styles'] = len(self.parastyle_mgr)
+            self.stats.counts['layout_tags'] = len(self.layouttag_mgr) if self.profile.features.tags else 0
+            self.logger.debug("Conversion stats: %s", self.stats)
+        return [dict(entry, offset=len(head) + entry['offset']) for entry in self.pages]
+
+    def write_archive(self, output):
+        """
+        Write a ZIP archive to the binary file handle ``output`` with the ALTO document
+        (see :py:meth:`write`) as ``alto.xml`` and its index of pages as ``index.json``.
+
+        Offsets in the index are relative to the start of the (uncompressed) ``alto.xml``.
+        """
+        with ZipFile(output, 'w', compression=ZIP_DEFLATED) as archive:
+            with archive.open(ARCHIVE_ALTO_NAME, 'w', force_zip64=True) as member:
+                index = self.write(member)
+            archive.writestr(ARCHIVE_INDEX_NAME, dumps({'alto': ARCHIVE_ALTO_NAME, 'pages': index}, indent=2))
+        return index
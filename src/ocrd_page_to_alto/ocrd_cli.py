@@ -1,4 +1,4 @@
-from .ocrd_processor import Page2AltoProcessor
+from .ocrd_processor import Alto2PageProcessor, Page2AltoProcessor
 from click import command
 from ocrd.decorators import ocrd_cli_options, ocrd_cli_wrap_processor
 
@@ -7,5 +7,10 @@ from ocrd.decorators import ocrd_cli_options, ocrd_cli_wrap_processor
 def main(*args, **kwargs):
     return ocrd_cli_wrap_processor(Page2AltoProcessor, *args, **kwargs)
 
+@command()
+@ocrd_cli_options
+def alto2page(*args, **kwargs):
+    return ocrd_cli_wrap_processor(Alto2PageProcessor, *args, **kwargs)
+
 if __name__ == '__main__':
     main()
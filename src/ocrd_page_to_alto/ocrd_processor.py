@@ -1,32 +1,353 @@
+from concurrent.futures import Future
 from functools import cached_property
 from typing import Optional
-from os.path import join
+from os import cpu_count, makedirs, replace, unlink
+from os.path import dirname, join
+
+from lxml import etree as ET
+from pebble import ProcessPool
 
 from ocrd import Processor
 from ocrd_models.ocrd_file import OcrdFileType
 from ocrd_utils import (
+    config,
     make_file_id,
     MIMETYPE_PAGE,
 )
 
-from .convert import OcrdPageAltoConverter
+from .alto_to_page import AltoPageConverter
+from .cache import ConversionCache
+from .convert import OcrdPageAltoConverter, conversion_profile
+from .multipage import MultiPageAltoConverter
+from .schema import validate_alto
+from .stats import ConversionStats
 
+MIMETYPE_ALTO = 'application/alto+xml'
+COMBINED_MIMETYPES = {'alto': MIMETYPE_ALTO, 'zip': 'application/zip'}
 
-class Page2AltoProcessor(Processor):
+def partial_file_for(local_filename):
+    """
+    The file next to ``local_filename`` to write the output to, until it has been added
+    to the METS: so existing output is only ever replaced once the workspace allows it.
+    """
+    return local_filename + '.part'
 
-    @cached_property
-    def executable(self):
-        return 'ocrd-page2alto-transform'
+def discard_file(filename):
+    try:
+        unlink(filename)
+    except FileNotFoundError:
+        pass
+
+def check_input_file(input_file, mimetype):
+    """
+    Raise a :py:class:`ValueError` unless ``input_file`` is a local file of ``mimetype``.
+    """
+    if not input_file or not input_file.local_filename:
+        raise ValueError("input file %s is not available locally" % input_file)
+    if input_file.mimetype != mimetype:
+        raise ValueError("input file %s is %s, not %s" % (input_file.ID, input_file.mimetype, mimetype))
+
+def stream_to_file(converter, local_filename):
+    """
+    Stream the output of ``converter`` to ``local_filename``, which is removed
+    again if the conversion fails (instead of being left truncated).
+    """
+    makedirs(dirname(local_filename), exist_ok=True)
+    try:
+        with open(local_filename, 'wb') as output:
+            converter.stream(output)
+    except BaseException:
+        discard_file(local_filename)
+        raise
+
+def convert_page_file(converter_kwargs, page_filename, local_filename, streaming=False):
+    """
+    Convert ``page_filename`` to ALTO. When ``streaming``, write the ALTO to
+    ``local_filename`` (the :py:func:`partial_file_for` the output file),
+    otherwise return it as bytes.
+
+    Returns a tuple of the ALTO document (or ``None``), the converter's ``stats``
+    and its ``validation`` (``None`` unless validated).
+    """
+    converter = OcrdPageAltoConverter(page_filename=page_filename, **converter_kwargs)
+    if streaming:
+        stream_to_file(converter, local_filename)
+        return None, converter.stats, None
+    return converter.convert().to_bytes(), converter.stats, converter.validation
+
+def convert_alto_file(converter_kwargs, alto_filename, local_filename, streaming=False):
+    """
+    Convert ``alto_filename`` to PAGE-XML, like :py:func:`convert_page_file`.
+    """
+    converter = AltoPageConverter(alto_filename=alto_filename, **converter_kwargs)
+    if streaming:
+        stream_to_file(converter, local_filename)
+        return None, converter.stats, None
+    return converter.convert().to_bytes(), converter.stats, None
+
+class PageTask():
+    """
+    Future for converting one page in the pool of :py:class:`PagePoolExecutor`.
+    :py:meth:`result` adds the output file to the METS in the calling
+    (i.e. parent) process.
+    """
+
+    def __init__(self, processor, future, input_file, file_id, local_filename, cache_key=None, partial_filename=None):
+        self.processor = processor
+        self.future = future
+        self.input_file = input_file
+        self.file_id = file_id
+        self.local_filename = local_filename
+        self.cache_key = cache_key
+        self.partial_filename = partial_filename
+
+    def result(self):
+        try:
+            content, stats, validation = self.future.result()
+        except BaseException:
+            # e.g. the worker was stopped on timeout while streaming
+            if self.partial_filename is not None:
+                discard_file(self.partial_filename)
+            raise
+        self.processor.add_output_file(self.input_file, self.file_id, self.local_filename, content, stats, self.cache_key,
+                                       validation, self.partial_filename)
+
+class PagePoolExecutor():
+    """
+    Stands in for the executor of :py:meth:`ocrd.Processor.process_workspace`:
+    instead of running :py:meth:`~ocrd.Processor.process_page_file` for each
+    page, schedule only the conversion (:py:attr:`FileConversionProcessor.convert_file`)
+    on a pool of worker processes, so the METS is only ever modified by the parent process.
+    """
+
+    def __init__(self, processor, max_workers):
+        self.processor = processor
+        self.pool = ProcessPool(max_workers=max_workers)
+
+    def schedule(self, fn, args=None, kwargs=None, timeout=None): # pylint: disable=unused-argument
+        input_file = args[0]
+        check_input_file(input_file, self.processor.input_mimetype)
+        file_id, local_filename = self.processor.output_file_for(input_file)
+        partial_filename = partial_file_for(local_filename)
+        cached, cache_key = self.processor.lookup_cache(input_file, partial_filename)
+        if cached:
+            future = Future()
+            future.set_result((None, None, self.processor.validate_cached(partial_filename)))
+            return PageTask(self.processor, future, input_file, file_id, local_filename, partial_filename=partial_filename)
+        streaming = self.processor.parameter["streaming"]
+        future = self.pool.schedule(self.processor.convert_file, args=(
+            self.processor.converter_kwargs, input_file.local_filename, partial_filename, streaming), timeout=timeout or None)
+        return PageTask(self.processor, future, input_file, file_id, local_filename, cache_key,
+                        partial_filename if streaming else None)
+
+    def shutdown(self, cancel=False):
+        """
+        Wait for the workers to exit, after stopping them right away if ``cancel``
+        """
+        if cancel:
+            self.pool.stop()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+class CombinedPageTask():
+    """
+    Outcome of adding one page to the document of :py:class:`CombiningExecutor`,
+    :py:meth:`result` raises the error of the conversion, if any.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+
+class CombiningExecutor():
+    """
+    Stands in for the executor of :py:meth:`ocrd.Processor.process_workspace`:
+    instead of running :py:meth:`~ocrd.Processor.process_page_file` for each
+    page, add the page to one :py:class:`~ocrd_page_to_alto.multipage.MultiPageAltoConverter`
+    right away (in page order), to be written by the processor at the end.
+    """
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.converter = MultiPageAltoConverter(logger=processor.logger, **processor.converter_kwargs)
+
+    def schedule(self, fn, args=None, kwargs=None, timeout=None): # pylint: disable=unused-argument
+        input_file = args[0]
+        check_input_file(input_file, MIMETYPE_PAGE)
+        self.processor.logger.debug("converting file %s", input_file.local_filename)
+        try:
+            self.converter.add_page(input_file.local_filename, page_id=input_file.pageId, source=input_file.local_filename)
+        except Exception as err: # pylint: disable=broad-except
+            return CombinedPageTask(err)
+        return CombinedPageTask()
+
+class FileConversionProcessor(Processor):
+    """
+    Base of the processors converting each input file to one output file of the
+    page, in this process or (with ``parallel_pages`` other than 1) in a pool of
+    worker processes, see :py:class:`PagePoolExecutor`.
+
+    Subclasses set the MIME types, :py:attr:`convert_file` and :py:attr:`converter_kwargs`.
+    """
+
+    input_mimetype = None
+    output_mimetype = None
+    # module-level function (so it can be pickled for the pool) of the converter
+    # keyword arguments, input filename, partial output filename and ``streaming``, see convert_page_file
+    convert_file = None
+    _page_pool = None
+    stats = None
+    cache = None
+    # input files whose output was found invalid, see add_output_file
+    invalid_files = None
+
+    @property
+    def converter_kwargs(self):
+        raise NotImplementedError()
+
+    def output_file_for(self, input_file):
+        file_id = make_file_id(input_file, self.output_file_grp)
+        return file_id, join(self.output_file_grp, file_id) + '.xml'
+
+    def lookup_cache(self, input_file, local_filename):
+        """
+        With ``cache_dir``, copy the cached output for ``input_file`` to ``local_filename``
+        (the :py:func:`partial_file_for` the output file), if any.
+
+        Returns whether it was cached and the cache key (``None`` without cache).
+        """
+        if self.cache is None:
+            return False, None
+        cache_key = self.cache.key_for_file(input_file.local_filename)
+        return self.cache.copy_to(cache_key, local_filename), cache_key
+
+    def validate_cached(self, filename):
+        """
+        Validate the output ``filename`` copied from the cache, if enabled (the cache
+        does not tell whether it was validated when converted).
+
+        Returns the validation, ``None`` unless validated.
+        """
+        return None
+
+    def add_output_file(self, input_file, file_id, local_filename, content, stats=None, cache_key=None, validation=None,
+                        partial_filename=None):
+        """
+        Add the output ``content`` to the METS as ``local_filename``, or, if it was written to
+        ``partial_filename`` instead, move that in place only once added (or remove it, if the
+        existing output is kept, see ``OCRD_EXISTING_OUTPUT``).
+        """
+        if stats is not None:
+            self.stats.add(stats)
+        if validation:
+            self.invalid_files.append(input_file)
+            for violation in validation:
+                self.logger.error("Output of %s is not valid: %s: %s", input_file.ID, *violation)
+        try:
+            self.workspace.add_file(
+                file_id=file_id,
+                file_grp=self.output_file_grp,
+                pageId=input_file.pageId,
+                mimetype=self.output_mimetype,
+                local_filename=local_filename,
+                content=content)
+        except BaseException:
+            if partial_filename is not None:
+                discard_file(partial_filename)
+            raise
+        if partial_filename is not None:
+            replace(partial_filename, local_filename)
+        if self.cache is not None and not validation:
+            # no key for files copied from the cache
+            self.cache.put(cache_key, local_filename)
+
+    def process_workspace_submit_tasks(self, executor, max_seconds):
+        """
+        With ``parallel_pages`` other than 1, convert pages in a pool of that many
+        worker processes (or one per CPU for 0) and add the results to the METS
+        here, as soon as :py:meth:`process_workspace_handle_tasks` awaits them.
+
+        With ``OCRD_MAX_PARALLEL_PAGES`` above 1, ``executor`` is a pool of core already,
+        so ``parallel_pages`` is ignored (with a warning) instead of stacking another pool on it.
+
+        With ``stats``, timings and counters of all pages are summed up in ``self.stats``.
+        """
+        self.stats = ConversionStats() if self.parameter["stats"] else None
+        self.invalid_files = []
+        parallel_pages = self.parameter["parallel_pages"]
+        if parallel_pages != 1 and config.OCRD_MAX_PARALLEL_PAGES > 1:
+            self.logger.warning("ignoring parallel_pages=%d, as pages are processed in parallel with "
+                                "OCRD_MAX_PARALLEL_PAGES=%d already", parallel_pages, config.OCRD_MAX_PARALLEL_PAGES)
+            parallel_pages = 1
+        if parallel_pages == 1:
+            return super().process_workspace_submit_tasks(executor, max_seconds)
+        self._page_pool = PagePoolExecutor(self, parallel_pages or cpu_count())
+        return super().process_workspace_submit_tasks(self._page_pool, max_seconds)
+
+    def process_workspace_handle_tasks(self, tasks):
+        page_pool = self._page_pool
+        if page_pool is None:
+            ret = super().process_workspace_handle_tasks(tasks)
+        else:
+            try:
+                ret = super().process_workspace_handle_tasks(tasks)
+            except BaseException:
+                page_pool.shutdown(cancel=True)
+                raise
+            finally:
+                self._page_pool = None
+            page_pool.shutdown()
+        self.log_summary()
+        return ret
+
+    def log_summary(self):
+        if self.invalid_files:
+            self.logger.error("Output of %d pages is not valid: %s", len(self.invalid_files),
+                              ', '.join(input_file.ID for input_file in self.invalid_files))
+        if self.stats is not None:
+            self.logger.info("Conversion stats: %s", self.stats.to_json())
+        if self.cache is not None:
+            self.logger.info("%s", self.cache)
 
     def process_page_file(self, *input_files: Optional[OcrdFileType]) -> None:
         input_file = input_files[0]
         assert input_file
         assert input_file.local_filename
         assert self.parameter
-        assert input_file.mimetype == MIMETYPE_PAGE
+        assert input_file.mimetype == self.input_mimetype
         self.logger.debug("converting file %s", input_file.local_filename)
-        converter = OcrdPageAltoConverter(
-            page_filename=input_file.local_filename,
+        file_id, local_filename = self.output_file_for(input_file)
+        partial_filename = partial_file_for(local_filename)
+        cached, cache_key = self.lookup_cache(input_file, partial_filename)
+        if cached:
+            self.logger.debug("copied %s from cache", local_filename)
+            self.add_output_file(input_file, file_id, local_filename, None, validation=self.validate_cached(partial_filename),
+                                 partial_filename=partial_filename)
+            return
+        streaming = self.parameter["streaming"]
+        content, stats, validation = self.convert_file(self.converter_kwargs, input_file.local_filename, partial_filename,
+                                                       streaming)
+        self.add_output_file(input_file, file_id, local_filename, content, stats, cache_key, validation,
+                             partial_filename if streaming else None)
+
+class Page2AltoProcessor(FileConversionProcessor):
+
+    input_mimetype = MIMETYPE_PAGE
+    output_mimetype = MIMETYPE_ALTO
+    convert_file = staticmethod(convert_page_file)
+    _combiner = None
+
+    @cached_property
+    def executable(self):
+        return 'ocrd-page2alto-transform'
+
+    @property
+    def converter_kwargs(self):
+        return dict(
             alto_version=self.parameter["alto_version"].replace('v', ''),
             check_words=self.parameter["check_words"],
             timestamp_src=self.parameter["timestamp_src"],
@@ -39,13 +360,106 @@ class Page2AltoProcessor(Processor):
             textequiv_fallback_strategy=self.parameter["textequiv_fallback_strategy"],
             region_order=self.parameter["region_order"],
             textline_order=self.parameter["textline_order"],
+            page_engine=self.parameter["page_engine"],
+            pretty_print=self.parameter["pretty_print"],
+            shape_levels=self.parameter["shape_levels"],
+            stats=self.parameter["stats"],
+            validate=self.parameter["validate"],
         )
-        converter.convert()
-        file_id = make_file_id(input_file, self.output_file_grp)
+
+    def validate_cached(self, filename):
+        if not self.parameter["validate"]:
+            return None
+        return validate_alto(ET.parse(filename), self.converter_kwargs["alto_version"])
+
+    def add_combined_file(self, converter):
+        """
+        Write the pages converted by ``converter`` to a single file in the output
+        file group, as multi-page ALTO or ZIP archive depending on ``combine``,
+        and add it to the METS (without pageId).
+        """
+        if not len(converter):
+            self.logger.warning("No pages converted, not writing a combined file")
+            return
+        combine = self.parameter["combine"]
+        file_id = self.output_file_grp
+        local_filename = join(self.output_file_grp, file_id) + ('.zip' if combine == 'zip' else '.xml')
+        makedirs(self.output_file_grp, exist_ok=True)
+        with open(local_filename, 'wb') as output:
+            if combine == 'zip':
+                converter.write_archive(output)
+            else:
+                converter.write(output)
+        if converter.stats is not None:
+            self.stats.add(converter.stats)
         self.workspace.add_file(
             file_id=file_id,
             file_grp=self.output_file_grp,
-            pageId=input_file.pageId,
-            mimetype='application/alto+xml',
-            local_filename=join(self.output_file_grp, file_id) + '.xml',
-            content=str(converter))
+            pageId=None,
+            mimetype=COMBINED_MIMETYPES[combine],
+            local_filename=local_filename)
+
+    def process_workspace_submit_tasks(self, executor, max_seconds):
+        """
+        See :py:meth:`FileConversionProcessor.process_workspace_submit_tasks`.
+
+        With ``combine`` other than ``none``, all pages are converted in this process
+        into one document, see :py:meth:`add_combined_file`.
+
+        With ``cache_dir``, pages converted before (with the same parameters) are
+        copied from the :py:class:`~ocrd_page_to_alto.cache.ConversionCache` instead.
+
+        With ``validate``, the ALTO of each page is validated, see :py:meth:`add_output_file`.
+        """
+        if self.parameter["validate"] and (self.parameter["streaming"] or self.parameter["combine"] != 'none'):
+            raise ValueError("validate needs the whole ALTO of a page in memory, it cannot be used with streaming or combine")
+        # check the options once here, not for every page
+        conversion_profile(**self.converter_kwargs)
+        self.cache = None
+        if self.parameter["cache_dir"] and self.parameter["combine"] == 'none':
+            self.cache = ConversionCache(self.parameter["cache_dir"], self.converter_kwargs,
+                                         max_size=self.parameter["cache_size"] * 1024 * 1024)
+        if self.parameter["combine"] == 'none':
+            return super().process_workspace_submit_tasks(executor, max_seconds)
+        self.stats = ConversionStats() if self.parameter["stats"] else None
+        self.invalid_files = []
+        self._combiner = CombiningExecutor(self)
+        return Processor.process_workspace_submit_tasks(self, self._combiner, max_seconds)
+
+    def process_workspace_handle_tasks(self, tasks):
+        combiner = self._combiner
+        if combiner is None:
+            return super().process_workspace_handle_tasks(tasks)
+        try:
+            ret = Processor.process_workspace_handle_tasks(self, tasks)
+            self.add_combined_file(combiner.converter)
+        finally:
+            combiner.converter.close()
+            self._combiner = None
+        self.log_summary()
+        return ret
+
+class Alto2PageProcessor(FileConversionProcessor):
+    """
+    Converts the ALTO files of the input file group to PAGE-XML,
+    with :py:class:`~ocrd_page_to_alto.alto_to_page.AltoPageConverter`.
+    """
+
+    input_mimetype = MIMETYPE_ALTO
+    output_mimetype = MIMETYPE_PAGE
+    convert_file = staticmethod(convert_alto_file)
+
+    @cached_property
+    def executable(self):
+        return 'ocrd-alto2page-transform'
+
+    @property
+    def converter_kwargs(self):
+        return dict(
+            dpi=self.parameter["dpi"] or None,
+            stats=self.parameter["stats"],
+        )
+
+    def zip_input_files(self, require_first=True, mimetype=None, on_error='skip'):
+        # not PAGE-XML or images, which the default looks for
+        return super().zip_input_files(require_first=require_first, mimetype=mimetype or MIMETYPE_ALTO, on_error=on_error)
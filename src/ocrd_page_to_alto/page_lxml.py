@@ -0,0 +1,566 @@
+"""
+Slim PAGE-XML object model read directly with lxml.
+
+Covers only the subset of PAGE that :py:class:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter`
+uses, but mimics the getter API of the generateDS-based :py:mod:`ocrd_models.ocrd_page`
+(including the class names), so the converter can work on either.
+"""
+# pylint: disable=invalid-name, c-extension-no-member
+from datetime import datetime, timedelta, timezone
+
+from lxml import etree as ET
+
+# same as ocrd_models.constants.PAGE_REGION_TYPES, which cannot be imported without all of ocrd_models
+PAGE_REGION_TYPES = [
+    'Advert', 'Chart', 'Chem', 'Custom', 'Graphic', 'Image', 'LineDrawing',
+    'Map', 'Maths', 'Music', 'Noise', 'Separator', 'Table', 'Text', 'Unknown'
+]
+
+def _localname(el):
+    return el.tag[el.tag.rfind('}') + 1:]
+
+def _parse_boolean(val):
+    if val is None:
+        return None
+    val = val.strip()
+    if val in ('true', '1'):
+        return True
+    if val in ('false', '0'):
+        return False
+    raise ValueError("Requires boolean value: %s" % val)
+
+def _parse_int(val):
+    return None if val is None else int(val)
+
+def _parse_float(val):
+    return None if val is None else float(val)
+
+def _parse_datetime(val):
+    """
+    Parse a ``xsd:dateTime`` the same way generateDS does.
+    """
+    tz = None
+    if val[-1] == 'Z':
+        tz = timezone.utc
+        val = val[:-1]
+    elif len(val) > 6 and val[-6] in '+-' and val[-3] == ':':
+        tzoff = int(val[-5:-3]) * 60 + int(val[-2:])
+        tz = timezone(timedelta(minutes=-tzoff if val[-6] == '-' else tzoff))
+        val = val[:-6]
+    time_parts = val.split('.')
+    if len(time_parts) > 1:
+        micro_seconds = int(float('0.' + time_parts[1]) * 1000000)
+        dt = datetime.strptime('%s.%s' % (time_parts[0], str(micro_seconds).rjust(6, '0')), '%Y-%m-%dT%H:%M:%S.%f')
+    else:
+        dt = datetime.strptime(val, '%Y-%m-%dT%H:%M:%S')
+    return dt.replace(tzinfo=tz)
+
+def _child_text(el, localname):
+    for child in el.iterchildren(ET.Element):
+        if _localname(child) == localname:
+            return child.text or ''
+    return None
+
+class CoordsType():
+    __slots__ = ('points',)
+
+    def __init__(self, points=None):
+        self.points = points
+
+class TextEquivType():
+    __slots__ = ('index', 'Unicode')
+
+    def __init__(self, index=None, Unicode=None):
+        self.index = index
+        self.Unicode = Unicode
+
+    def get_index(self):
+        return self.index
+
+    def get_Unicode(self):
+        return self.Unicode
+
+    @classmethod
+    def from_element(cls, el):
+        return cls(index=_parse_int(el.get('index')), Unicode=_child_text(el, 'Unicode'))
+
+class TextStyleType():
+    __slots__ = ('fontFamily', 'serif', 'monospace', 'fontSize', 'textColour', 'textColourRgb',
+                 'bold', 'italic', 'underlined', 'subscript', 'superscript', 'strikethrough', 'smallCaps')
+    _BOOLEAN_ATTRIBUTES = ('serif', 'monospace', 'bold', 'italic', 'underlined',
+                           'subscript', 'superscript', 'strikethrough', 'smallCaps')
+
+    def __init__(self, **kwargs):
+        for att in self.__slots__:
+            setattr(self, att, kwargs.get(att, None))
+
+    @classmethod
+    def from_element(cls, el):
+        attrib = el.attrib
+        kwargs = {att: _parse_boolean(attrib.get(att)) for att in cls._BOOLEAN_ATTRIBUTES}
+        kwargs['fontFamily'] = attrib.get('fontFamily')
+        kwargs['fontSize'] = _parse_float(attrib.get('fontSize'))
+        kwargs['textColour'] = attrib.get('textColour')
+        kwargs['textColourRgb'] = _parse_int(attrib.get('textColourRgb'))
+        return cls(**kwargs)
+
+class _TextElement():
+    """
+    Common base for regions, lines and words: ``@id``, ``Coords``, ``TextEquiv``,
+    ``TextStyle`` and language attributes.
+    """
+    __slots__ = ('id', 'Coords', 'TextEquiv', 'TextStyle', 'primaryLanguage', 'secondaryLanguage', 'language')
+
+    def __init__(self, id=None, Coords=None, TextEquiv=None, TextStyle=None, # pylint: disable=redefined-builtin
+                 primaryLanguage=None, secondaryLanguage=None, language=None):
+        self.id = id
+        self.Coords = Coords
+        self.TextEquiv = TextEquiv if TextEquiv is not None else []
+        self.TextStyle = TextStyle
+        self.primaryLanguage = primaryLanguage
+        self.secondaryLanguage = secondaryLanguage
+        self.language = language
+
+    def get_Coords(self):
+        return self.Coords
+
+    def get_TextEquiv(self):
+        return self.TextEquiv
+
+    def get_TextStyle(self):
+        return self.TextStyle
+
+    def _build(self, el):
+        attrib = el.attrib
+        self.id = attrib.get('id')
+        self.primaryLanguage = attrib.get('primaryLanguage')
+        self.secondaryLanguage = attrib.get('secondaryLanguage')
+        self.language = attrib.get('language')
+        for child in el.iterchildren(ET.Element):
+            self._build_child(_localname(child), child)
+        return self
+
+    def _build_child(self, name, child):
+        if name == 'Coords':
+            self.Coords = CoordsType(child.get('points'))
+        elif name == 'TextEquiv':
+            self.TextEquiv.append(TextEquivType.from_element(child))
+        elif name == 'TextStyle':
+            self.TextStyle = TextStyleType.from_element(child)
+
+class WordType(_TextElement):
+    __slots__ = ()
+
+class TextLineType(_TextElement):
+    __slots__ = ('index', 'Word')
+
+    def __init__(self, index=None, Word=None, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self.Word = Word if Word is not None else []
+
+    def get_Word(self):
+        return self.Word
+
+    def add_Word(self, value):
+        self.Word.append(value)
+
+    def _build(self, el):
+        self.index = _parse_int(el.get('index'))
+        return super()._build(el)
+
+    def _build_child(self, name, child):
+        if name == 'Word':
+            self.Word.append(WordType()._build(child))
+        else:
+            super()._build_child(name, child)
+
+class _RegionType(_TextElement):
+    __slots__ = ('type', 'align', 'TextLine', 'regions')
+
+    def __init__(self, type=None, align=None, TextLine=None, regions=None, **kwargs): # pylint: disable=redefined-builtin
+        super().__init__(**kwargs)
+        self.type = type
+        self.align = align
+        self.TextLine = TextLine if TextLine is not None else []
+        self.regions = regions if regions is not None else []
+
+    def get_type(self):
+        return self.type
+
+    def get_TextLine(self):
+        return self.TextLine
+
+    def add_TextLine(self, value):
+        self.TextLine.append(value)
+
+    def get_TextRegion(self):
+        return [reg for reg in self.regions if reg.__class__ is TextRegionType]
+
+    def _build(self, el):
+        # regions can be nested arbitrarily deep, so build them with a stack instead of recursion
+        stack = [(self, el)]
+        while stack:
+            region, region_el = stack.pop()
+            region.type = region_el.get('type')
+            region.align = region_el.get('align')
+            _TextElement._build(region, region_el)
+            # _build_child left (region, element) pairs of the nested regions to build
+            nested = region.regions
+            region.regions = [nested_region for nested_region, _ in nested]
+            stack.extend(reversed(nested))
+        return self
+
+    def _build_child(self, name, child):
+        if name == 'TextLine':
+            self.TextLine.append(TextLineType()._build(child))
+        elif name in REGION_TYPES:
+            self.regions.append((REGION_TYPES[name](), child))
+        else:
+            super()._build_child(name, child)
+
+REGION_TYPES = {'%sRegion' % class_: type('%sRegionType' % class_, (_RegionType,), {'__slots__': ()})
+                for class_ in PAGE_REGION_TYPES}
+TextRegionType = REGION_TYPES['TextRegion']
+MapRegionType = REGION_TYPES['MapRegion']
+
+# region class -> (position in PAGE_REGION_TYPES, region type)
+_REGION_TYPE_RANKS = {REGION_TYPES['%sRegion' % class_]: (rank, class_) for rank, class_ in enumerate(PAGE_REGION_TYPES)}
+
+def _get_recursive_regions(region, depth, classes):
+    """
+    Same order as generateDS' ``get_AllRegions``: depth-first, siblings
+    grouped by region type in the order of ``PAGE_REGION_TYPES``.
+    Walks the regions with a stack instead of recursion.
+    """
+    ret = []
+    # iterators over the regions of each level still to visit, with the depth left below them
+    stack = [(iter(_sorted_regions(region, isinstance(region, PageType))), depth)]
+    while stack:
+        regions, depth_left = stack[-1]
+        reg = next(regions, None)
+        if reg is None:
+            stack.pop()
+            continue
+        if not classes or _REGION_TYPE_RANKS[reg.__class__][1] in classes:
+            ret.append(reg)
+        if depth_left != 1 and reg.regions:
+            stack.append((iter(_sorted_regions(reg, False)), depth_left - 1 if depth_left else 0))
+    return ret
+
+def _sorted_regions(region, is_page):
+    # stable sort, so the document order within each type is kept
+    ret = sorted(region.regions, key=lambda reg: _REGION_TYPE_RANKS[reg.__class__][0])
+    if not is_page:
+        # 'Map' is not recursive in 2019 schema
+        ret = [reg for reg in ret if reg.__class__ is not MapRegionType]
+    return ret
+
+def child_regions(region):
+    """
+    Regions nested directly in ``region``, in the order of ``get_AllRegions``
+    """
+    return _get_recursive_regions(region, 1, None)
+
+def nested_regions(region):
+    """
+    Regions nested in ``region`` to any depth, in the order of ``get_AllRegions``
+    """
+    return _get_recursive_regions(region, 0, None)
+
+def _get_recursive_reading_order(group):
+    refs = []
+    if _localname(group) in ('OrderedGroup', 'OrderedGroupIndexed'):
+        elements = sorted((child for child in group.iterchildren(ET.Element) if _localname(child) in (
+            'RegionRefIndexed', 'OrderedGroupIndexed', 'UnorderedGroupIndexed')), key=lambda x: int(x.get('index')))
+    else:
+        elements = [child for name in ('RegionRef', 'OrderedGroup', 'UnorderedGroup')
+                    for child in group.iterchildren(ET.Element) if _localname(child) == name]
+    for child in elements:
+        refs.append(child.get('regionRef'))
+        if not _localname(child).startswith('RegionRef'):
+            refs += _get_recursive_reading_order(child)
+    return refs
+
+class LabelType():
+    __slots__ = ('type_', 'value')
+
+    def __init__(self, type_=None, value=None):
+        self.type_ = type_
+        self.value = value
+
+    def get_type(self):
+        return self.type_
+
+class LabelsType():
+    __slots__ = ('Label',)
+
+    def __init__(self, Label=None):
+        self.Label = Label if Label is not None else []
+
+    def get_Label(self):
+        return self.Label
+
+class MetadataItemType():
+    __slots__ = ('type_', 'name', 'value', 'Labels')
+
+    def __init__(self, type_=None, name=None, value=None, Labels=None):
+        self.type_ = type_
+        self.name = name
+        self.value = value
+        self.Labels = Labels if Labels is not None else []
+
+    def get_type(self):
+        return self.type_
+
+    def get_Labels(self):
+        return self.Labels
+
+class MetadataType():
+    __slots__ = ('Created', 'LastChange', 'MetadataItem')
+
+    def __init__(self, Created=None, LastChange=None, MetadataItem=None):
+        self.Created = Created
+        self.LastChange = LastChange
+        self.MetadataItem = MetadataItem if MetadataItem is not None else []
+
+    def get_Created(self):
+        return self.Created
+
+    def get_LastChange(self):
+        return self.LastChange
+
+    def get_MetadataItem(self):
+        return self.MetadataItem
+
+    @classmethod
+    def from_element(cls, el):
+        ret = cls()
+        for child in el.iterchildren(ET.Element):
+            name = _localname(child)
+            if name in ('Created', 'LastChange'):
+                setattr(ret, name, _parse_datetime(child.text.strip()))
+            elif name == 'MetadataItem':
+                labels = [LabelsType([LabelType(label.get('type'), label.get('value'))
+                                      for label in labels_el.iterchildren(ET.Element)])
+                          for labels_el in child.iterchildren(ET.Element) if _localname(labels_el) == 'Labels']
+                ret.MetadataItem.append(MetadataItemType(child.get('type'), child.get('name'), child.get('value'), labels))
+        return ret
+
+class PageType():
+    __slots__ = ('imageFilename', 'imageWidth', 'imageHeight', 'type', 'Border', 'PrintSpace',
+                 'reading_order', 'regions')
+
+    def __init__(self):
+        self.imageFilename = None
+        self.imageWidth = None
+        self.imageHeight = None
+        self.type = None
+        self.Border = None
+        self.PrintSpace = None
+        self.reading_order = None
+        self.regions = []
+
+    def get_type(self):
+        return self.type
+
+    def get_Border(self):
+        return self.Border
+
+    def get_PrintSpace(self):
+        return self.PrintSpace
+
+    def get_AllRegions(self, classes=None, order='document', depth=0):
+        """
+        See :py:meth:`ocrd_models.ocrd_page.PageType.get_AllRegions`
+        """
+        if order not in ['document', 'reading-order', 'reading-order-only']:
+            raise Exception("Argument 'order' must be either 'document', 'reading-order' or 'reading-order-only', not '{}'".format(order))
+        if depth < 0:
+            raise Exception("Argument 'depth' must be an integer greater-or-equal 0, not '{}'".format(depth))
+        ret = _get_recursive_regions(self, depth, classes)
+        if order.startswith('reading-order') and self.reading_order:
+            id2region = {region.id: region for region in ret}
+            in_reading_order = [id2region[region_id] for region_id in self.reading_order if region_id in id2region]
+            if order == 'reading-order-only':
+                ret = in_reading_order
+            else:
+                # by identity, not by ID: regions with duplicate IDs are kept all the same
+                seen = {id(region) for region in in_reading_order}
+                ret = in_reading_order + [region for region in ret if id(region) not in seen]
+        return ret
+
+    @classmethod
+    def from_element(cls, el):
+        ret = cls()
+        ret.imageFilename = el.get('imageFilename')
+        ret.imageWidth = _parse_int(el.get('imageWidth'))
+        ret.imageHeight = _parse_int(el.get('imageHeight'))
+        ret.type = el.get('type')
+        for child in el.iterchildren(ET.Element):
+            name = _localname(child)
+            if name in REGION_TYPES:
+                ret.regions.append(REGION_TYPES[name]()._build(child))
+            elif name in ('Border', 'PrintSpace'):
+                setattr(ret, name, _TextElement()._build(child))
+            elif name == 'ReadingOrder':
+                group = next(child.iterchildren(ET.Element), None)
+                if group is not None:
+                    ret.reading_order = _get_recursive_reading_order(group)
+        return ret
+
+class PcGtsType():
+    __slots__ = ('pcGtsId', 'Metadata', 'Page')
+
+    def __init__(self, pcGtsId=None, Metadata=None, Page=None):
+        self.pcGtsId = pcGtsId
+        self.Metadata = Metadata
+        self.Page = Page
+
+    def get_Metadata(self):
+        return self.Metadata
+
+    def get_Page(self):
+        return self.Page
+
+    @classmethod
+    def from_element(cls, el):
+        ret = cls(pcGtsId=el.get('pcGtsId'))
+        for child in el.iterchildren(ET.Element):
+            name = _localname(child)
+            if name == 'Metadata':
+                ret.Metadata = MetadataType.from_element(child)
+            elif name == 'Page':
+                ret.Page = PageType.from_element(child)
+        return ret
+
+class PageScan():
+    """
+    Result of :py:func:`scan`, everything about a PAGE-XML file that is needed
+    before its regions can be converted one by one with :py:func:`iter_regions`.
+    """
+    __slots__ = ('filename', 'pcgts', 'region_ids', 'region_types', 'all_region_ids', 'line_without_words')
+
+    def __init__(self, filename):
+        self.filename = filename
+        # PcGtsType with everything but the regions
+        self.pcgts = None
+        # ID and class of the top-level regions, in document order
+        self.region_ids = []
+        self.region_types = []
+        # IDs of the regions of any depth
+        self.all_region_ids = set()
+        # ID of the first TextLine with text but without Words (if checked)
+        self.line_without_words = None
+
+    def region_order(self, order):
+        """
+        Document order indices of the top-level regions, in the order of
+        ``get_AllRegions(depth=1, order=order)`` (including regions referenced more than
+        once by the reading order more than once)
+        """
+        ret = sorted(range(len(self.region_ids)), key=lambda idx: _REGION_TYPE_RANKS[self.region_types[idx]][0])
+        reading_order = self.pcgts.get_Page().reading_order
+        if order.startswith('reading-order') and reading_order:
+            id2idx = {self.region_ids[idx]: idx for idx in ret}
+            in_reading_order = [id2idx[region_id] for region_id in reading_order if region_id in id2idx]
+            if order == 'reading-order-only':
+                ret = in_reading_order
+            else:
+                in_reading_order_set = set(in_reading_order)
+                ret = in_reading_order + [idx for idx in ret if idx not in in_reading_order_set]
+        return ret
+
+    def reading_order_ids(self):
+        """
+        IDs of the regions (of any depth) in the reading order, like ``get_AllRegions(order='reading-order-only', depth=0)``
+        """
+        return [region_id for region_id in self.pcgts.get_Page().reading_order or [] if region_id in self.all_region_ids]
+
+_SCAN_TAGS = ['{*}%s' % name for name in ('PcGts', 'Metadata', 'Page', 'Border', 'PrintSpace', 'ReadingOrder')]
+_REGION_TAGS = ['{*}%s' % name for name in REGION_TYPES]
+
+def scan(filename, check_words=False):
+    """
+    Pre-scan the PAGE-XML file ``filename`` incrementally, without building any regions,
+    lines or words, and discarding each top-level region once parsed, so memory is bounded
+    by the largest region. With ``check_words``, also look for TextLines with text but
+    without Words.
+
+    Returns a :py:class:`PageScan`.
+    """
+    ret = PageScan(filename)
+    pcgts = PcGtsType(Page=PageType())
+    page = pcgts.Page
+    tags = _SCAN_TAGS + _REGION_TAGS + (['{*}TextLine'] if check_words else [])
+    for _, el in ET.iterparse(filename, events=('end',), tag=tags, huge_tree=True):
+        name = _localname(el)
+        if name in REGION_TYPES:
+            ret.all_region_ids.add(el.get('id'))
+            parent = el.getparent()
+            if _localname(parent) == 'Page':
+                ret.region_ids.append(el.get('id'))
+                ret.region_types.append(REGION_TYPES[name])
+                el.clear()
+                parent.remove(el)
+        elif name == 'TextLine':
+            if ret.line_without_words is None and _has_text_without_words(el):
+                ret.line_without_words = el.get('id')
+        elif name == 'Metadata':
+            pcgts.Metadata = MetadataType.from_element(el)
+        elif name in ('Border', 'PrintSpace'):
+            setattr(page, name, _TextElement()._build(el))
+        elif name == 'ReadingOrder':
+            group = next(el.iterchildren(ET.Element), None)
+            if group is not None:
+                page.reading_order = _get_recursive_reading_order(group)
+        elif name == 'Page':
+            page.imageFilename = el.get('imageFilename')
+            page.imageWidth = _parse_int(el.get('imageWidth'))
+            page.imageHeight = _parse_int(el.get('imageHeight'))
+            page.type = el.get('type')
+        elif name == 'PcGts':
+            pcgts.pcGtsId = el.get('pcGtsId')
+    ret.pcgts = pcgts
+    return ret
+
+def _has_text_without_words(line_el):
+    has_text = False
+    for child in line_el.iterchildren(ET.Element):
+        name = _localname(child)
+        if name == 'Word':
+            return False
+        if name == 'TextEquiv' and _child_text(child, 'Unicode'):
+            has_text = True
+    return has_text
+
+def iter_regions(filename, indices=None):
+    """
+    Parse the PAGE-XML file ``filename`` incrementally and yield the document order index and
+    the :py:class:`_RegionType` of each top-level region (only those in ``indices``, if given)
+    as soon as it has been parsed, discarding its elements right after.
+    """
+    idx = -1
+    for _, el in ET.iterparse(filename, events=('end',), tag=_REGION_TAGS, huge_tree=True):
+        parent = el.getparent()
+        if _localname(parent) != 'Page':
+            continue
+        idx += 1
+        if indices is None or idx in indices:
+            yield idx, REGION_TYPES[_localname(el)]()._build(el)
+        el.clear()
+        parent.remove(el)
+
+def parse(inFileName):
+    """
+    Parse the PAGE-XML file ``inFileName`` into a :py:class:`PcGtsType`
+    """
+    return parseEtree(ET.parse(inFileName))
+
+def parseEtree(tree):
+    """
+    Read a :py:class:`PcGtsType` from an already parsed lxml ``ElementTree`` or ``Element``
+    """
+    if hasattr(tree, 'getroot'):
+        tree = tree.getroot()
+    return PcGtsType.from_element(tree)
@@ -0,0 +1,117 @@
+"""
+Validation of ALTO documents against the ALTO-XML schema, on the in-memory tree.
+
+The XSDs in ``xsd/`` are used instead of their URLs (see :py:data:`BUNDLED_XSDS`),
+so that validation works offline. Each schema is compiled once per thread.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from os.path import dirname, join
+from threading import local
+
+from lxml import etree as ET
+
+from .versions import XSD_ALTO_URLS
+
+XSD_DIR = join(dirname(__file__), 'xsd')
+XSD_NS = 'http://www.w3.org/2001/XMLSchema'
+XLINK_XSD_URL = 'http://www.loc.gov/standards/xlink/xlink.xsd'
+# local copy in XSD_DIR of each schema URL (ALTO schemas and their imports)
+BUNDLED_XSDS = {
+    XSD_ALTO_URLS['4.2']: 'alto-4-2.xsd',
+    XSD_ALTO_URLS['4.0']: 'alto-4-0.xsd',
+    XSD_ALTO_URLS['3.1']: 'alto-3-1.xsd',
+    XLINK_XSD_URL: 'xlink.xsd',
+}
+# ALTO-XML versions that can be validated, as their schema is bundled (never fetched from its URL)
+VALIDATED_ALTO_VERSIONS = tuple(version for version, url in XSD_ALTO_URLS.items() if url in BUNDLED_XSDS)
+# attributes of XSD elements whose value is a QName (or a list of QNames)
+XSD_QNAME_ATTRIBUTES = ('type', 'base', 'ref', 'itemType', 'memberTypes', 'substitutionGroup')
+
+SchemaViolation = namedtuple('SchemaViolation', ['path', 'message'])
+SchemaViolation.__doc__ = """
+An error of validating an ALTO document: the XPath of the offending element
+(there are no line numbers in a tree that was never serialized) and libxml2's message.
+"""
+
+# compiled schemas of the current thread, as an XMLSchema keeps the error log of its last validation
+_thread_schemas = local()
+
+def _without_namespace(xsd):
+    """
+    Rewrite the parsed schema ``xsd`` to have no target namespace: declarations are
+    in no namespace, and QNames referring to the target namespace are made local.
+    Returns the new root, ``xsd`` is left without children.
+    """
+    target = xsd.get('targetNamespace')
+    def local_name(el, qname):
+        prefix, _, name = qname.rpartition(':')
+        return name if el.nsmap.get(prefix or None) == target else qname
+    for el in xsd.iter('{%s}*' % XSD_NS):
+        for attr in XSD_QNAME_ATTRIBUTES:
+            val = el.get(attr)
+            if val:
+                el.set(attr, ' '.join(local_name(el, qname) for qname in val.split()))
+    nsmap = {prefix: ns for prefix, ns in xsd.nsmap.items() if ns != target}
+    ret = ET.Element(xsd.tag, {name: val for name, val in xsd.items() if name != 'targetNamespace'}, nsmap=nsmap)
+    ret.extend(xsd)
+    return ret
+
+@lru_cache(maxsize=None)
+def _schema_document(alto_version, qualified):
+    filename = BUNDLED_XSDS.get(XSD_ALTO_URLS[alto_version])
+    if filename is None:
+        raise ValueError("The schema of ALTO-XML v%s is not bundled" % alto_version)
+    try:
+        xsd = ET.parse(join(XSD_DIR, filename)).getroot()
+    except (OSError, ET.XMLSyntaxError) as err:
+        raise ValueError("Cannot load the schema of ALTO-XML v%s: %s" % (alto_version, err)) from err
+    # imports of bundled schemas from the bundled files
+    for el in xsd.iter('{%s}import' % XSD_NS, '{%s}include' % XSD_NS):
+        filename = BUNDLED_XSDS.get(el.get('schemaLocation'))
+        if filename:
+            el.set('schemaLocation', join(XSD_DIR, filename))
+    if not qualified:
+        xsd = _without_namespace(xsd)
+    return ET.tostring(xsd)
+
+def alto_schema(alto_version, qualified=True):
+    """
+    The compiled :py:class:`lxml.etree.XMLSchema` of ALTO-XML ``alto_version``, loaded
+    from the bundled XSD on first use in the current thread.
+
+    Unless ``qualified``, the schema is compiled without target namespace, to validate ALTO
+    as built by :py:class:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter`, whose elements
+    only get the ALTO namespace when serialized.
+    """
+    schemas = _thread_schemas.__dict__.setdefault('schemas', {})
+    schema = schemas.get((alto_version, qualified))
+    if schema is None:
+        try:
+            schema = ET.XMLSchema(ET.fromstring(_schema_document(alto_version, qualified)))
+        except ET.XMLSchemaParseError as err:
+            raise ValueError("Cannot compile the schema of ALTO-XML v%s: %s" % (alto_version, err)) from err
+        schemas[(alto_version, qualified)] = schema
+    return schema
+
+def _is_namespace_attribute(error):
+    # the namespace declaration of a converter's tree is a plain attribute, not allowed by the schema
+    return error.type == ET.ErrorTypes.SCHEMAV_CVC_COMPLEX_TYPE_3_2_1 and "attribute 'xmlns'" in error.message
+
+def validate_alto(alto, alto_version):
+    """
+    Validate the ALTO document ``alto`` (an lxml element or tree, parsed or as built
+    by the converter) against the schema of ALTO-XML ``alto_version``. The document
+    is not changed.
+
+    Returns a list of :py:class:`SchemaViolation`, empty if the document is valid.
+    """
+    if hasattr(alto, 'getroot'):
+        alto = alto.getroot()
+    if alto.tag.startswith('{'):
+        schema = alto_schema(alto_version)
+        errors = [] if schema.validate(alto) else schema.error_log
+    else:
+        schema = alto_schema(alto_version, qualified=False)
+        errors = [] if schema.validate(alto) else [error for error in schema.error_log if not _is_namespace_attribute(error)]
+    return [SchemaViolation(error.path, error.message) for error in errors]
@@ -0,0 +1,333 @@
+"""
+Local HTTP service converting PAGE-XML to ALTO in a pool of warm worker
+processes, see ``page-to-alto-serve``.
+
+Endpoints:
+
+    POST /convert   PAGE-XML in the request body, ALTO in the response
+    GET  /health    JSON status of the service
+    GET  /metrics   JSON request counters and latencies (and conversion stats with ``--stats``)
+"""
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from os import cpu_count
+from socket import AF_UNIX
+from socketserver import ThreadingMixIn, UnixStreamServer
+from threading import BoundedSemaphore, Lock
+from time import perf_counter, time
+
+from lxml import etree as ET
+from pebble import ProcessExpired, ProcessPool
+from ocrd_utils import getLogger, initLogging
+
+from .stats import ConversionStats
+
+# number of most recent request latencies that /metrics percentiles are computed from
+LATENCY_WINDOW = 1000
+# largest PAGE-XML accepted in a request body
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+# converted by each worker on startup, so the first request does not pay for lazy initialization
+WARMUP_PAGE = b'''<?xml version="1.0" encoding="UTF-8"?>
+<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15" pcGtsId="warmup">
+  <Metadata>
+    <Creator>page-to-alto</Creator>
+    <Created>2020-01-01T00:00:00</Created>
+    <LastChange>2020-01-01T00:00:00</LastChange>
+  </Metadata>
+  <Page imageFilename="warmup.png" imageWidth="100" imageHeight="100">
+    <Border><Coords points="0,0 99,0 99,99 0,99"/></Border>
+    <PrintSpace><Coords points="5,5 95,5 95,95 5,95"/></PrintSpace>
+    <TextRegion id="r0" primaryLanguage="German">
+      <Coords points="10,10 90,10 90,30 10,30"/>
+      <TextLine id="r0_l0">
+        <Coords points="10,10 90,10 90,30 10,30"/>
+        <Word id="r0_l0_w0">
+          <Coords points="10,10 90,10 90,30 10,30"/>
+          <TextEquiv><Unicode>warm</Unicode></TextEquiv>
+          <TextStyle fontFamily="Antiqua" fontSize="10"/>
+        </Word>
+        <TextEquiv><Unicode>warm</Unicode></TextEquiv>
+      </TextLine>
+    </TextRegion>
+  </Page>
+</PcGts>
+'''
+
+# profile and parser of a worker process, see init_worker
+_worker_profile = None
+_worker_parser = None
+
+class InvalidXMLError(ValueError):
+    """
+    The request body is not well-formed XML (unlike lxml's XMLSyntaxError, this survives pickling)
+    """
+
+def init_worker(profile):
+    """
+    Initialize a worker process to :py:func:`convert_page_xml` with ``profile``
+    """
+    global _worker_profile, _worker_parser # pylint: disable=global-statement
+    initLogging()
+    _worker_profile = profile
+    # request bodies are untrusted, do not resolve entities or fetch anything
+    _worker_parser = ET.XMLParser(resolve_entities=False, no_network=True)
+    convert_page_xml(WARMUP_PAGE)
+
+def _ping():
+    return True
+
+def convert_page_xml(page_xml):
+    """
+    Convert the PAGE-XML document ``page_xml`` (bytes) in a worker process with the
+    profile of the service.
+
+    Returns a tuple of the ALTO document (bytes) and the converter's ``stats``.
+    """
+    try:
+        page_etree = ET.fromstring(page_xml, _worker_parser)
+    except ET.XMLSyntaxError as err:
+        raise InvalidXMLError(str(err)) from None
+    converter = _worker_profile.convert(page_etree)
+    return converter.to_bytes(), converter.stats
+
+class ServiceMetrics():
+    """
+    Request counters and latencies of a :py:class:`ConversionService`, safe to
+    update from concurrent request threads.
+    """
+
+    def __init__(self, stats=False, window=LATENCY_WINDOW):
+        self._lock = Lock()
+        self.started = time()
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.active = 0
+        # seconds of the latest conversions
+        self.latencies = deque(maxlen=window)
+        self.stats = ConversionStats() if stats else None
+
+    def begin(self):
+        with self._lock:
+            self.active += 1
+
+    def end(self, seconds, failed=False, timeout=False, stats=None):
+        with self._lock:
+            self.active -= 1
+            self.requests += 1
+            self.failures += 1 if failed else 0
+            self.timeouts += 1 if timeout else 0
+            self.latencies.append(seconds)
+            if stats is not None and self.stats is not None:
+                self.stats.add(stats)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def to_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            ret = {
+                'uptime': time() - self.started,
+                'requests': self.requests,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'active': self.active,
+                'latency_ms': {
+                    'window': len(latencies),
+                    'mean': 1000 * sum(latencies) / len(latencies) if latencies else None,
+                    'p50': _percentile_ms(latencies, 0.5),
+                    'p90': _percentile_ms(latencies, 0.9),
+                    'p99': _percentile_ms(latencies, 0.99),
+                    'max': 1000 * latencies[-1] if latencies else None,
+                },
+            }
+            if self.stats is not None:
+                ret['stats'] = self.stats.to_dict()
+        return ret
+
+def _percentile_ms(latencies, quantile):
+    """
+    Nearest-rank ``quantile`` of the sorted ``latencies``, in milliseconds
+    """
+    if not latencies:
+        return None
+    return 1000 * latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+class ConversionService():
+    """
+    Converts PAGE-XML documents to ALTO with a :py:class:`~ocrd_page_to_alto.convert.ConversionProfile`
+    in a pool of worker processes, which have all imports done and caches
+    warmed before the first request.
+
+    Keyword Args:
+        profile (ConversionProfile): Conversion options for all requests
+        workers (int): Number of worker processes (0 for one per CPU)
+        max_requests (int): Number of requests converted or waiting for a worker at the
+            same time, further requests are rejected (0 for twice the number of workers)
+        timeout (float): Seconds after which a conversion is aborted and its worker
+            restarted (0 for no limit)
+    """
+
+    def __init__(self, profile, workers=1, max_requests=0, timeout=0, logger=None):
+        self.profile = profile
+        self.workers = workers or cpu_count()
+        self.max_requests = max_requests or 2 * self.workers
+        self.timeout = timeout or None
+        self.logger = logger if logger else getLogger('page-to-alto.server')
+        self.metrics = ServiceMetrics(stats=profile.stats)
+        self._slots = BoundedSemaphore(self.max_requests)
+        self._pool = None
+
+    def start(self):
+        """
+        Start the worker processes and wait until they are ready
+        """
+        self._pool = ProcessPool(max_workers=self.workers, initializer=init_worker, initargs=(self.profile,))
+        for future in [self._pool.schedule(_ping) for _ in range(self.workers)]:
+            future.result()
+        self.logger.info("Started %d worker processes", self.workers)
+        return self
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.stop()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._pool is not None and self._pool.active
+
+    def health(self):
+        return {
+            'status': 'ok' if self.running else 'unavailable',
+            'workers': self.workers,
+            'max_requests': self.max_requests,
+            'active': self.metrics.active,
+        }
+
+    def convert(self, page_xml):
+        """
+        Convert the PAGE-XML document ``page_xml`` (bytes).
+
+        Returns a tuple of the HTTP status, and the ALTO document or
+        an error message (bytes).
+        """
+        if not self._slots.acquire(blocking=False):
+            self.metrics.reject()
+            return HTTPStatus.SERVICE_UNAVAILABLE, b'Too many concurrent requests\n'
+        try:
+            self.metrics.begin()
+            t0 = perf_counter()
+            status, body, stats = self._convert(page_xml)
+            self.metrics.end(perf_counter() - t0, failed=status != HTTPStatus.OK,
+                             timeout=status == HTTPStatus.GATEWAY_TIMEOUT, stats=stats)
+            return status, body
+        finally:
+            self._slots.release()
+
+    def _convert(self, page_xml):
+        try:
+            alto_xml, stats = self._pool.schedule(convert_page_xml, args=(page_xml,), timeout=self.timeout).result()
+        except InvalidXMLError as err:
+            return HTTPStatus.BAD_REQUEST, ('Invalid XML: %s\n' % err).encode('utf-8'), None
+        except FutureTimeoutError:
+            self.logger.warning("Conversion exceeded %ss, restarting worker", self.timeout)
+            return HTTPStatus.GATEWAY_TIMEOUT, b'Conversion timed out\n', None
+        except ProcessExpired as err:
+            self.logger.error("Worker process died: %s", err)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, b'Worker process died\n', None
+        except Exception as err: # pylint: disable=broad-except
+            return HTTPStatus.UNPROCESSABLE_ENTITY, ('%s: %s\n' % (err.__class__.__name__, err)).encode('utf-8'), None
+        return HTTPStatus.OK, alto_xml, stats
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the :py:class:`ConversionService` in ``self.server.service``
+    """
+
+    server_version = 'page-to-alto'
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # headers and body are written separately, do not let them wait for delayed ACKs (TCP only)
+        self.disable_nagle_algorithm = self.server.address_family != AF_UNIX
+        super().setup()
+
+    def do_GET(self): # pylint: disable=invalid-name
+        if self.path == '/health':
+            health = self.server.service.health()
+            self._respond(HTTPStatus.OK if health['status'] == 'ok' else HTTPStatus.SERVICE_UNAVAILABLE,
+                          dumps(health).encode('utf-8'), 'application/json')
+        elif self.path == '/metrics':
+            self._respond(HTTPStatus.OK, dumps(self.server.service.metrics.to_dict()).encode('utf-8'), 'application/json')
+        else:
+            self._respond(HTTPStatus.NOT_FOUND, b'Not found\n')
+
+    def do_POST(self): # pylint: disable=invalid-name
+        if self.path not in ('/', '/convert'):
+            self._respond(HTTPStatus.NOT_FOUND, b'Not found\n')
+            return
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self._respond(HTTPStatus.LENGTH_REQUIRED, b'Content-Length required\n')
+            return
+        if int(length) > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            self._respond(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b'PAGE-XML too large\n')
+            return
+        status, body = self.server.service.convert(self.rfile.read(int(length)))
+        self._respond(status, body, 'application/xml' if status == HTTPStatus.OK else 'text/plain')
+
+    def _respond(self, status, body, content_type='text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', '%s; charset=utf-8' % content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        self.server.service.logger.debug("%s - %s", self.address_string(), format % args)
+
+class ConversionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, server_address):
+        self.service = service
+        super().__init__(server_address, ConversionRequestHandler)
+
+class ConversionUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service, socket_path):
+        self.service = service
+        super().__init__(socket_path, ConversionRequestHandler)
+
+def make_server(service, host='127.0.0.1', port=8000, socket_path=None):
+    """
+    HTTP server for ``service`` listening on ``host``:``port``, or on the
+    Unix socket ``socket_path`` if given. Use ``port=0`` for any free port.
+    """
+    if socket_path:
+        return ConversionUnixServer(service, socket_path)
+    return ConversionHTTPServer(service, (host, port))
@@ -0,0 +1,52 @@
+"""
+Timings and counters of conversions, see ``stats`` of
+:py:class:`~ocrd_page_to_alto.convert.OcrdPageAltoConverter`.
+"""
+from contextlib import contextmanager
+from json import dumps
+from time import perf_counter
+
+PHASES = ['parse', 'metadata', 'text', 'reading_order', 'styles', 'serialize']
+
+COUNTERS = ['pages', 'regions', 'lines', 'words', 'dummy_lines', 'dummy_words', 'text_styles', 'paragraph_styles', 'layout_tags']
+
+class ConversionStats():
+    """
+    Wall time per phase (in seconds) and element counts of one or, when
+    aggregated with :py:meth:`add`, many conversions.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Add the wall time of the ``with`` block to phase ``name`` (which need
+        not be one of :py:data:`PHASES`, e.g. ``validate`` only when validating).
+        """
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + perf_counter() - t0
+
+    def add(self, other):
+        """
+        Add timings and counters of ``other`` to these.
+        """
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        return self
+
+    def to_dict(self):
+        return {'seconds': dict(self.seconds), 'counts': dict(self.counts)}
+
+    def to_json(self, **kwargs):
+        return dumps(self.to_dict(), **kwargs)
+
+    def __str__(self):
+        return ', '.join(['%s: %.3fs' % kv for kv in self.seconds.items()] + ['%s: %d' % kv for kv in self.counts.items()])
@@ -1,5 +1,48 @@
 from lxml import etree as ET
-from packaging import version
+from ocrd_utils import getLogger
+
+from .versions import alto_features
+
+# https://en.wikipedia.org/wiki/Web_colors
+PAGE_COLOUR_TO_RGB = {
+    'white': 'ffffff',
+    'black': '000000',
+    'red': 'ff0000',
+    'brown': '800000',
+    'cyan': '00ffff',
+    'green': '00ff00',
+    'grey': '999999',
+    'indigo': '4b0082',
+    'magenta': 'ff00ff',
+    'orange': 'ffa500',
+    'pink': 'ff00cb',
+    'turquoise': '40e0d0',
+    'violet': 'ee82ee',
+    'yellow': 'ffff00',
+}
+
+# ALTO @FONTSTYLE -> PAGE TextStyle attribute
+ALTO_FONTSTYLE_TO_PAGE = {
+    'italics': 'italic',
+    'underline': 'underlined',
+    'bold': 'bold',
+    'smallcaps': 'smallCaps',
+    'subscript': 'subscript',
+    'superscript': 'superscript',
+    'strikethrough': 'strikethrough',
+}
+
+# characters kept as they are in style IDs, all others are escaped as _XX (UTF-8 bytes in hex)
+ID_SAFE_CHARACTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.-')
+
+def id_part(val):
+    """
+    Escape ``val`` for use in an ``xs:ID``, reversibly so distinct values give distinct IDs
+    """
+    if all(char in ID_SAFE_CHARACTERS for char in val):
+        return val
+    return ''.join(char if char in ID_SAFE_CHARACTERS else ''.join('_%02X' % byte for byte in char.encode('utf-8'))
+                   for char in val)
 
 class TextStylesManager():
     """
@@ -7,9 +50,18 @@ class TextStylesManager():
     to ALTO TextStyles. The @ID is a concatenation of the values with a prefix.
     """
 
-    def __init__(self, alto_version):
+    def __init__(self, alto_version, strict=False, logger=None):
         self.alto_version = alto_version
-        self._elements = set()
+        self.features = alto_features(alto_version)
+        # whether to leave out TextStyles that would not be valid (without font size before ALTO 4.2)
+        self.strict = strict
+        self.logger = logger if logger else getLogger('page-to-alto')
+        # field values of the TextStyles left out so far, to warn only once
+        self._dropped = set()
+        # tuple of field values -> ID, in order of first use
+        self._elements = {}
+        # id() of PAGE TextStyle -> (TextStyle, ID), the TextStyle is kept so its id() is not reused
+        self._textstyle_ids = {}
         self.prefix = 'textstyle-'
         self.fields = ['font_family', 'font_type', 'font_width', 'font_size', 'font_color', 'font_style']
         self.output_element = 'TextStyle'
@@ -17,22 +69,46 @@ class TextStylesManager():
     def get_id(self, **kwargs):
         if any(k not in self.fields for k in kwargs):
             raise ValueError(f"Unknown fields in {kwargs}")
-        key = self.prefix + '---'.join([str(kwargs.get(x, None)).replace(' ', '%20') for x in self.fields])
-        if key not in self.elements:
-            self._elements.add(key)
-        return key
+        vals = tuple(str(kwargs.get(x, None)) for x in self.fields)
+        style_id = self._elements.get(vals)
+        if style_id is None:
+            style_id = self.prefix + '---'.join([id_part(val) for val in vals])
+            self._elements[vals] = style_id
+        return style_id
+
+    def __len__(self):
+        return len(self._elements)
 
     @property
     def elements(self):
-        ret = {}
-        for key in self._elements:
-            ret[key] = {}
-            vals = key[len(self.prefix):].split('---')
-            for field_idx, field in enumerate(self.fields):
-                ret[key][field] = vals[field_idx].replace('%20', ' ')
-        return ret
+        return {style_id: dict(zip(self.fields, vals)) for vals, style_id in self._elements.items()}
 
     def from_textstyle(self, textstyle):
+        """
+        The ID of the ALTO TextStyle for PAGE TextStyle ``textstyle``, or ``None``
+        with ``strict`` if it has no ``fontSize`` but the ALTO version requires one.
+        """
+        cached = self._textstyle_ids.get(id(textstyle))
+        if cached is None:
+            cached = self._textstyle_ids[id(textstyle)] = (textstyle, self._from_textstyle(textstyle))
+        return cached[1]
+
+    def rollback(self, length):
+        """
+        Drop all but the first ``length`` styles found (see :py:meth:`__len__`),
+        e.g. those of a page that failed to convert.
+        """
+        for vals in list(self._elements)[length:]:
+            del self._elements[vals]
+
+    def forget_textstyles(self):
+        """
+        Drop the PAGE TextStyles remembered by :py:meth:`from_textstyle` (but not the styles
+        found so far), so a manager shared across pages does not keep converted pages alive.
+        """
+        self._textstyle_ids.clear()
+
+    def _from_textstyle(self, textstyle):
         kwargs = {}
         kwargs['font_family'] = textstyle.fontFamily
         kwargs['font_type'] = 'serif' if textstyle.serif else 'sans-serif'
@@ -40,36 +116,19 @@ class TextStylesManager():
         if textstyle.fontSize:
             kwargs['font_size'] = textstyle.fontSize
         if textstyle.textColourRgb:
-            b = textstyle.textColourRgb // 65336
-            g = (textstyle.textColourRgb - (b * 65336)) // 256
-            r = textstyle.textColourRgb - (b * 65336) - (g * 256)
-            kwargs['font_color'] = '%2x%2x%2x' % (r, g, b)
-        if textstyle.textColour:
-            # https://en.wikipedia.org/wiki/Web_colors
-            rgb = 'ffffff' if textstyle.textColour == 'white' else \
-                  '000000' if textstyle.textColour == 'black' else \
-                  'ff0000' if textstyle.textColour == 'red' else \
-                  '800000' if textstyle.textColour == 'brown' else \
-                  '00ffff' if textstyle.fontColour == 'cyan' else \
-                  '00ff00' if textstyle.fontColour == 'green' else \
-                  '999999' if textstyle.fontColour == 'grey' else \
-                  '4b0082' if textstyle.fontColour == 'indigo' else \
-                  'ff00ff' if textstyle.fontColour == 'magenta' else \
-                  'ffa500' if textstyle.fontColour == 'orange' else \
-                  'ff00cb' if textstyle.fontColour == 'pink' else \
-                  '40e0d0' if textstyle.fontColour == 'turquoise' else \
-                  'ee82ee' if textstyle.fontColour == 'violet' else \
-                  'ffff00' if textstyle.fontColour == 'yellow' else \
-                  None
-            if rgb:
-                kwargs['font_color'] = rgb
+            # PAGE: 65536 * b + 256 * g + r
+            b, gr = divmod(textstyle.textColourRgb, 65536)
+            g, r = divmod(gr, 256)
+            kwargs['font_color'] = '%02x%02x%02x' % (r, g, b)
+        if textstyle.textColour in PAGE_COLOUR_TO_RGB:
+            kwargs['font_color'] = PAGE_COLOUR_TO_RGB[textstyle.textColour]
         font_style = []
         if textstyle.italic:
             font_style.append('italics')
         if textstyle.underlined:
             font_style.append('underline')
         possible_atts = ['bold', 'smallCaps', 'subscript', 'superscript']
-        if version.parse(self.alto_version) >= version.parse('4.2'):
+        if self.features.strikethrough:
             possible_atts.append('strikethrough')
         for att in possible_atts:
             if getattr(textstyle, att):
@@ -83,22 +142,56 @@ class TextStylesManager():
         # TODO reverseVideo
         # TODO xHeight
         # TODO letterSpaced
+        if self.strict and not textstyle.fontSize and not self.features.optional_fontsize:
+            vals = tuple(sorted(kwargs.items()))
+            if vals not in self._dropped:
+                self._dropped.add(vals)
+                self.logger.warning("TextStyle %s left out, as ALTO-XML v%s requires a font size",
+                                    ', '.join('%s=%s' % val for val in vals), self.alto_version)
+            return None
         return self.get_id(**kwargs)
 
+    def to_page(self, alto_style):
+        """
+        Attributes of the PAGE TextStyle for the ALTO TextStyle element ``alto_style``,
+        the reverse of :py:meth:`from_textstyle`
+        """
+        ret = {}
+        attrib = alto_style.attrib
+        if attrib.get('FONTFAMILY'):
+            ret['fontFamily'] = attrib['FONTFAMILY']
+        if attrib.get('FONTTYPE') == 'serif':
+            ret['serif'] = 'true'
+        if attrib.get('FONTWIDTH') == 'fixed':
+            ret['monospace'] = 'true'
+        if attrib.get('FONTSIZE'):
+            ret['fontSize'] = attrib['FONTSIZE']
+        font_color = attrib.get('FONTCOLOR')
+        if font_color and len(font_color) == 6:
+            r, g, b = (int(font_color[idx:idx + 2], 16) for idx in (0, 2, 4))
+            ret['textColourRgb'] = str(65536 * b + 256 * g + r)
+        for font_style in attrib.get('FONTSTYLE', '').split():
+            att = ALTO_FONTSTYLE_TO_PAGE.get(font_style)
+            if att:
+                ret[att] = 'true'
+        return ret
+
     def set_alto_styleref_from_textstyle(self, reg_alto, reg_page):
         textstyle = reg_page.get_TextStyle() if hasattr(reg_page, 'get_TextStyle') else None
-        if textstyle:
+        style_id = self.from_textstyle(textstyle) if textstyle else None
+        if style_id:
             refs = reg_alto.get('STYLEREFS').split(' ') if reg_alto.get('STYLEREFS') else []
-            refs.append(self.from_textstyle(textstyle))
+            refs.append(style_id)
             reg_alto.set('STYLEREFS', ' '.join(refs))
 
     def to_xml(self, alto_parent):
-        for style_id, style in self.elements.items():
+        attributes = [k.replace('_', '').upper() for k in self.fields]
+        for vals, style_id in self._elements.items():
             el = ET.SubElement(alto_parent, self.output_element)
             el.set('ID', style_id)
-            for k, v in style.items():
+            for k, v in zip(attributes, vals):
                 if v != 'None':
-                    el.set(k.replace('_', '').upper(), v)
+                    el.set(k, v)
 
 class ParagraphStyleManager(TextStylesManager):
 
@@ -107,7 +200,17 @@ class ParagraphStyleManager(TextStylesManager):
         self.fields = ['align', 'left', 'right', 'line_space', 'first_line']
         self.prefix = 'parastyle-'
         self.output_element = 'ParagraphStyle'
-        self.align_mapping = {'left': 'Left', 'right': 'Right', 'centre': 'center', 'justify': 'Block'}
+        self.align_mapping = {'left': 'Left', 'right': 'Right', 'centre': 'Center', 'justify': 'Block'}
+
+    def to_page(self, alto_style):
+        """
+        Attributes of the PAGE region for the ALTO ParagraphStyle element ``alto_style``
+        """
+        align_alto = (alto_style.get('ALIGN') or '').lower()
+        for align_page, align in self.align_mapping.items():
+            if align.lower() == align_alto:
+                return {'align': align_page}
+        return {}
 
     def set_alto_styleref_from_textstyle(self, reg_alto, reg_page):
         align_page = reg_page.align if hasattr(reg_page, 'align') else None
@@ -124,6 +227,12 @@ class LayoutTagManager(TextStylesManager):
         self.prefix = 'layouttag-'
         self.output_element = 'LayoutTag'
 
+    def to_page(self, alto_tag):
+        """
+        Attributes of the PAGE region for the ALTO LayoutTag element ``alto_tag``
+        """
+        return {'type': alto_tag.get('LABEL')} if alto_tag.get('LABEL') else {}
+
     def set_alto_tag_from_type(self, reg_alto, reg_page):
         typ = reg_page.get_type() if hasattr(reg_page, 'get_type') else None
         if typ:
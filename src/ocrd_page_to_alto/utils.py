@@ -1,60 +1,157 @@
+from functools import lru_cache
+import re
+from warnings import catch_warnings, simplefilter
 from lxml import etree as ET
-from ocrd_utils import xywh_from_points
-import langcodes
+import numpy as np
+from ocrd_utils import getLogger, bbox_from_points
+
+LANG_CACHE_SIZE = 1024
+# well-formed PAGE-XML points, whose number of points is the number of spaces plus one
+POINTS_PATTERN = re.compile(r'-?[0-9]+,-?[0-9]+(?: -?[0-9]+,-?[0-9]+)*')
 
 def setxml(el, name, val):
     el.set(name, str(val))
 
 def set_alto_xywh_from_coords(reg_alto, reg_page, classes=None):
+    set_alto_xywh_from_bbox(reg_alto, bbox_from_points(reg_page.get_Coords().points), classes=classes)
+
+def set_alto_xywh_from_bbox(reg_alto, bbox, classes=None):
+    minx, miny, maxx, maxy = bbox
     if classes is None:
-        classes = ['HEIGHT', 'WIDTH', 'HPOS', 'VPOS']
-    xywh = xywh_from_points(reg_page.get_Coords().points)
-    mapping = {'HEIGHT': 'h', 'WIDTH': 'w', 'HPOS': 'x', 'VPOS': 'y'}
-    for k_alto, k_xywh in mapping.items():
+        reg_alto.set('HEIGHT', str(maxy - miny))
+        reg_alto.set('WIDTH', str(maxx - minx))
+        reg_alto.set('HPOS', str(minx))
+        reg_alto.set('VPOS', str(miny))
+        return
+    xywh = {'HEIGHT': maxy - miny, 'WIDTH': maxx - minx, 'HPOS': minx, 'VPOS': miny}
+    for k_alto in xywh:
         if k_alto in classes:
-            setxml(reg_alto, k_alto, str(xywh[k_xywh]))
+            setxml(reg_alto, k_alto, xywh[k_alto])
 
 def set_alto_shape_from_coords(reg_alto, reg_page):
+    set_alto_shape_from_points(reg_alto, reg_page.get_Coords().points)
+
+def set_alto_shape_from_points(reg_alto, points):
     shape = ET.SubElement(reg_alto, 'Shape')
     polygon = ET.SubElement(shape, 'Polygon')
-    setxml(polygon, 'POINTS', reg_page.get_Coords().points)
+    polygon.set('POINTS', points)
 
 def set_alto_id_from_page_id(reg_alto, reg_page):
     setxml(reg_alto, 'ID', reg_page.id)
 
-def set_alto_lang_from_page_lang(reg_alto, reg_page, attribute_name='LANG'):
+@lru_cache(maxsize=LANG_CACHE_SIZE)
+def page_lang_to_alto(lang_page):
+    """
+    Resolve the PAGE-XML language name ``lang_page`` to an ISO 639-2 code, or
+    ``None`` if it cannot be resolved.
+
+    Results (including failures, which are logged once) are cached per
+    process, use ``page_lang_to_alto.cache_info()`` for hit/miss counts.
+    """
+    # only load the language data once a language actually shows up
+    import langcodes # pylint: disable=import-outside-toplevel
+    try:
+        return langcodes.find(lang_page).to_alpha3()
+    except LookupError as err:
+        getLogger('page-to-alto').warning("Cannot map language '%s' to ISO 639-2, skipping: %s", lang_page, err)
+        return None
+
+@lru_cache(maxsize=LANG_CACHE_SIZE)
+def alto_lang_to_page(lang_alto):
+    """
+    Resolve the ALTO (ISO 639-2) language code ``lang_alto`` to the (English) language
+    name PAGE-XML uses, the reverse of :py:func:`page_lang_to_alto`, or ``None`` if it
+    cannot be resolved (logged once).
+    """
+    import langcodes # pylint: disable=import-outside-toplevel
+    try:
+        language = langcodes.Language.get(lang_alto)
+        if not language.is_valid():
+            raise LookupError("invalid language tag")
+        return language.display_name()
+    except (LookupError, ValueError) as err:
+        getLogger('page-to-alto').warning("Cannot map language '%s' to a PAGE-XML language, skipping: %s", lang_alto, err)
+        return None
+
+def alto_lang_from_page_lang(reg_page):
+    """
+    ISO 639-2 code of the first language attribute of ``reg_page``, or ``None``
+    """
     for prefix in ('primaryL', 'secondaryL', 'l'):
         lang_page = getattr(reg_page, f'{prefix}anguage', None)
         if lang_page:
-            lang_alto = langcodes.find(lang_page).to_alpha3()
-            setxml(reg_alto, attribute_name, lang_alto)
-            return
+            return page_lang_to_alto(lang_page)
+    return None
+
+def set_alto_lang_from_page_lang(reg_alto, reg_page, attribute_name='LANG'):
+    lang_alto = alto_lang_from_page_lang(reg_page)
+    if lang_alto:
+        setxml(reg_alto, attribute_name, lang_alto)
 
 def get_nth_textequiv(reg_page, textequiv_index, textequiv_fallback_strategy):
+    return nth_textequiv(reg_page.get_TextEquiv(), reg_page.id, textequiv_index, textequiv_fallback_strategy)
+
+def nth_textequiv(textequivs, el_id, textequiv_index, textequiv_fallback_strategy):
+    """
+    Text of the TextEquiv with index ``textequiv_index`` among ``textequivs`` of the
+    PAGE element with ID ``el_id``, see :py:func:`get_nth_textequiv`
+    """
     if textequiv_fallback_strategy not in ('raise', 'first', 'last'):
         raise RuntimeError("Invalid value for textequiv_fallback_strategy: %s" % textequiv_fallback_strategy)
-    textequivs = reg_page.get_TextEquiv()
     if not len(textequivs):
         if textequiv_fallback_strategy == 'raise':
-            raise ValueError("PAGE element '%s' has no TextEquivs and fallback strategy is to raise" % reg_page.id)
+            raise ValueError("PAGE element '%s' has no TextEquivs and fallback strategy is to raise" % el_id)
         return ''
     for textequiv in textequivs:
         if textequiv.get_index() == textequiv_index:
             return textequiv.Unicode
     if textequiv_fallback_strategy == 'raise':
         raise ValueError("PAGE element '%s' has no TextEquiv index %d" % (
-            reg_page.id, textequiv_index))
+            el_id, textequiv_index))
     elif textequiv_fallback_strategy == 'first':
         return textequivs[0].Unicode
     else:
         return textequivs[-1].Unicode
 
+def bboxes_from_points(points_list):
+    """
+    Parse many PAGE-XML ``points`` strings at once into a list of bounding boxes
+    (minx, miny, maxx, maxy), like :py:func:`ocrd_utils.bbox_from_points` would.
+
+    Falls back to parsing one by one (and raising accordingly) unless all are well-formed.
+    """
+    if not points_list:
+        return []
+    if not all(map(POINTS_PATTERN.fullmatch, points_list)):
+        return [bbox_from_points(points) for points in points_list]
+    n_points = np.fromiter((points.count(' ') + 1 for points in points_list), dtype=np.int64, count=len(points_list))
+    with catch_warnings():
+        # numpy only warns about unparseable (trailing) data
+        simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(' '.join(points_list).replace(',', ' '), dtype=np.int64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            values = None
+    if values is None or len(values) != 2 * n_points.sum():
+        return [bbox_from_points(points) for points in points_list]
+    xys = values.reshape(-1, 2)
+    offsets = np.zeros(len(points_list), dtype=np.int64)
+    np.cumsum(n_points[:-1], out=offsets[1:])
+    mins = np.minimum.reduceat(xys, offsets, axis=0)
+    maxs = np.maximum.reduceat(xys, offsets, axis=0)
+    return list(map(tuple, np.hstack([mins, maxs]).tolist()))
+
+def bbox_from_alto_xywh(el):
+    """
+    Bounding box (minx, miny, maxx, maxy) of ALTO element ``el`` from its HPOS/VPOS/WIDTH/HEIGHT
+    """
+    minx = int(el.get('HPOS'))
+    miny = int(el.get('VPOS'))
+    return minx, miny, minx + int(el.get('WIDTH')), miny + int(el.get('HEIGHT'))
+
 def contains(el, bbox):
     minx1, miny1, maxx1, maxy1 = bbox
-    minx2 = int(el.get('HPOS'))
-    miny2 = int(el.get('VPOS'))
-    maxx2 = minx2 + int(el.get('WIDTH'))
-    maxy2 = miny2 + int(el.get('HEIGHT'))
+    minx2, miny2, maxx2, maxy2 = bbox_from_alto_xywh(el)
     if minx1 < minx2:
         return False
     if maxx1 > maxx2:
@@ -0,0 +1,57 @@
+from collections import namedtuple
+from functools import lru_cache
+
+XSD_ALTO_URLS = {
+    '4.2': 'http://www.loc.gov/standards/alto/v4/alto-4-2.xsd',
+    '4.1': 'http://www.loc.gov/standards/alto/v4/alto-4-1.xsd',
+    '4.0': 'http://www.loc.gov/standards/alto/v4/alto-4-0.xsd',
+    '3.1': 'http://www.loc.gov/standards/alto/v3/alto-3-1.xsd',
+    '3.0': 'http://www.loc.gov/standards/alto/v3/alto-3-0.xsd',
+    '2.1': 'http://www.loc.gov/standards/alto/alto.xsd',
+    '2.0': 'http://www.loc.gov/standards/alto/v2/alto-2-0.xsd'
+}
+
+AltoFeatures = namedtuple('AltoFeatures', [
+    'schemaversion',
+    'shape',
+    'lang',
+    'tags',
+    'processing',
+    'strikethrough',
+    'printspace_shape',
+    'optional_fontsize',
+])
+AltoFeatures.__doc__ = """
+Which features a version of the ALTO-XML schema supports, resolved once per version.
+
+Attributes:
+    schemaversion (boolean): ``alto/@SCHEMAVERSION`` (ALTO >= 3.0)
+    shape (boolean): ``Shape/Polygon`` on blocks, lines and strings (ALTO >= 3.1)
+    lang (boolean): ``@LANG`` instead of ``@language`` (ALTO >= 2.1)
+    tags (boolean): ``Tags``, ``@TAGREFS`` (ALTO >= 2.1)
+    processing (boolean): ``Processing`` instead of ``OCRProcessing/ocrProcessingStep`` (ALTO >= 4.0)
+    strikethrough (boolean): ``strikethrough`` in ``@FONTSTYLE`` (ALTO >= 4.2)
+    printspace_shape (boolean): ``Shape`` on a ``PrintSpace`` without blocks (ALTO >= 4.0, before a ``Shape`` must be followed by a block)
+    optional_fontsize (boolean): ``TextStyle`` without ``@FONTSIZE`` (ALTO >= 4.2)
+"""
+
+@lru_cache(maxsize=None)
+def alto_features(alto_version):
+    """
+    Resolve the :py:class:`AltoFeatures` of ALTO-XML version ``alto_version``
+    (a key of :py:data:`XSD_ALTO_URLS`, or just the major version for its ``.0``)
+    """
+    version = alto_version if '.' in alto_version else alto_version + '.0'
+    if version not in XSD_ALTO_URLS:
+        raise ValueError("Converting to ALTO-XML v%s is not supported" % alto_version)
+    parsed = tuple(int(part) for part in version.split('.'))
+    return AltoFeatures(
+        schemaversion=parsed >= (3, 0),
+        shape=parsed >= (3, 1),
+        lang=parsed >= (2, 1),
+        tags=parsed >= (2, 1),
+        processing=parsed >= (4, 0),
+        strikethrough=parsed >= (4, 2),
+        printspace_shape=parsed >= (4, 0),
+        optional_fontsize=parsed >= (4, 2),
+    )
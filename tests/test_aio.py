@@ -0,0 +1,68 @@
+import asyncio
+from contextlib import suppress
+
+from pytest import raises
+
+from ocrd_page_to_alto.aio import AsyncConverter, convert_many
+from ocrd_page_to_alto.convert import ConversionProfile
+
+PAGE_FILENAMES = ['tests/data/align.page.xml', 'tests/data/language.page.xml', 'tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml']
+PROFILE = ConversionProfile(page_engine='lxml', check_words=False, stats=True)
+
+async def collect(results):
+    return [result async for result in results]
+
+def test_convert_many(tmp_path):
+    with open(PAGE_FILENAMES[1], 'rb') as f:
+        page_xml = f.read()
+    sources = [PAGE_FILENAMES[0], page_xml, (PAGE_FILENAMES[2], str(tmp_path / 'out' / 'alto.xml')), b'<PcGts']
+    results = asyncio.run(collect(convert_many(sources, PROFILE, workers=2)))
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    results = sorted(results, key=lambda result: result.index)
+    assert results[0].alto.decode('utf-8') == str(PROFILE.convert(PAGE_FILENAMES[0]))
+    assert results[0].stats.counts['pages'] == 1
+    assert results[1].input_filename is None
+    assert results[1].alto.decode('utf-8') == str(PROFILE.convert(PAGE_FILENAMES[1]))
+    assert results[2].alto is None
+    assert (tmp_path / 'out' / 'alto.xml').read_text(encoding='utf-8') == str(PROFILE.convert(PAGE_FILENAMES[2]))
+    assert results[3].error.startswith('InvalidXMLError')
+    assert all(result.error is None for result in results[:3])
+
+def test_convert_many_backpressure():
+    taken = []
+    seen = []
+    async def sources():
+        for index in range(6):
+            taken.append(index)
+            yield PAGE_FILENAMES[index % len(PAGE_FILENAMES)]
+    async def main():
+        async with AsyncConverter(PROFILE, workers=1, max_in_flight=2) as converter:
+            async for result in converter.convert_many(sources()):
+                # never more than max_in_flight taken but not yet yielded
+                assert len(taken) - len(seen) <= 2
+                seen.append(result.index)
+    asyncio.run(main())
+    assert sorted(seen) == list(range(6))
+
+def test_convert_many_cancel():
+    async def main():
+        async with AsyncConverter(PROFILE, workers=1, max_in_flight=3) as converter:
+            results = converter.convert_many(PAGE_FILENAMES * 10)
+            first = await results.__anext__()
+            await results.aclose()
+            # the pool is still usable
+            result = await converter.convert(PAGE_FILENAMES[0])
+            task = asyncio.ensure_future(collect(converter.convert_many(PAGE_FILENAMES * 10)))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            return first, result, task
+    first, result, task = asyncio.run(main())
+    assert first.error is None
+    assert result.error is None
+    assert task.cancelled()
+
+def test_not_started():
+    with raises(RuntimeError):
+        asyncio.run(AsyncConverter(PROFILE).convert(PAGE_FILENAMES[0]))
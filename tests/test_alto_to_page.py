@@ -0,0 +1,108 @@
+from io import BytesIO
+from glob import glob
+from os.path import basename
+
+from click.testing import CliRunner
+from lxml import etree as ET
+from pytest import main, mark, raises
+
+from ocrd_models.ocrd_page import parseString
+
+from ocrd_page_to_alto.alto_to_page import AltoPageConverter
+from ocrd_page_to_alto.batch import convert_alto_file, convert_batch
+from ocrd_page_to_alto.cli import alto_to_page as cli_alto_to_page
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter, REGION_ALTO_TO_PAGE, REGION_PAGE_TO_ALTO
+
+PAGES = sorted(glob('tests/data/*.xml'))
+
+def page_to_alto(page_filename=None, page_etree=None, alto_version='4.2'):
+    return OcrdPageAltoConverter(page_filename=page_filename, page_etree=page_etree, alto_version=alto_version,
+                                 check_words=False, region_order='reading-order', page_engine='lxml').convert().to_etree()
+
+@mark.parametrize('alto_version', ['4.2', '2.0'])
+@mark.parametrize('page_filename', PAGES, ids=basename)
+def test_roundtrip(page_filename, alto_version):
+    # PAGE -> ALTO -> PAGE -> ALTO gives the same ALTO again
+    alto = page_to_alto(page_filename, alto_version=alto_version)
+    page = AltoPageConverter(alto_etree=alto).convert().to_etree()
+    alto2 = page_to_alto(page_etree=page, alto_version=alto_version)
+    for el in [alto, alto2]:
+        # written anew by each conversion
+        for processing in el.iter('{*}Processing', '{*}OCRProcessing'):
+            processing.getparent().remove(processing)
+        for step in el.iter('{*}processingDateTime'):
+            step.text = None
+    assert ET.tostring(alto2) == ET.tostring(alto)
+
+def test_roundtrip_text():
+    page = AltoPageConverter(alto_etree=page_to_alto('tests/data/sp-hyp.page.xml')).convert().to_etree()
+    orig = ET.parse('tests/data/sp-hyp.page.xml').getroot()
+    def texts(el, tag):
+        return [x.findtext('{*}TextEquiv/{*}Unicode') for x in el.iter('{*}%s' % tag)]
+    assert texts(page, 'Word') == texts(orig, 'Word')
+    # concatenated from the Words
+    assert texts(page, 'TextLine') == [' '.join(texts(line, 'Word')) for line in orig.iter('{*}TextLine')]
+
+@mark.parametrize('page_filename', ['tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml', 'tests/data/textstyle.page.xml'], ids=basename)
+def test_valid_page(page_filename):
+    page = AltoPageConverter(alto_etree=page_to_alto(page_filename)).convert()
+    pcgts = parseString(str(page).encode('utf-8'), silence=True)
+    assert pcgts.get_Page().get_AllRegions()
+
+def test_stream():
+    alto = page_to_alto('tests/data/margins.page.xml')
+    output = BytesIO()
+    AltoPageConverter(alto_etree=alto).stream(output)
+    assert output.getvalue().decode('utf-8') == str(AltoPageConverter(alto_etree=alto).convert())
+
+def test_etree_unchanged():
+    alto = page_to_alto('tests/data/OCR-D-OCR-TESS_00001.xml')
+    before = ET.tostring(alto)
+    AltoPageConverter(alto_etree=alto).convert()
+    assert ET.tostring(alto) == before
+
+def test_measurement_unit(tmp_path):
+    alto = page_to_alto('tests/data/align.page.xml')
+    alto.find('{*}Description/{*}MeasurementUnit').text = 'inch1200'
+    alto_filename = str(tmp_path / 'alto.xml')
+    ET.ElementTree(alto).write(alto_filename)
+    with raises(ValueError, match='dpi'):
+        AltoPageConverter(alto_filename=alto_filename).convert()
+    page = AltoPageConverter(alto_filename=alto_filename, dpi=600).convert().to_etree()
+    page_page = page.find('{*}Page')
+    assert int(page_page.get('imageWidth')) == round(int(alto.find('{*}Layout/{*}Page').get('WIDTH')) / 2)
+
+def test_multipage():
+    alto = page_to_alto('tests/data/align.page.xml')
+    layout = alto.find('{*}Layout')
+    layout.append(ET.fromstring(ET.tostring(layout[0])))
+    with raises(ValueError, match='more than one Page'):
+        AltoPageConverter(alto_etree=alto).convert()
+
+def test_region_mapping():
+    for alto_type, page_type in REGION_ALTO_TO_PAGE.items():
+        if alto_type != 'ComposedBlock':
+            assert REGION_PAGE_TO_ALTO[page_type] == alto_type
+
+def test_cli_batch(tmp_path):
+    alto_dir = tmp_path / 'alto'
+    alto_dir.mkdir()
+    for name in ['align', 'language']:
+        ET.ElementTree(page_to_alto('tests/data/%s.page.xml' % name)).write(str(alto_dir / ('%s.xml' % name)))
+    (alto_dir / 'broken.xml').write_text('<alto')
+    result = CliRunner().invoke(cli_alto_to_page, ['-D', str(tmp_path / 'page'), '-j', '2', str(alto_dir)])
+    assert result.exit_code == 1
+    assert 'Converted 2 of 3 pages' in result.output
+    assert ET.parse(str(tmp_path / 'page' / 'align.page.xml')).getroot().find('{*}Page') is not None
+
+def test_convert_batch_streaming(tmp_path):
+    alto_filename = str(tmp_path / 'alto.xml')
+    ET.ElementTree(page_to_alto('tests/data/align.page.xml')).write(alto_filename)
+    jobs = [(alto_filename, str(tmp_path / 'streamed.xml'))]
+    result, = convert_batch(jobs, {}, streaming=True, convert_fn=convert_alto_file)
+    assert result.error is None
+    with open(str(tmp_path / 'streamed.xml'), encoding='utf-8') as f:
+        assert f.read() == str(AltoPageConverter(alto_filename=alto_filename).convert())
+
+if __name__ == "__main__":
+    main([__file__])
@@ -0,0 +1,100 @@
+import json
+from pytest import main, mark, raises
+from click.testing import CliRunner
+from lxml import etree as ET
+
+from ocrd_page_to_alto.batch import convert_batch, expand_inputs, output_filename_for
+from ocrd_page_to_alto.cli import main as cli_main
+
+def test_expand_inputs():
+    inputs = expand_inputs(['tests/data', 'tests/data/*.page.xml', 'tests/data/align.page.xml'])
+    assert 'tests/data/align.page.xml' in inputs
+    assert len(inputs) == len(set(inputs))
+    assert all(x.endswith('.xml') for x in inputs)
+
+def test_output_filename_for():
+    assert output_filename_for('tests/data/align.page.xml', 'out') == 'out/align.page.alto.xml'
+    assert output_filename_for('tests/data/align.page.xml', output_template='{dir}/{stem}.alto') == 'tests/data/align.page.alto'
+
+def test_convert_batch(tmp_path):
+    jobs = [
+        ('tests/data/align.page.xml', str(tmp_path / 'align.xml')),
+        ('tests/data/content-no-words.page.xml', str(tmp_path / 'fail.xml')),
+    ]
+    results = {r.input_filename: r for r in convert_batch(jobs, processes=2)}
+    assert results['tests/data/align.page.xml'].error is None
+    assert ET.parse(str(tmp_path / 'align.xml')).getroot().get('SCHEMAVERSION') == '4.2'
+    assert 'has TextEquiv but not words' in results['tests/data/content-no-words.page.xml'].error
+
+@mark.parametrize('streaming', [False, True])
+def test_convert_batch_failure_keeps_output(tmp_path, streaming):
+    # NoiseRegions cannot be converted, which is only found while converting the regions
+    tree = ET.parse('tests/data/align.page.xml')
+    page = tree.getroot().find('{*}Page')
+    noise = ET.SubElement(page, '{%s}NoiseRegion' % ET.QName(page).namespace, id='noise1')
+    ET.SubElement(noise, '{%s}Coords' % ET.QName(page).namespace, points='1,1 2,1 2,2 1,2')
+    tree.write(str(tmp_path / 'noise.page.xml'))
+    (tmp_path / 'out.xml').write_text('PREVIOUS GOOD OUTPUT')
+    result, = convert_batch([(str(tmp_path / 'noise.page.xml'), str(tmp_path / 'out.xml'))], {}, streaming=streaming)
+    assert 'Cannot handle PAGE-XML NoiseRegion' in result.error
+    assert (tmp_path / 'out.xml').read_text() == 'PREVIOUS GOOD OUTPUT'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['noise.page.xml', 'out.xml']
+
+def test_cli_batch(tmp_path):
+    result = CliRunner().invoke(cli_main, ['-D', str(tmp_path), 'tests/data/align.page.xml', 'tests/data/content-no-words.page.xml'])
+    assert result.exit_code == 1
+    assert (tmp_path / 'align.page.alto.xml').exists()
+    assert 'Converted 1 of 2 pages' in result.output
+
+def test_output_collision(tmp_path):
+    (tmp_path / 'other').mkdir()
+    (tmp_path / 'other' / 'align.page.xml').write_bytes(open('tests/data/align.page.xml', 'rb').read())
+    inputs = ['tests/data/align.page.xml', str(tmp_path / 'other' / 'align.page.xml')]
+    jobs = [(input_filename, output_filename_for(input_filename, str(tmp_path / 'out'))) for input_filename in inputs]
+    with raises(ValueError, match='would both be written to'):
+        list(convert_batch(jobs))
+    result = CliRunner().invoke(cli_main, ['-D', str(tmp_path / 'out'), *inputs])
+    assert result.exit_code == 2
+    assert 'would both be written to' in result.output
+    # nothing converted
+    assert not (tmp_path / 'out').exists()
+    result = CliRunner().invoke(cli_main, ['-D', str(tmp_path / 'out'), '--output-template', '{dir}/{stem}.alto.xml', *inputs])
+    assert result.exit_code == 0
+    assert 'Converted 2 of 2 pages' in result.output
+
+def test_cli_batch_stats(tmp_path):
+    result = CliRunner().invoke(cli_main, ['--stats', '-D', str(tmp_path), 'tests/data/align.page.xml', 'tests/data/sp-hyp.page.xml'])
+    assert result.exit_code == 0
+    stats = json.loads(result.output.strip().split('\n')[-1])
+    assert stats['counts']['pages'] == 2
+    assert set(stats['seconds']) == {'parse', 'metadata', 'text', 'reading_order', 'styles', 'serialize'}
+
+def test_cli_validate(tmp_path):
+    result = CliRunner().invoke(cli_main, ['--validate', '-D', str(tmp_path), '-j', '2', 'tests/data/align.page.xml', 'tests/data/duplicate-ids.page.xml'])
+    assert result.exit_code == 1
+    assert 'INVALID tests/data/duplicate-ids.page.xml: 1 schema violations' in result.output
+    assert '1 of 2 validated pages invalid' in result.output
+    # written anyway
+    assert (tmp_path / 'duplicate-ids.page.alto.xml').exists()
+    result = CliRunner().invoke(cli_main, ['--validate', '-O', str(tmp_path / 'align.xml'), 'tests/data/align.page.xml'])
+    assert result.exit_code == 0
+    result = CliRunner().invoke(cli_main, ['--validate', '--streaming', 'tests/data/align.page.xml'])
+    assert result.exit_code == 2
+    result = CliRunner().invoke(cli_main, ['--validate', '--alto-version', '2.0', 'tests/data/align.page.xml'])
+    assert result.exit_code == 2
+
+def test_cli_serialization_options(tmp_path):
+    result = CliRunner().invoke(cli_main, ['--no-pretty-print', '--shape-levels', 'region', '-D', str(tmp_path),
+                                           '--streaming', 'tests/data/align.page.xml', 'tests/data/sp-hyp.page.xml'])
+    assert result.exit_code == 0
+    for filename in ['align.page.alto.xml', 'sp-hyp.page.alto.xml']:
+        data = (tmp_path / filename).read_bytes()
+        assert b'\n ' not in data
+        tree = ET.fromstring(data)
+        assert not tree.xpath('//*[local-name()="TextLine" or local-name()="String"]/*[local-name()="Shape"]')
+    result = CliRunner().invoke(cli_main, ['--shape-levels', 'region,glyph', 'tests/data/align.page.xml'])
+    assert result.exit_code == 2
+    assert 'glyph' in result.output
+
+if __name__ == "__main__":
+    main([__file__])
@@ -0,0 +1,100 @@
+from os import utime
+from pytest import main
+from click.testing import CliRunner
+
+from ocrd_page_to_alto.batch import convert_batch
+from ocrd_page_to_alto.cache import ConversionCache
+from ocrd_page_to_alto.cli import main as cli_main
+
+PAGES = ['tests/data/align.page.xml', 'tests/data/sp-hyp.page.xml']
+INVALID_PAGES = ['tests/data/align.page.xml', 'tests/data/duplicate-ids.page.xml']
+
+def test_cache_key(tmp_path):
+    cache = ConversionCache(str(tmp_path), {'alto_version': '4.2', 'stats': False})
+    key = cache.key(b'<PcGts/>')
+    assert key != cache.key(b'<PcGts />')
+    assert key == ConversionCache(str(tmp_path), {'alto_version': '4.2', 'stats': True}).key(b'<PcGts/>')
+    assert key != ConversionCache(str(tmp_path), {'alto_version': '4.1', 'stats': False}).key(b'<PcGts/>')
+    # options that do not change the ALTO
+    assert key == ConversionCache(str(tmp_path), {'alto_version': '4.2', 'stats': False, 'validate': True,
+                                                  'page_engine': 'lxml'}).key(b'<PcGts/>')
+    assert cache.key_for_file(str(tmp_path / 'missing.xml')) is None
+
+def test_cache_lru(tmp_path):
+    for name in ('a', 'b', 'c'):
+        (tmp_path / name).write_bytes(name.encode('utf-8') * 100)
+    cache = ConversionCache(str(tmp_path / 'cache'), {}, max_size=250)
+    cache.put('aaaa', str(tmp_path / 'a'))
+    cache.put('bbbb', str(tmp_path / 'b'))
+    assert not cache.copy_to('cccc', str(tmp_path / 'out'))
+    assert cache.copy_to('aaaa', str(tmp_path / 'out' / 'a'))
+    assert (tmp_path / 'out' / 'a').read_bytes() == b'a' * 100
+    # b is least recently used now
+    cache.put('cccc', str(tmp_path / 'c'))
+    assert cache.to_dict() == {'hits': 1, 'misses': 1, 'evictions': 1, 'files': 2, 'bytes': 200}
+    assert not cache.copy_to('bbbb', str(tmp_path / 'out' / 'b'))
+    # recency is kept in the modification times
+    utime(cache.path('aaaa'), (0, 0))
+    cache = ConversionCache(str(tmp_path / 'cache'), {}, max_size=250)
+    cache.put('bbbb', str(tmp_path / 'b'))
+    assert len(cache) == 2
+    assert not cache.copy_to('aaaa', str(tmp_path / 'out' / 'a'))
+
+def test_convert_batch_cache(tmp_path):
+    options = {'check_words': False}
+    cache = ConversionCache(str(tmp_path / 'cache'), options)
+    jobs = [(page, str(tmp_path / 'first' / str(idx))) for idx, page in enumerate(PAGES)]
+    assert all(result.error is None for result in convert_batch(jobs, options, cache=cache))
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 2)
+    jobs = [(page, str(tmp_path / 'second' / str(idx))) for idx, page in enumerate(PAGES)]
+    assert all(result.error is None for result in convert_batch(jobs, options, processes=2, cache=cache))
+    assert (cache.hits, cache.misses, len(cache)) == (2, 2, 2)
+    for idx in range(len(PAGES)):
+        assert (tmp_path / 'first' / str(idx)).read_bytes() == (tmp_path / 'second' / str(idx)).read_bytes()
+
+def test_convert_batch_cache_validate(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'), {'check_words': False})
+    jobs = [(page, str(tmp_path / 'first' / str(idx))) for idx, page in enumerate(INVALID_PAGES)]
+    assert all(result.validation is None for result in convert_batch(jobs, {'check_words': False}, cache=cache))
+    # cached without validating, so validated when copied
+    options = {'check_words': False, 'validate': True, 'page_engine': 'lxml'}
+    cache = ConversionCache(str(tmp_path / 'cache'), options)
+    jobs = [(page, str(tmp_path / 'second' / str(idx))) for idx, page in enumerate(INVALID_PAGES)]
+    results = list(convert_batch(jobs, options, cache=cache))
+    assert (cache.hits, cache.misses) == (2, 0)
+    assert [bool(result.validation) for result in results] == [False, True]
+
+def test_convert_batch_cache_failures(tmp_path, monkeypatch):
+    options = {'check_words': False, 'validate': True}
+    cache = ConversionCache(str(tmp_path / 'cache'), options)
+    jobs = [(page, str(tmp_path / 'first' / str(idx))) for idx, page in enumerate(PAGES)]
+    assert all(result.error is None for result in convert_batch(jobs, options, cache=cache))
+    # corrupt cached file: converted instead
+    with open(cache.path(cache.key_for_file(PAGES[0])), 'wb') as cached:
+        cached.write(b'<alto')
+    jobs = [(page, str(tmp_path / 'second' / str(idx))) for idx, page in enumerate(PAGES)]
+    results = list(convert_batch(jobs, options, cache=cache))
+    assert [(result.error, result.validation) for result in results] == [(None, [])] * 2
+    assert (tmp_path / 'second' / '0').read_bytes() == (tmp_path / 'first' / '0').read_bytes()
+    # cache not writable: converted, but failed
+    def put(key, alto_filename):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(cache, 'put', put)
+    jobs = [('tests/data/language.page.xml', str(tmp_path / 'third'))]
+    result, = convert_batch(jobs, options, cache=cache)
+    assert result.error == 'Cannot add to the cache: PermissionError: read-only'
+    assert (tmp_path / 'third').exists()
+
+def test_cli_cache(tmp_path):
+    args = ['--no-check-words', '--cache-dir', str(tmp_path / 'cache'), '-D', str(tmp_path / 'out'), *PAGES]
+    result = CliRunner().invoke(cli_main, args)
+    assert result.exit_code == 0
+    assert 'Cache: 0 hits, 2 misses' in result.output
+    result = CliRunner().invoke(cli_main, args)
+    assert result.exit_code == 0
+    assert 'Cache: 2 hits, 0 misses' in result.output
+    result = CliRunner().invoke(cli_main, ['--alto-version', '4.1', *args])
+    assert 'Cache: 0 hits, 2 misses' in result.output
+
+if __name__ == "__main__":
+    main([__file__])
@@ -1,8 +1,14 @@
-from pytest import raises, main, fixture
+from pytest import raises, main, fixture, mark
 from lxml import etree as ET
 from datetime import datetime
+from copy import deepcopy
+from glob import glob
+from io import BytesIO
+from pickle import dumps, loads
 
-from ocrd_page_to_alto.convert import OcrdPageAltoConverter, NAMESPACES as _NAMESPACES
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter, ConversionProfile, conversion_profile, page_model, NAMESPACES as _NAMESPACES
+from ocrd_page_to_alto import page_lxml
+from ocrd_models.constants import NAMESPACES as OCRD_NAMESPACES
 from ocrd_utils import initLogging
 
 NAMESPACES = {**_NAMESPACES, 'alto': _NAMESPACES['alto'] % '4'}
@@ -72,6 +78,30 @@ def test_dummy():
     assert len(tree.xpath('//alto:String[@ID="r0-dummy-TextLine-dummy-Word"]', namespaces=NAMESPACES)) == 1
     assert tree.xpath('//alto:String[@ID="r0-dummy-TextLine-dummy-Word"]', namespaces=NAMESPACES)[0].get('CONTENT') == 'CONTENT BUT NO LINES'
 
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_dummy_input_unchanged(page_engine):
+    for page_filename in ('tests/data/region_no_line.page.xml', 'tests/data/content-no-words.page.xml'):
+        pcgts = page_model(page_engine).parse(page_filename)
+        outputs = [str(OcrdPageAltoConverter(pcgts=pcgts, check_words=False).convert()) for _ in range(2)]
+        assert outputs[0] == outputs[1] == str(OcrdPageAltoConverter(page_filename=page_filename, check_words=False).convert())
+        assert 'dummy' in outputs[0]
+        for reg_page in pcgts.get_Page().get_AllRegions(classes=['Text']):
+            assert not any(line_page.id.endswith('dummy-TextLine') for line_page in reg_page.get_TextLine())
+            assert not any(word_page.id.endswith('dummy-Word') for line_page in reg_page.get_TextLine() for word_page in line_page.get_Word())
+        if page_filename.startswith('tests/data/region'):
+            assert not pcgts.get_Page().get_AllRegions(classes=['Text'])[0].get_TextLine()
+
+def test_malformed_points_not_converted():
+    tree = ET.parse('tests/data/align.page.xml')
+    namespace = ET.QName(tree.getroot()).namespace
+    region = tree.getroot().find('.//{*}TextRegion')
+    # an empty line, skipped with skip_empty_lines, so its points are never used
+    line = ET.Element('{%s}TextLine' % namespace, id='empty')
+    ET.SubElement(line, '{%s}Coords' % namespace, points='1 2,3 4')
+    region.find('{*}TextLine').addprevious(line)
+    expected = str(OcrdPageAltoConverter(page_filename='tests/data/align.page.xml', check_words=False, skip_empty_lines=True).convert())
+    assert str(OcrdPageAltoConverter(page_etree=tree, check_words=False, skip_empty_lines=True).convert()) == expected
+
 def test_pageclass():
     c = OcrdPageAltoConverter(page_filename='tests/data/blank.page.xml').convert()
     tree = ET.fromstring(str(c).encode('utf-8'))
@@ -148,6 +178,308 @@ def test_no_duplicate_table_regions():
     assert len(tree.xpath('//alto:String[@WIDTH="63"][@HPOS="860"][@VPOS="1049"][@CONTENT="auch"]', namespaces=NAMESPACES)) == 1
 
 
+def nested_table(depth, cell_id='cell'):
+    """
+    PAGE-XML tree with a TableRegion whose TextRegions are nested ``depth`` levels deep,
+    each level a cell with a TextLine and a cell with the next level
+    """
+    ns = 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
+    def sub(parent, tag, **attrib):
+        return ET.SubElement(parent, '{%s}%s' % (ns, tag), attrib)
+    pcgts = ET.Element('{%s}PcGts' % ns, nsmap={None: ns}, pcGtsId='nested')
+    metadata = sub(pcgts, 'Metadata')
+    sub(metadata, 'Creator').text = 'test'
+    sub(metadata, 'Created').text = '2020-01-01T00:00:00'
+    sub(metadata, 'LastChange').text = '2020-01-01T00:00:00'
+    height = 20 * depth + 200
+    page = sub(pcgts, 'Page', imageFilename='nested.png', imageWidth='1000', imageHeight=str(height))
+    sub(sub(page, 'PrintSpace'), 'Coords', points='0,0 1000,0 1000,%d 0,%d' % (height, height))
+    sub(page, 'TextStyle', fontFamily='Times')
+    parent = sub(page, 'TableRegion', id='table')
+    for level in range(depth):
+        y0 = 100 + 20 * level
+        sub(parent, 'Coords', points='%d,%d 900,%d 900,%d %d,%d' % (level, y0, y0, height - 100, level, height - 100))
+        cell = sub(parent, 'TextRegion', id=cell_id, align='left')
+        sub(cell, 'Coords', points='%d,%d 500,%d 500,%d %d,%d' % (level, y0, y0, y0 + 10, level, y0 + 10))
+        sub(cell, 'TextStyle', fontFamily='Times', bold='true')
+        line = sub(cell, 'TextLine', id='line_%d' % level)
+        sub(line, 'Coords', points='%d,%d 500,%d 500,%d %d,%d' % (level, y0, y0, y0 + 10, level, y0 + 10))
+        word = sub(line, 'Word', id='word_%d' % level)
+        sub(word, 'Coords', points='%d,%d 500,%d 500,%d %d,%d' % (level, y0, y0, y0 + 10, level, y0 + 10))
+        sub(sub(word, 'TextEquiv'), 'Unicode').text = 'w%d' % level
+        sub(sub(line, 'TextEquiv'), 'Unicode').text = 'w%d' % level
+        parent = sub(parent, 'TextRegion', id='nested_%d' % level)
+    sub(parent, 'Coords', points='900,%d 950,%d 950,%d 900,%d' % (height - 90, height - 90, height - 80, height - 80))
+    return ET.ElementTree(pcgts)
+
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_nested_table(page_engine):
+    c = OcrdPageAltoConverter(page_etree=nested_table(5), page_engine=page_engine, stats=True).convert()
+    tree = ET.fromstring(str(c).encode('utf-8'))
+    ids = [el.get('ID') for el in tree.iter() if el.get('ID')]
+    assert len(ids) == len(set(ids))
+    # duplicate PAGE IDs of the cells are made unique
+    assert [el.get('ID') for el in tree.xpath('//alto:TextBlock[starts-with(@ID, "cell")]', namespaces=NAMESPACES)] == \
+        ['cell', 'cell_2', 'cell_3', 'cell_4', 'cell_5']
+    assert tree.xpath('//alto:String/@CONTENT', namespaces=NAMESPACES) == ['w0', 'w1', 'w2', 'w3', 'w4']
+    for block in tree.xpath('//alto:ComposedBlock|//alto:TextBlock', namespaces=NAMESPACES):
+        assert all(block.get(attr) for attr in ('HPOS', 'VPOS', 'WIDTH', 'HEIGHT'))
+        assert block.find('alto:Shape/alto:Polygon', NAMESPACES) is not None
+    cell = tree.xpath('//alto:TextBlock[@ID="cell_3"]', namespaces=NAMESPACES)[0]
+    assert (cell.get('HPOS'), cell.get('VPOS'), cell.get('WIDTH')) == ('2', '140', '498')
+    assert len(cell.get('STYLEREFS').split(' ')) == 2
+    # the innermost region is nested 5 levels deep
+    assert len(tree.xpath('//alto:TextBlock[@ID="nested_4"]/ancestor::alto:ComposedBlock', namespaces=NAMESPACES)) == 5
+    assert c.stats.counts['regions'] == 11
+
+def test_nested_table_deep():
+    # deeper than the recursion limit
+    c = OcrdPageAltoConverter(page_etree=nested_table(1500), page_engine='lxml', check_words=False).convert()
+    tree = ET.fromstring(str(c).encode('utf-8'), ET.XMLParser(huge_tree=True))
+    assert len(tree.xpath('//alto:String', namespaces=NAMESPACES)) == 1500
+
+def test_nested_table_stream():
+    kwargs = dict(page_etree=nested_table(20), page_engine='lxml', region_order='reading-order')
+    output = BytesIO()
+    OcrdPageAltoConverter(**kwargs).stream(output)
+    assert output.getvalue().decode('utf-8') == str(OcrdPageAltoConverter(**kwargs).convert())
+
+def test_nested_table_engines():
+    assert str(OcrdPageAltoConverter(page_etree=nested_table(20), page_engine='lxml').convert()) == \
+        str(OcrdPageAltoConverter(page_etree=nested_table(20), page_engine='generateds').convert())
+
+@mark.parametrize('page_filename', sorted(glob('tests/data/*.xml')))
+@mark.parametrize('region_order', ['document', 'reading-order', 'reading-order-only'])
+def test_page_engine_lxml(page_filename, region_order):
+    def convert(page_engine):
+        return str(OcrdPageAltoConverter(page_filename=page_filename, check_words=False,
+                                         region_order=region_order, page_engine=page_engine).convert())
+    assert convert('lxml') == convert('generateds')
+
+@mark.parametrize('page_filename', sorted(glob('tests/data/*.xml')))
+@mark.parametrize('region_order', ['document', 'reading-order', 'reading-order-only'])
+def test_page_engine_iterparse(page_filename, region_order):
+    kwargs = dict(page_filename=page_filename, check_words=False, region_order=region_order)
+    expected = str(OcrdPageAltoConverter(page_engine='lxml', **kwargs).convert())
+    assert str(OcrdPageAltoConverter(page_engine='iterparse', **kwargs).convert()) == expected
+    output = BytesIO()
+    OcrdPageAltoConverter(page_engine='iterparse', **kwargs).stream(output)
+    assert output.getvalue().decode('utf-8') == expected
+
+@mark.parametrize('region_order', ['document', 'reading-order', 'reading-order-only'])
+def test_page_engine_iterparse_order(tmp_path, region_order):
+    # regions of different types interleaved, which get_AllRegions groups by type
+    page_etree = nested_table(3)
+    page = page_etree.getroot()[1]
+    ns = page.nsmap[None]
+    table = page.find('{%s}TableRegion' % ns)
+    for idx, (tag, reg_id) in enumerate([('ImageRegion', 'image'), ('TextRegion', 'text_1'), ('SeparatorRegion', 'separator')]):
+        region = ET.Element('{%s}%s' % (ns, tag), id=reg_id)
+        ET.SubElement(region, '{%s}Coords' % ns, points='%d,10 %d,10 %d,20 %d,20' % (idx, idx + 10, idx + 10, idx))
+        table.addprevious(region)
+    ET.SubElement(ET.SubElement(page, '{%s}TextRegion' % ns, id='text_2'), '{%s}Coords' % ns, points='0,30 10,30 10,40 0,40')
+    group = ET.SubElement(ET.Element('{%s}ReadingOrder' % ns), '{%s}OrderedGroup' % ns, id='ro')
+    for idx, reg_id in enumerate(['text_2', 'cell', 'table', 'image', 'text_2']):
+        ET.SubElement(group, '{%s}RegionRefIndexed' % ns, index=str(idx), regionRef=reg_id)
+    page.find('{%s}PrintSpace' % ns).addnext(group.getparent())
+    page_filename = str(tmp_path / 'page.xml')
+    page_etree.write(page_filename)
+    kwargs = dict(page_filename=page_filename, region_order=region_order, stats=True)
+    expected = str(OcrdPageAltoConverter(page_engine='lxml', **kwargs).convert())
+    c = OcrdPageAltoConverter(page_engine='iterparse', **kwargs).convert()
+    assert str(c) == expected
+    assert c.stats.seconds['parse'] > 0
+    output = BytesIO()
+    OcrdPageAltoConverter(page_engine='iterparse', **kwargs).stream(output)
+    assert output.getvalue().decode('utf-8') == expected
+
+def test_page_engine_iterparse_deep(tmp_path):
+    page_filename = str(tmp_path / 'page.xml')
+    nested_table(1500).write(page_filename)
+    output = BytesIO()
+    OcrdPageAltoConverter(page_filename=page_filename, page_engine='iterparse', check_words=False).stream(output)
+    tree = ET.fromstring(output.getvalue(), ET.XMLParser(huge_tree=True))
+    assert len(tree.xpath('//alto:String', namespaces=NAMESPACES)) == 1500
+
+def test_page_engine_iterparse_check_words():
+    with raises(ValueError, match='Line the-bad-one has TextEquiv but not words'):
+        OcrdPageAltoConverter(page_filename='tests/data/content-no-words.page.xml', page_engine='iterparse')
+
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_page_etree(page_engine):
+    # contains comments, which generateDS cannot build from
+    page_etree = ET.parse('tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml')
+    serialized = ET.tostring(page_etree)
+    assert str(OcrdPageAltoConverter(page_etree=page_etree, page_engine=page_engine).convert()) == \
+        str(OcrdPageAltoConverter(page_filename='tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml').convert())
+    assert ET.tostring(page_etree) == serialized
+
+def test_check_border():
+    with raises(ValueError, match='neither Border nor PrintSpace'):
+        OcrdPageAltoConverter(check_border=True, page_filename='tests/data/region_no_line.page.xml')
+    OcrdPageAltoConverter(check_border=True, page_filename='tests/data/align.page.xml')
+
+def test_page_engine_lxml_etree():
+    page_etree = ET.parse('tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml').getroot()
+    assert str(OcrdPageAltoConverter(page_etree=page_etree, page_engine='lxml').convert()) == \
+        str(OcrdPageAltoConverter(page_filename='tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml').convert())
+
+@mark.parametrize('page_filename', sorted(glob('tests/data/*.xml')))
+@mark.parametrize('alto_version', ['4.2', '2.0'])
+def test_stream(page_filename, alto_version):
+    kwargs = dict(page_filename=page_filename, check_words=False, region_order='reading-order', alto_version=alto_version)
+    output = BytesIO()
+    OcrdPageAltoConverter(**kwargs).stream(output)
+    assert output.getvalue().decode('utf-8') == str(OcrdPageAltoConverter(**kwargs).convert())
+
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_reading_order_idnext(page_engine, caplog):
+    page_etree = ET.parse('tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml')
+    c = OcrdPageAltoConverter(page_etree=page_etree, page_engine=page_engine).convert()
+    tree = ET.fromstring(str(c).encode('utf-8'))
+    assert tree.xpath('//alto:TextBlock[@ID="region_0003"]', namespaces=NAMESPACES)[0].get('IDNEXT') == 'region_0001'
+    assert not tree.xpath('//alto:TextBlock[@ID="region_0001"]', namespaces=NAMESPACES)[0].get('IDNEXT')
+    # nested regions are converted and linked as well
+    ns = {'pc': page_etree.getroot().nsmap['pc']}
+    region = page_etree.find('.//pc:TextRegion[@id="region_0001"]', ns)
+    ET.SubElement(region, '{%s}TextRegion' % ns['pc'], id='region_nested').append(deepcopy(region.find('pc:Coords', ns)))
+    ET.SubElement(region.getparent().find('pc:ReadingOrder/pc:OrderedGroup', ns), '{%s}RegionRefIndexed' % ns['pc'], index='1', regionRef='region_nested')
+    c = OcrdPageAltoConverter(page_etree=page_etree, page_engine=page_engine).convert()
+    tree = ET.fromstring(str(c).encode('utf-8'))
+    assert tree.xpath('//alto:TextBlock[@ID="region_0003"]', namespaces=NAMESPACES)[0].get('IDNEXT') == 'region_nested'
+    composed = tree.xpath('//alto:ComposedBlock[@ID="region_0001"]', namespaces=NAMESPACES)[0]
+    assert [block.get('ID') for block in composed if block.tag != '{%s}Shape' % NAMESPACES['alto']] == \
+        ['region_0001-TextBlock', 'region_nested']
+    assert composed.get('IDNEXT') is None
+    assert "in reading order was not converted" not in caplog.text
+
+def test_margins(caplog):
+    c = OcrdPageAltoConverter(page_filename='tests/data/margins.page.xml').convert()
+    tree = ET.fromstring(str(c).encode('utf-8'))
+    def parent_of(reg_id):
+        return tree.xpath('//*[@ID="%s"]/..' % reg_id)[0].tag.split('}')[-1]
+    assert parent_of('header') == 'TopMargin'
+    assert parent_of('body') == 'PrintSpace'
+    assert parent_of('marginalia') == 'LeftMargin'
+    assert parent_of('outside') == 'PrintSpace'
+    assert "region 'outside' not properly contained" in caplog.text
+    assert [x.tag.split('}')[-1] for x in tree.xpath('//alto:Page/*', namespaces=NAMESPACES)] == \
+        ['TopMargin', 'LeftMargin', 'RightMargin', 'BottomMargin', 'PrintSpace']
+    assert tree.xpath('//*[@ID="header"]/@IDNEXT')[0] == 'body'
+    assert tree.xpath('//*[@ID="body"]/@IDNEXT')[0] == 'marginalia'
+
+def test_stats():
+    assert OcrdPageAltoConverter(page_filename='tests/data/textstyle.page.xml').stats is None
+    c = OcrdPageAltoConverter(page_filename='tests/data/textstyle.page.xml', stats=True)
+    str(c.convert())
+    assert all(seconds > 0 for seconds in c.stats.seconds.values())
+    assert c.stats.counts == {'pages': 1, 'regions': 1, 'lines': 2, 'words': 3, 'dummy_lines': 0, 'dummy_words': 0,
+                              'text_styles': 4, 'paragraph_styles': 1, 'layout_tags': 0}
+    output = BytesIO()
+    c_stream = OcrdPageAltoConverter(page_filename='tests/data/textstyle.page.xml', stats=True).stream(output)
+    assert c_stream.stats.counts == c.stats.counts
+    assert all(seconds > 0 for seconds in c_stream.stats.seconds.values())
+
+def test_stats_dummy():
+    c = OcrdPageAltoConverter(page_filename='tests/data/content-no-words.page.xml', check_words=False, stats=True).convert()
+    assert c.stats.counts['dummy_words'] == 1
+
+def test_namespaces():
+    # all those of OCR-D, plus xsi and alto
+    assert _NAMESPACES.items() >= OCRD_NAMESPACES.items()
+    assert set(_NAMESPACES) - set(OCRD_NAMESPACES) == {'xsi', 'alto'}
+
+def test_profile():
+    profile = ConversionProfile(alto_version='3.1', region_order='reading-order')
+    assert profile.alto_namespace == 'http://www.loc.gov/standards/alto/ns-v3#'
+    assert profile.schema_location == 'http://www.loc.gov/standards/alto/ns-v3# http://www.loc.gov/standards/alto/v3/alto-3-1.xsd'
+    assert profile.features.shape and not profile.features.processing
+    assert profile.region_types['TextRegionType'] == ('Text', 'TextBlock')
+    assert profile.region_types['MapRegionType'] == ('Map', None)
+    with raises(AttributeError):
+        profile.alto_version = '4.2'
+    with raises(TypeError):
+        profile.region_types['TextRegionType'] = ('Text', 'Illustration')
+    assert profile.replace(alto_version='4.2').alto_version == '4.2'
+    assert profile.alto_version == '3.1'
+    assert profile == ConversionProfile(alto_version='3.1', region_order='reading-order')
+    assert profile != ConversionProfile(alto_version='3.1')
+    assert loads(dumps(profile)) == profile
+    assert conversion_profile(alto_version='3.1') is conversion_profile(alto_version='3.1')
+    # as passed by OCR-D for a number parameter
+    assert ConversionProfile(textequiv_index=1.0).textequiv_index == 1
+
+@mark.parametrize('name, value', [
+    ('alto_version', '5.0'),
+    ('page_engine', 'sax'),
+    ('textequiv_fallback_strategy', 'middle'),
+    ('region_order', 'random'),
+    ('textline_order', 'random'),
+    ('timestamp_src', 'Modified'),
+    ('textequiv_index', '1'),
+    ('textequiv_index', 1.5),
+])
+def test_profile_invalid(name, value):
+    with raises(ValueError):
+        ConversionProfile(**{name: value})
+    with raises(ValueError):
+        OcrdPageAltoConverter(page_filename='tests/data/align.page.xml', **{name: value})
+
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_profile_convert(page_engine):
+    page_filename = 'tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml'
+    expected = str(OcrdPageAltoConverter(page_filename=page_filename, page_engine=page_engine, alto_version='2.0').convert())
+    profile = ConversionProfile(page_engine=page_engine, alto_version='2.0')
+    for page in [page_filename, ET.parse(page_filename), ET.parse(page_filename).getroot(),
+                 page_lxml.parse(page_filename), OcrdPageAltoConverter(page_filename=page_filename).page_pcgts]:
+        c = profile.convert(page)
+        assert c.profile is profile
+        assert str(c) == expected
+    with raises(ValueError, match='not both'):
+        OcrdPageAltoConverter(page_filename=page_filename, profile=profile, alto_version='4.2')
+
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+def test_to_bytes(page_engine):
+    c = OcrdPageAltoConverter(page_filename='tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml', page_engine=page_engine).convert()
+    expected = str(c).encode('utf-8')
+    assert c.to_bytes() == expected
+    output = BytesIO()
+    c.write(output)
+    assert output.getvalue() == expected
+
+@mark.parametrize('page_filename', sorted(glob('tests/data/*.xml')))
+@mark.parametrize('page_engine', ['lxml', 'iterparse'])
+def test_compact(page_filename, page_engine):
+    kwargs = dict(page_filename=page_filename, check_words=False, region_order='reading-order', page_engine=page_engine, pretty_print=False)
+    compact = OcrdPageAltoConverter(**kwargs).convert().to_bytes()
+    assert b'\n ' not in compact
+    output = BytesIO()
+    OcrdPageAltoConverter(**kwargs).stream(output)
+    assert output.getvalue() == compact
+    pretty = OcrdPageAltoConverter(**{**kwargs, 'pretty_print': True}).convert().to_bytes()
+    assert ET.tostring(ET.fromstring(compact)) == ET.tostring(ET.fromstring(pretty, ET.XMLParser(remove_blank_text=True)))
+
+@mark.parametrize('shape_levels, expected', [
+    ('region,line,word', {'region', 'line', 'word'}),
+    ('word, region', {'region', 'word'}),
+    (['line'], {'line'}),
+    ('', set()),
+])
+def test_shape_levels(shape_levels, expected):
+    c = OcrdPageAltoConverter(page_filename='tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml', shape_levels=shape_levels).convert()
+    tree = ET.fromstring(c.to_bytes())
+    shapes = tree.xpath('//alto:Shape', namespaces=NAMESPACES)
+    levels = {'PrintSpace': 'PrintSpace', 'TextLine': 'line', 'String': 'word'}
+    assert {levels.get(shape.getparent().tag.split('}')[-1], 'region') for shape in shapes} == expected | {'PrintSpace'}
+    output = BytesIO()
+    OcrdPageAltoConverter(page_filename='tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml', shape_levels=shape_levels).stream(output)
+    assert output.getvalue() == c.to_bytes()
+
+def test_shape_levels_profile():
+    assert ConversionProfile(shape_levels='word,line').shape_levels == ('line', 'word')
+    assert conversion_profile(shape_levels=['word', 'region']) is conversion_profile(shape_levels='region,word')
+    with raises(ValueError, match='paragraph'):
+        ConversionProfile(shape_levels='region,paragraph')
 
 if __name__ == "__main__":
     main([__file__])
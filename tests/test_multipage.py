@@ -0,0 +1,120 @@
+import json
+from io import BytesIO
+from zipfile import ZipFile
+
+from pytest import main, raises
+from click.testing import CliRunner
+from lxml import etree as ET
+
+from ocrd_page_to_alto.cli import main as cli_main
+from ocrd_page_to_alto.convert import ConversionProfile, OcrdPageAltoConverter
+from ocrd_page_to_alto.multipage import MultiPageAltoConverter
+
+NS = {'alto': 'http://www.loc.gov/standards/alto/ns-v4#'}
+
+PAGES = ['tests/data/align.page.xml', 'tests/data/sp-hyp.page.xml', 'tests/data/align.page.xml']
+
+def combined(pages, **options):
+    with MultiPageAltoConverter(check_words=False, **options) as converter:
+        for page in pages:
+            converter.add_page(page)
+        output = BytesIO()
+        index = converter.write(output)
+    return output.getvalue(), index
+
+def test_multipage():
+    data, index = combined(PAGES)
+    alto = ET.fromstring(data)
+    alto_pages = alto.findall('alto:Layout/alto:Page', NS)
+    assert [page.get('ID') for page in alto_pages] == [entry['id'] for entry in index]
+    assert [page.get('PHYSICAL_IMG_NR') for page in alto_pages] == ['1', '2', '3']
+    ids = [el.get('ID') for el in alto.iter() if el.get('ID')]
+    assert len(ids) == len(set(ids))
+    # styles once for all pages
+    styles = [el.get('ID') for el in alto.find('alto:Styles', NS)]
+    assert len(styles) == len(set(styles)) == 1
+    assert len(alto.find('alto:Description', NS).findall('alto:sourceImageInformation', NS)) == 1
+
+def test_multipage_same_as_single():
+    profile = ConversionProfile(check_words=False)
+    data, index = combined(PAGES[1:2])
+    alto_page = ET.fromstring(data).find('alto:Layout/alto:Page', NS)
+    single_page = profile.convert(PAGES[1]).to_etree().find('Layout/Page')
+    prefix = index[0]['id'] + '_'
+    for el_multi, el_single in zip(alto_page.iter(), single_page.iter()):
+        assert ET.QName(el_multi).localname == el_single.tag
+        for attr in ('ID', 'IDNEXT'):
+            if el_single.get(attr) and el_multi is not alto_page:
+                assert el_multi.get(attr) == prefix + el_single.get(attr)
+        assert {k: v for k, v in el_multi.attrib.items() if k not in ('ID', 'IDNEXT', 'PHYSICAL_IMG_NR')} == \
+            {k: v for k, v in el_single.attrib.items() if k not in ('ID', 'IDNEXT', 'PHYSICAL_IMG_NR')}
+    assert len(list(alto_page.iter())) == len(list(single_page.iter()))
+
+def test_multipage_index():
+    data, index = combined(PAGES, page_engine='lxml')
+    assert [entry['source'] for entry in index] == PAGES
+    for entry in index:
+        page_xml = data[entry['offset']:entry['offset'] + entry['length']]
+        assert ET.fromstring(page_xml).get('ID') == entry['id']
+
+def test_multipage_compact():
+    data, index = combined(PAGES, pretty_print=False)
+    pretty, _ = combined(PAGES)
+    assert b'\n ' not in data
+    assert ET.tostring(ET.fromstring(data)) == ET.tostring(ET.fromstring(pretty, ET.XMLParser(remove_blank_text=True)))
+    for entry in index:
+        assert ET.fromstring(data[entry['offset']:entry['offset'] + entry['length']]).get('ID') == entry['id']
+
+def test_multipage_failure():
+    with MultiPageAltoConverter() as converter:
+        converter.add_page(PAGES[1])
+        with raises(ValueError, match='has TextEquiv but not words'):
+            converter.add_page('tests/data/content-no-words.page.xml')
+        assert len(converter) == 1
+        output = BytesIO()
+        converter.write(output)
+    assert len(ET.fromstring(output.getvalue()).findall('alto:Layout/alto:Page', NS)) == 1
+
+def test_multipage_failure_styles(monkeypatch):
+    expected, _ = combined(PAGES[1:2])
+    def fail(converter):
+        raise ValueError("failed after the styles were found")
+    with MultiPageAltoConverter(check_words=False) as converter:
+        converter.add_page(PAGES[1])
+        with monkeypatch.context() as patch:
+            patch.setattr(OcrdPageAltoConverter, 'convert_reading_order', fail)
+            for page in ['tests/data/textstyle.page.xml', 'tests/data/align.page.xml']:
+                with raises(ValueError, match='failed after'):
+                    converter.add_page(page)
+        output = BytesIO()
+        converter.write(output)
+    # no TextStyles, ParagraphStyles or LayoutTags of the failed pages
+    for path in ('alto:Styles', 'alto:Tags'):
+        assert ET.tostring(ET.fromstring(output.getvalue()).find(path, NS)) == ET.tostring(ET.fromstring(expected).find(path, NS))
+
+def test_multipage_archive():
+    with MultiPageAltoConverter(check_words=False) as converter:
+        for page in PAGES:
+            converter.add_page(page)
+        output = BytesIO()
+        converter.write_archive(output)
+    with ZipFile(output) as archive:
+        index = json.loads(archive.read('index.json'))
+        data = archive.read(index['alto'])
+    assert (data, index['pages']) == combined(PAGES)
+
+def test_cli_combine(tmp_path):
+    result = CliRunner().invoke(cli_main, ['--no-check-words', '--combine', 'zip', '-O', str(tmp_path / 'out.zip'), *PAGES[:2]])
+    assert result.exit_code == 0
+    assert 'Converted 2 of 2 pages' in result.output
+    with ZipFile(tmp_path / 'out.zip') as archive:
+        assert len(json.loads(archive.read('index.json'))['pages']) == 2
+    result = CliRunner().invoke(cli_main, ['--combine', 'alto', '-O', str(tmp_path / 'out.xml'),
+                                           PAGES[1], 'tests/data/content-no-words.page.xml'])
+    assert result.exit_code == 1
+    assert len(ET.parse(str(tmp_path / 'out.xml')).findall('alto:Layout/alto:Page', NS)) == 1
+    result = CliRunner().invoke(cli_main, ['--combine', 'alto', '-D', str(tmp_path), *PAGES])
+    assert result.exit_code == 2
+
+if __name__ == "__main__":
+    main([__file__])
@@ -0,0 +1,165 @@
+from pytest import main, mark
+from os import listdir
+from os.path import join
+from shutil import copy
+from json import loads
+from types import SimpleNamespace
+from zipfile import ZipFile
+
+from lxml import etree as ET
+
+from ocrd import Resolver, run_processor
+from ocrd_utils import MIMETYPE_PAGE, pushd_popd
+
+from ocrd_page_to_alto import ocrd_processor
+from ocrd_page_to_alto.convert import OcrdPageAltoConverter
+from ocrd_page_to_alto.ocrd_processor import Alto2PageProcessor, Page2AltoProcessor
+
+PAGES = ['align.page.xml', 'language.page.xml', 'sp-hyp.page.xml']
+
+def create_workspace(directory, pages):
+    workspace = Resolver().workspace_from_nothing(directory=str(directory))
+    for page_idx, page in enumerate(pages):
+        copy(join('tests/data', page), str(directory / page))
+        workspace.add_file('IN', file_id='IN_%04d' % page_idx, page_id='phys_%04d' % page_idx,
+                           mimetype=MIMETYPE_PAGE, local_filename=page)
+    workspace.save_mets()
+    return workspace
+
+def process(workspace, **parameter):
+    with pushd_popd(workspace.directory):
+        run_processor(Page2AltoProcessor, workspace=workspace, input_file_grp='IN', output_file_grp='OUT',
+                      parameter=dict(check_border=False, **parameter))
+    return {f.pageId: open(join(workspace.directory, f.local_filename)).read()
+            for f in workspace.find_files(fileGrp='OUT')}
+
+@mark.parametrize('streaming', [False, True])
+def test_parallel_pages(tmp_path, streaming):
+    sequential = process(create_workspace(tmp_path / 'sequential', PAGES), streaming=streaming)
+    parallel = process(create_workspace(tmp_path / 'parallel', PAGES), streaming=streaming, parallel_pages=2)
+    assert len(sequential) == len(PAGES)
+    assert parallel == sequential
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_stats(tmp_path, caplog, parallel_pages):
+    process(create_workspace(tmp_path, PAGES), stats=True, parallel_pages=parallel_pages)
+    assert '"pages": 3' in caplog.text
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_validate(tmp_path, caplog, parallel_pages):
+    outputs = process(create_workspace(tmp_path, ['align.page.xml', 'duplicate-ids.page.xml']), validate=True, parallel_pages=parallel_pages)
+    # written anyway
+    assert len(outputs) == 2
+    assert 'Output of 1 pages is not valid: IN_0001' in caplog.text
+
+def test_parallel_pages_core_parallel(tmp_path, caplog, monkeypatch):
+    sequential = process(create_workspace(tmp_path / 'sequential', PAGES))
+    # as if core ran the pages in its own pool (which needs a METS server)
+    monkeypatch.setattr(ocrd_processor, 'config', SimpleNamespace(OCRD_MAX_PARALLEL_PAGES=2))
+    parallel = process(create_workspace(tmp_path / 'parallel', PAGES), parallel_pages=2)
+    assert 'ignoring parallel_pages=2' in caplog.text
+    assert parallel == sequential
+
+def test_parallel_pages_missing_output(tmp_path, monkeypatch):
+    # no words, so check_words fails for the second page
+    monkeypatch.setenv('OCRD_MISSING_OUTPUT', 'SKIP')
+    monkeypatch.setenv('OCRD_MAX_MISSING_OUTPUTS', '-1')
+    outputs = process(create_workspace(tmp_path, ['align.page.xml', 'content-no-words.page.xml', 'sp-hyp.page.xml']),
+                      parallel_pages=2)
+    assert sorted(outputs) == ['phys_0000', 'phys_0002']
+
+@mark.parametrize('combine', ['alto', 'zip'])
+def test_combine(tmp_path, combine):
+    workspace = create_workspace(tmp_path, PAGES)
+    with pushd_popd(workspace.directory):
+        run_processor(Page2AltoProcessor, workspace=workspace, input_file_grp='IN', output_file_grp='OUT',
+                      parameter=dict(check_border=False, combine=combine))
+    # one file for all pages
+    output_file, = workspace.find_files(fileGrp='OUT')
+    assert output_file.pageId is None
+    filename = join(workspace.directory, output_file.local_filename)
+    if combine == 'zip':
+        assert output_file.mimetype == 'application/zip'
+        with ZipFile(filename) as archive:
+            assert len(loads(archive.read('index.json'))['pages']) == len(PAGES)
+            alto = ET.fromstring(archive.read('alto.xml'))
+    else:
+        alto = ET.parse(filename).getroot()
+    assert [page.get('ID') for page in alto.iter('{*}Page')] == ['phys_0000', 'phys_0001', 'phys_0002']
+
+def test_cache(tmp_path, caplog):
+    cache_dir = str(tmp_path / 'cache')
+    first = process(create_workspace(tmp_path / 'first', PAGES), cache_dir=cache_dir)
+    assert 'Cache: 0 hits, 3 misses' in caplog.text
+    second = process(create_workspace(tmp_path / 'second', PAGES), cache_dir=cache_dir, parallel_pages=2)
+    assert 'Cache: 3 hits, 0 misses' in caplog.text
+    assert second == first
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_cache_validate(tmp_path, caplog, parallel_pages):
+    caplog.set_level('INFO')
+    cache_dir = str(tmp_path / 'cache')
+    pages = ['align.page.xml', 'duplicate-ids.page.xml']
+    process(create_workspace(tmp_path / 'first', pages), cache_dir=cache_dir)
+    # copied from the cache, but still validated
+    outputs = process(create_workspace(tmp_path / 'second', pages), cache_dir=cache_dir, validate=True,
+                      page_engine='lxml', parallel_pages=parallel_pages)
+    assert len(outputs) == 2
+    assert 'Cache: 2 hits, 0 misses' in caplog.text
+    assert 'Output of 1 pages is not valid: IN_0001' in caplog.text
+
+def keep_output(workspace):
+    # mark the existing output to see whether it is kept
+    for output_file in workspace.find_files(fileGrp='OUT'):
+        with open(join(workspace.directory, output_file.local_filename), 'w') as output:
+            output.write('kept')
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_cache_existing_output(tmp_path, monkeypatch, parallel_pages):
+    cache_dir = str(tmp_path / 'cache')
+    workspace = create_workspace(tmp_path / 'workspace', PAGES)
+    process(workspace, cache_dir=cache_dir)
+    keep_output(workspace)
+    monkeypatch.setenv('OCRD_EXISTING_OUTPUT', 'SKIP')
+    # all cached, but not copied over the existing output
+    outputs = process(workspace, cache_dir=cache_dir, parallel_pages=parallel_pages)
+    assert set(outputs.values()) == {'kept'}
+    assert len(listdir(join(workspace.directory, 'OUT'))) == len(PAGES)
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_streaming_existing_output(tmp_path, monkeypatch, parallel_pages):
+    workspace = create_workspace(tmp_path, PAGES)
+    process(workspace, streaming=True)
+    keep_output(workspace)
+    monkeypatch.setenv('OCRD_EXISTING_OUTPUT', 'SKIP')
+    outputs = process(workspace, streaming=True, parallel_pages=parallel_pages)
+    assert set(outputs.values()) == {'kept'}
+    assert len(listdir(join(workspace.directory, 'OUT'))) == len(PAGES)
+
+def test_streaming_failed(tmp_path, monkeypatch):
+    def fail(converter):
+        raise ValueError("failed after the output file was opened")
+    monkeypatch.setattr(OcrdPageAltoConverter, 'convert_styles', fail)
+    monkeypatch.setenv('OCRD_MISSING_OUTPUT', 'SKIP')
+    monkeypatch.setenv('OCRD_MAX_MISSING_OUTPUTS', '-1')
+    workspace = create_workspace(tmp_path, PAGES)
+    assert not process(workspace, streaming=True)
+    # no truncated file left behind
+    assert not listdir(join(workspace.directory, 'OUT'))
+
+@mark.parametrize('parallel_pages', [1, 2])
+def test_alto2page(tmp_path, parallel_pages):
+    workspace = create_workspace(tmp_path, PAGES)
+    alto = process(workspace)
+    with pushd_popd(workspace.directory):
+        run_processor(Alto2PageProcessor, workspace=workspace, input_file_grp='OUT', output_file_grp='PAGE',
+                      parameter=dict(parallel_pages=parallel_pages, stats=True))
+    output_files = list(workspace.find_files(fileGrp='PAGE'))
+    assert sorted(f.pageId for f in output_files) == sorted(alto)
+    for output_file in output_files:
+        assert output_file.mimetype == MIMETYPE_PAGE
+        page = ET.parse(join(workspace.directory, output_file.local_filename)).getroot()
+        assert page.find('{*}Page').get('imageWidth')
+
+if __name__ == "__main__":
+    main([__file__])
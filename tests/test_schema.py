@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from io import BytesIO
+
+from lxml import etree as ET
+from pytest import main, mark, raises
+
+from ocrd_page_to_alto.convert import ConversionProfile
+from ocrd_page_to_alto.multipage import MultiPageAltoConverter
+from ocrd_page_to_alto.schema import VALIDATED_ALTO_VERSIONS, alto_schema, validate_alto
+
+PROFILE = ConversionProfile(check_words=False, page_engine='lxml')
+
+@mark.parametrize('page_filename', ['tests/data/align.page.xml', 'tests/data/textstyle.page.xml', 'tests/data/timestamp.page.xml', 'tests/data/duplicate-ids.page.xml'])
+def test_validate_in_memory(page_filename):
+    converter = PROFILE.convert(page_filename)
+    serialized = str(converter)
+    in_memory = validate_alto(converter.to_etree(), '4.2')
+    # the tree is unchanged
+    assert str(converter) == serialized
+    reparsed = validate_alto(ET.fromstring(serialized.encode('utf-8')), '4.2')
+    assert [violation.message for violation in in_memory] == [
+        violation.message.replace('{%s}' % PROFILE.alto_namespace, '') for violation in reparsed]
+
+def test_validate_violations():
+    alto = PROFILE.convert('tests/data/align.page.xml').to_etree()
+    assert validate_alto(alto, '4.2') == []
+    alto.find('Layout/Page').set('FOO', 'bar')
+    violation, = validate_alto(alto, '4.2')
+    assert violation.path == '/alto/Layout/Page'
+    assert "'FOO'" in violation.message
+
+# PAGE-XML with duplicate IDs, which cannot become valid ALTO
+INVALID_PAGES = ['tests/data/duplicate-ids.page.xml', 'tests/data/empty-lines.page.xml']
+
+@mark.parametrize('page_filename', sorted(set(glob('tests/data/*.xml')) - set(INVALID_PAGES)))
+@mark.parametrize('page_engine', ['generateds', 'lxml'])
+@mark.parametrize('alto_version', VALIDATED_ALTO_VERSIONS)
+def test_output_valid(page_filename, page_engine, alto_version):
+    converter = PROFILE.replace(page_engine=page_engine, alto_version=alto_version, validate=True).convert(page_filename)
+    assert converter.validation == []
+
+@mark.parametrize('streaming', [False, True])
+def test_printspace_shape(streaming):
+    def printspace(page, alto_version):
+        profile = PROFILE.replace(alto_version=alto_version, page_engine='generateds')
+        if streaming:
+            output = BytesIO()
+            profile.converter(page).stream(output)
+            alto = ET.fromstring(output.getvalue())
+        else:
+            converter = profile.replace(validate=True).convert(page)
+            assert converter.validation == []
+            alto = ET.fromstring(converter.to_bytes())
+        return alto.find('{*}Layout/{*}Page/{*}PrintSpace')
+    page = ET.parse('tests/data/align.page.xml')
+    # followed by blocks, allowed by all versions
+    for alto_version in ('4.2', '3.1'):
+        assert printspace(page, alto_version).find('{*}Shape') is not None
+    # without blocks, only allowed since ALTO 4.0
+    for region in page.getroot().findall('{*}Page/{*}TextRegion'):
+        region.getparent().remove(region)
+    assert printspace(page, '4.2').find('{*}Shape') is not None
+    assert len(printspace(page, '3.1')) == 0
+
+def test_bundled_only(monkeypatch):
+    assert set(VALIDATED_ALTO_VERSIONS) == {'4.2', '4.0', '3.1'}
+    # never fetched from the network
+    monkeypatch.setattr(ET, 'parse', None)
+    with raises(ValueError, match='not bundled'):
+        PROFILE.replace(alto_version='2.0', validate=True)
+    with raises(ValueError, match='not bundled'):
+        alto_schema('4.1')
+
+def test_alto_schema_cached():
+    # bundled, with the xlink import resolved offline
+    assert alto_schema('4.2') is alto_schema('4.2')
+    assert alto_schema('4.2', qualified=False) is not alto_schema('4.2')
+    # but not shared between threads, as each keeps the error log of its last validation
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(alto_schema, '4.2').result() is not alto_schema('4.2')
+
+def test_validate_threads():
+    valid = PROFILE.convert('tests/data/align.page.xml').to_etree()
+    invalid = PROFILE.convert('tests/data/duplicate-ids.page.xml').to_etree()
+    expected = [[], validate_alto(invalid, '4.2')] * 20
+    assert len(expected[1]) == 1
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(validate_alto, [valid, invalid] * 20, ['4.2'] * 40)) == expected
+    assert 'xmlns' in valid.attrib
+
+def test_validate_option():
+    profile = PROFILE.replace(validate=True, stats=True)
+    converter = profile.convert('tests/data/align.page.xml')
+    assert converter.validation == []
+    assert 'validate' in converter.stats.seconds
+    converter = profile.convert('tests/data/duplicate-ids.page.xml')
+    assert len(converter.validation) == 1
+    assert converter.stats.counts['invalid_pages'] == 1
+    assert PROFILE.convert('tests/data/align.page.xml').validation is None
+
+def test_validate_streaming():
+    with raises(ValueError, match='cannot be validated'):
+        PROFILE.replace(validate=True).converter('tests/data/align.page.xml').stream(BytesIO())
+    with raises(ValueError, match='cannot be validated'):
+        MultiPageAltoConverter(PROFILE.replace(validate=True))
+
+if __name__ == "__main__":
+    main([__file__])
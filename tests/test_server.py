@@ -0,0 +1,102 @@
+from http.client import HTTPConnection
+from json import loads
+from socket import socket, AF_UNIX, SOCK_STREAM
+from threading import Thread
+
+from pytest import fixture
+
+from ocrd_page_to_alto.convert import ConversionProfile
+from ocrd_page_to_alto.server import ConversionService, make_server
+
+PAGE_FILENAME = 'tests/data/FILE_0010_OCR-D-OCR-CALAMARI.xml'
+
+class UnixHTTPConnection(HTTPConnection):
+
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket(AF_UNIX, SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+@fixture(scope='module')
+def service():
+    with ConversionService(ConversionProfile(page_engine='lxml', stats=True), workers=1, max_requests=2) as service:
+        yield service
+
+def serving(server):
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@fixture
+def connection(service):
+    server = serving(make_server(service, port=0))
+    yield HTTPConnection(*server.server_address)
+    server.shutdown()
+    server.server_close()
+
+def request(connection, method, path, body=None):
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def test_convert(service, connection):
+    with open(PAGE_FILENAME, 'rb') as f:
+        status, body = request(connection, 'POST', '/convert', f.read())
+    assert status == 200
+    assert body.decode('utf-8') == str(service.profile.convert(PAGE_FILENAME))
+    # keep-alive
+    assert request(connection, 'GET', '/health')[0] == 200
+
+def test_convert_errors(connection):
+    status, body = request(connection, 'POST', '/convert', b'<PcGts')
+    assert status == 400
+    assert body.startswith(b'Invalid XML')
+    with open('tests/data/content-no-words.page.xml', 'rb') as f:
+        status, body = request(connection, 'POST', '/convert', f.read())
+    assert status == 422
+    assert b'Use --no-check-words to override' in body
+    assert request(connection, 'GET', '/nothing')[0] == 404
+
+def test_health_metrics(service, connection):
+    status, body = request(connection, 'GET', '/health')
+    assert status == 200
+    assert loads(body) == {'status': 'ok', 'workers': 1, 'max_requests': 2, 'active': 0}
+    requests_before = service.metrics.requests
+    with open(PAGE_FILENAME, 'rb') as f:
+        request(connection, 'POST', '/convert', f.read())
+    status, body = request(connection, 'GET', '/metrics')
+    assert status == 200
+    metrics = loads(body)
+    assert metrics['requests'] == requests_before + 1
+    assert metrics['latency_ms']['max'] >= metrics['latency_ms']['p50'] > 0
+    assert metrics['stats']['counts']['pages'] >= 1
+
+def test_concurrency_limit(service, connection):
+    # occupy all slots as if other requests were being converted
+    for _ in range(service.max_requests):
+        service._slots.acquire()
+    try:
+        with open(PAGE_FILENAME, 'rb') as f:
+            connection.request('POST', '/convert', body=f.read())
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 503
+        assert response.getheader('Retry-After') == '1'
+    finally:
+        for _ in range(service.max_requests):
+            service._slots.release()
+    assert service.metrics.to_dict()['rejected'] == 1
+
+def test_unix_socket(service, tmp_path):
+    socket_path = str(tmp_path / 'page-to-alto.sock')
+    server = serving(make_server(service, socket_path=socket_path))
+    try:
+        with open(PAGE_FILENAME, 'rb') as f:
+            status, body = request(UnixHTTPConnection(socket_path), 'POST', '/convert', f.read())
+        assert status == 200
+        assert body.decode('utf-8') == str(service.profile.convert(PAGE_FILENAME))
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,46 @@
+"""
+Guard the startup time of the page-to-alto CLI against regressions: each
+test runs in a fresh interpreter and checks which modules got imported.
+"""
+import sys
+from json import loads
+from subprocess import run
+
+# ocrd_utils itself is needed for logging (and brings numpy along, which conversion needs anyway)
+OCRD_STACK = ['ocrd', 'ocrd_models', 'ocrd_network', 'ocrd_validators']
+
+def imported_modules(code):
+    proc = run([sys.executable, '-c', code + '\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))'],
+               capture_output=True, text=True, check=True)
+    return set(loads(proc.stdout.splitlines()[-1]))
+
+def convert_code(page_filename, output_filename, *args):
+    return "from ocrd_page_to_alto.cli import main\nmain(%r, standalone_mode=False)" % (
+        [*args, '--no-check-words', '-O', str(output_filename), page_filename])
+
+def test_cli_imports():
+    modules = imported_modules('import ocrd_page_to_alto.cli')
+    for name in OCRD_STACK + ['ocrd_utils', 'langcodes', 'numpy', 'packaging', 'pebble']:
+        assert name not in modules
+
+def test_convert_lxml_imports(tmp_path):
+    modules = imported_modules(convert_code('tests/data/region_no_line.page.xml', tmp_path / 'out.xml', '--page-engine', 'lxml'))
+    for name in OCRD_STACK + ['langcodes']:
+        assert name not in modules
+    assert (tmp_path / 'out.xml').exists()
+
+def test_convert_generateds_imports(tmp_path):
+    modules = imported_modules(convert_code('tests/data/region_no_line.page.xml', tmp_path / 'out.xml'))
+    assert 'ocrd_models.ocrd_page' in modules
+    assert 'ocrd' not in modules
+    assert 'langcodes' not in modules
+
+def test_langcodes_on_demand(tmp_path):
+    modules = imported_modules(convert_code('tests/data/align.page.xml', tmp_path / 'out.xml', '--page-engine', 'lxml'))
+    assert 'langcodes' in modules
+
+def test_help_imports():
+    # the timing is in benchmarks/bench_startup.py
+    modules = imported_modules("from ocrd_page_to_alto.cli import main\nmain(['--help'], standalone_mode=False)")
+    for name in OCRD_STACK:
+        assert name not in modules
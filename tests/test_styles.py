@@ -5,29 +5,101 @@ from ocrd_models.ocrd_page import TextStyleType, to_xml
 from ocrd_page_to_alto.styles import TextStylesManager, LayoutTagManager, ParagraphStyleManager
 
 def test_styles_id():
-    m = TextStylesManager(alto_version='4')
+    m = TextStylesManager(alto_version='4.2')
     assert m.get_id(font_family='Foo') == 'textstyle-Foo---None---None---None---None---None'
     assert m.elements['textstyle-Foo---None---None---None---None---None']['font_family'] == 'Foo'
 
 def test_styles_to_xml():
-    m = TextStylesManager(alto_version='4')
+    m = TextStylesManager(alto_version='4.2')
     m.get_id(font_family='Foo Serif')
     el = ET.Element('Styles')
     m.to_xml(el)
-    assert ET.tostring(el).decode('utf-8') == '<Styles><TextStyle ID="textstyle-Foo%20Serif---None---None---None---None---None" FONTFAMILY="Foo Serif"/></Styles>'
-    assert m.elements['textstyle-Foo%20Serif---None---None---None---None---None']['font_family'] == 'Foo Serif'
+    assert ET.tostring(el).decode('utf-8') == '<Styles><TextStyle ID="textstyle-Foo_20Serif---None---None---None---None---None" FONTFAMILY="Foo Serif"/></Styles>'
+    assert m.elements['textstyle-Foo_20Serif---None---None---None---None---None']['font_family'] == 'Foo Serif'
+
+def test_styles_id_escaped():
+    m = TextStylesManager(alto_version='4.2')
+    # valid xs:ID, and distinct for values that only differ in escaped characters
+    assert m.get_id(font_family='Fraktur (Ä)') == 'textstyle-Fraktur_20_28_C3_84_29---None---None---None---None---None'
+    assert m.get_id(font_family='Foo_20') != m.get_id(font_family='Foo 0')
 
 def test_styles_from_textstyle():
-    m = TextStylesManager(alto_version='4')
+    m = TextStylesManager(alto_version='4.2')
     textstyle = TextStyleType(fontFamily='Times New Roman', serif=True, textColourRgb=6559300)
     print(m.from_textstyle(textstyle))
 
+def test_styles_from_textstyle_fontsize():
+    textstyle = TextStyleType(fontFamily='Times New Roman')
+    assert TextStylesManager(alto_version='4.2').from_textstyle(textstyle)
+    # written anyway, though FONTSIZE is required before ALTO 4.2
+    assert TextStylesManager(alto_version='4.0').from_textstyle(textstyle)
+
+def test_styles_from_textstyle_fontsize_strict(caplog):
+    # FONTSIZE is required before ALTO 4.2, so left out when validating
+    m = TextStylesManager(alto_version='4.0', strict=True)
+    assert m.from_textstyle(TextStyleType(fontFamily='Times New Roman')) is None
+    assert m.from_textstyle(TextStyleType(fontFamily='Times New Roman', bold=True)) is None
+    assert m.from_textstyle(TextStyleType(fontFamily='Times New Roman')) is None
+    assert m.from_textstyle(TextStyleType(fontFamily='Times New Roman', fontSize=12))
+    assert len(m) == 1
+    # once per style
+    assert caplog.text.count('left out, as ALTO-XML v4.0 requires a font size') == 2
+
+def test_styles_from_textstyle_colour():
+    m = TextStylesManager(alto_version='4.2')
+    def font_color(**kwargs):
+        style_id = m.from_textstyle(TextStyleType(**kwargs))
+        return m.elements[style_id]['font_color']
+    assert font_color(textColourRgb=6559300) == '441664'
+    assert font_color(textColourRgb=255) == 'ff0000'
+    assert font_color(textColour='cyan') == '00ffff'
+    assert font_color(textColour='other') == 'None'
+
+def test_styles_from_textstyle_cached():
+    m = TextStylesManager(alto_version='4.2')
+    textstyle = TextStyleType(fontFamily='Foo', bold=True)
+    style_id = m.from_textstyle(textstyle)
+    textstyle.set_bold(False) # cached by identity, not value
+    assert m.from_textstyle(textstyle) == style_id
+    assert m.from_textstyle(TextStyleType(fontFamily='Foo', bold=True)) == style_id
+    assert len(m.elements) == 1
+
+def test_styles_order():
+    m = TextStylesManager(alto_version='4.2')
+    families = ['Foo %d' % idx for idx in range(20)]
+    for family in families + list(reversed(families)):
+        m.get_id(font_family=family)
+    el = ET.Element('Styles')
+    m.to_xml(el)
+    assert [x.get('FONTFAMILY') for x in el] == families
+
 def test_layouttagmanager():
-    m = LayoutTagManager(alto_version='4')
+    m = LayoutTagManager(alto_version='4.2')
     m.get_id(label='paragraph')
     el = ET.Element('Tags')
     m.to_xml(el)
     assert ET.tostring(el) == b'<Tags><LayoutTag ID="layouttag-paragraph" LABEL="paragraph"/></Tags>'
 
+def test_styles_to_page():
+    m = TextStylesManager(alto_version='4.2')
+    m.from_textstyle(TextStyleType(fontFamily='Times', fontSize=12.0, serif=True, bold=True, italic=True, textColourRgb=6559300))
+    el = ET.Element('Styles')
+    m.to_xml(el)
+    assert m.to_page(el[0]) == {'fontFamily': 'Times', 'serif': 'true', 'fontSize': '12.0',
+                                'textColourRgb': '6559300', 'bold': 'true', 'italic': 'true'}
+
+def test_paragraphstyle_to_page():
+    m = ParagraphStyleManager(alto_version='4.2')
+    for align_page, align_alto in m.align_mapping.items():
+        assert m.to_page(ET.Element('ParagraphStyle', ALIGN=align_alto)) == {'align': align_page}
+    assert m.to_page(ET.Element('ParagraphStyle', ALIGN='Center')) == {'align': 'centre'}
+    # as enumerated by the ALTO schema
+    assert set(m.align_mapping.values()) == {'Left', 'Right', 'Center', 'Block'}
+    assert m.to_page(ET.Element('ParagraphStyle')) == {}
+
+def test_layouttag_to_page():
+    m = LayoutTagManager(alto_version='4.2')
+    assert m.to_page(ET.Element('LayoutTag', LABEL='paragraph')) == {'type': 'paragraph'}
+
 if __name__ == "__main__":
     main([__file__])
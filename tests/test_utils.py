@@ -0,0 +1,52 @@
+from pytest import main
+from lxml import etree as ET
+
+from ocrd_page_to_alto.page_lxml import WordType
+from ocrd_utils import bbox_from_points
+from pytest import raises
+
+from ocrd_page_to_alto.utils import alto_lang_to_page, bboxes_from_points, page_lang_to_alto, set_alto_lang_from_page_lang
+
+def test_page_lang_to_alto():
+    page_lang_to_alto.cache_clear()
+    assert page_lang_to_alto('German') == 'deu'
+    assert page_lang_to_alto('German') == 'deu'
+    info = page_lang_to_alto.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+def test_page_lang_to_alto_failure(caplog):
+    page_lang_to_alto.cache_clear()
+    for idx in range(3):
+        word_alto = ET.Element('String')
+        set_alto_lang_from_page_lang(word_alto, WordType(id='w%d' % idx, language='no such language'))
+        assert word_alto.get('LANG') is None
+    assert caplog.text.count("Cannot map language 'no such language'") == 1
+    info = page_lang_to_alto.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+
+def test_alto_lang_to_page(caplog):
+    alto_lang_to_page.cache_clear()
+    assert alto_lang_to_page('deu') == 'German'
+    assert alto_lang_to_page(page_lang_to_alto('Latin')) == 'Latin'
+    for _ in range(2):
+        assert alto_lang_to_page('xx-no') is None
+    assert caplog.text.count("Cannot map language 'xx-no'") == 1
+
+def test_bboxes_from_points():
+    points_list = ['1,2 3,4', '5,5 1,9 2,2', '0,0', '-3,7 4,-1']
+    assert bboxes_from_points(points_list) == [bbox_from_points(points) for points in points_list]
+    assert bboxes_from_points([]) == []
+    with raises(ValueError):
+        bboxes_from_points(['1,2 3,4', '1.5,2 3,4'])
+    with raises(ValueError):
+        bboxes_from_points(['1,2 3,4 ', '1,2 3,4'])
+    # as many numbers in total as points, but not per string: parsed one by one like bbox_from_points
+    points_list = ['1,2 3,4,5', '6,7']
+    assert bboxes_from_points(points_list) == [bbox_from_points(points) for points in points_list]
+    with raises(IndexError):
+        bboxes_from_points(['1,2 3,4,5', '6 7,8'])
+    with raises(IndexError):
+        bboxes_from_points(['1 2,3,4', '5,6'])
+
+if __name__ == "__main__":
+    main([__file__])
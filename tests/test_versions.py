@@ -0,0 +1,23 @@
+from pytest import main, raises
+
+from ocrd_page_to_alto.versions import alto_features
+
+def test_alto_features():
+    assert alto_features('4.2') == (True, True, True, True, True, True, True, True)
+    assert alto_features('4.1').strikethrough is False
+    assert alto_features('3.1').processing is False
+    assert alto_features('3.1').shape is True
+    assert alto_features('3.1').printspace_shape is False
+    assert alto_features('4.0').optional_fontsize is False
+    assert alto_features('3.0').shape is False
+    assert alto_features('2.1').schemaversion is False
+    assert alto_features('2.1').lang is True
+    assert alto_features('2.0') == (False, False, False, False, False, False, False, False)
+    assert alto_features('4') is alto_features('4')
+    assert alto_features('4') == alto_features('4.0')
+    for version in ('5', '4.3', 'v4.2', 'latest'):
+        with raises(ValueError, match='not supported'):
+            alto_features(version)
+
+if __name__ == "__main__":
+    main([__file__])